@@ -11,6 +11,35 @@
 #define SCAN_DELAY 10           // Delay between sensor scans (ms)
 #define MUX_SWITCH_DELAY 50     // Delay when switching multiplexer channels (ms)
 
+// ======================
+// BOARD PROFILE
+// ======================
+// Reported by CONFIG_STATUS, the server caches this board's profile under it
+#define BOARD_ID "board-1"
+// After CONFIG_STATUS, CONFIG_DUMP or CONFIG_READER, keep reading commands
+// instead of scanning for this long, so a pipelined batch of CONFIG_READER
+// lines (up to CONFIG_COMMIT) never overflows the serial receive buffer
+#define CONFIG_HOLD_MS 500
+
+// ======================
+// SCAN SCHEDULING
+// ======================
+// CONFIG_SCHEDULE:first:periods sets the scan period of up to SCHEDULE_CHUNK
+// readers, one hex digit each: scanned every Nth pass, 0 = not scanned
+#define SCHEDULE_CHUNK 16
+#define SCAN_REPORT_INTERVAL 5000 // SCAN:passes:meanPassMs:inactiveMask every ... (ms)
+
+// ======================
+// BINARY PROTOCOL
+// ======================
+// Frame: SYNC opcode reader fromReader uidLength uid[uidLength] crc8
+// crc8 (poly 0x07) covers opcode..uid, fromReader is FRAME_NO_READER if unused
+#define FRAME_SYNC 0xA5
+#define FRAME_OP_PLACE 1
+#define FRAME_OP_LIFT 2
+#define FRAME_OP_MOVE 3
+#define FRAME_NO_READER 0xFF
+
 // Default multiplexer addresses (can be configured via serial)
 extern uint8_t muxAddresses[MAX_MULTIPLEXERS];
 
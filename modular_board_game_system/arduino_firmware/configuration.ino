@@ -4,7 +4,12 @@
 
 // System arrays (declared in main.ino, extern here)
 extern ReaderConfig readers[MAX_READERS];
+extern TagState tagStates[MAX_READERS];
 extern uint8_t numActiveReaders;
+extern uint8_t numKnownTags;
+extern bool binaryProtocol;
+extern bool scheduleActive;
+extern bool configHold;
 
 /**
  * Initialize default board configuration (4x4 grid)
@@ -25,8 +30,10 @@ void initializeDefaultConfig() {
     readers[i].muxChannel = i % 8;
     strcpy(readers[i].position, defaultPositions[i]);
     readers[i].isActive = false;
-    readers[i].reader = nullptr;
+    readers[i].scanPeriod = 1;
+    readers[i].changed = true;
   }
+  scheduleActive = false;
 }
 
 /**
@@ -51,18 +58,102 @@ void processConfigCommand(String command) {
         readers[index].muxAddress = muxAddr;
         readers[index].muxChannel = channel;
         strcpy(readers[index].position, position.c_str());
+        readers[index].changed = true;
+        // Probably one of a batch, wait for the rest
+        configHold = true;
         Serial.print("CONFIG_ACK:READER:");
         Serial.println(index);
       }
     }
+  } else if (command.startsWith("CONFIG_COMMIT:")) {
+    // Format: CONFIG_COMMIT:numReaders - use readers 0..numReaders-1,
+    // initializing the ones CONFIG_READER changed
+    uint8_t count = command.substring(14).toInt();
+    
+    if (count <= MAX_READERS) {
+      numActiveReaders = count;
+      for (uint8_t i = 0; i < numActiveReaders; i++) {
+        if (readers[i].changed || readers[i].reader == nullptr) {
+          initializeReader(i);
+        }
+      }
+      configHold = false;
+      Serial.print("CONFIG_ACK:COMMIT:");
+      Serial.print(numActiveReaders);
+      Serial.print(":");
+      Serial.println(configChecksum(), HEX);
+    }
+  } else if (command == "CONFIG_DUMP") {
+    // One CONFIG_READER line per reader, in the format it is set with
+    for (uint8_t i = 0; i < numActiveReaders; i++) {
+      Serial.print("CONFIG_READER:");
+      Serial.print(i);
+      Serial.print(":");
+      Serial.print(readers[i].muxAddress, HEX);
+      Serial.print(":");
+      Serial.print(readers[i].muxChannel);
+      Serial.print(":");
+      Serial.println(readers[i].position);
+    }
+    Serial.print("CONFIG_END:");
+    Serial.println(numActiveReaders);
+    configHold = true;
+  } else if (command == "CONFIG_TAGS") {
+    // Format: TAG:uid:position per tag on the board, then TAGS_END:count;
+    // the server resynchronizes its game with this
+    uint8_t count = 0;
+    for (uint8_t i = 0; i < numKnownTags; i++) {
+      if (tagStates[i].currentReader >= 0) {
+        char uidHex[15];
+        uidToHexString(tagStates[i].uid, tagStates[i].uidLength, uidHex);
+        Serial.print("TAG:");
+        Serial.print(uidHex);
+        Serial.print(":");
+        Serial.println(readers[tagStates[i].currentReader].position);
+        count++;
+      }
+    }
+    Serial.print("TAGS_END:");
+    Serial.println(count);
+  } else if (command.startsWith("CONFIG_SCHEDULE:")) {
+    // Format: CONFIG_SCHEDULE:first:periods (one hex digit per reader from first)
+    int colon = command.indexOf(":", 16);
+    
+    if (colon > 0) {
+      uint8_t first = command.substring(16, colon).toInt();
+      String periods = command.substring(colon + 1);
+      
+      if (first < MAX_READERS && periods.length() <= SCHEDULE_CHUNK) {
+        for (uint8_t i = 0; i < periods.length() && first + i < MAX_READERS; i++) {
+          readers[first + i].scanPeriod = strtol(periods.substring(i, i + 1).c_str(), NULL, 16);
+        }
+        scheduleActive = true;
+        Serial.print("CONFIG_ACK:SCHEDULE:");
+        Serial.println(first);
+      }
+    }
   } else if (command == "CONFIG_RESET") {
     initializeDefaultConfig();
     Serial.println("CONFIG_ACK:RESET");
+  } else if (command == "PROTO:BIN") {
+    // Acknowledge in text, everything after this is binary event frames
+    Serial.println("PROTO_ACK:BIN");
+    binaryProtocol = true;
+  } else if (command == "PROTO:TEXT") {
+    binaryProtocol = false;
+    Serial.println("PROTO_ACK:TEXT");
   } else if (command == "CONFIG_STATUS") {
+    // Format: STATUS:READERS:n:TAGS:m:ID:boardId:CRC:readerTableChecksum
     Serial.print("STATUS:READERS:");
     Serial.print(numActiveReaders);
     Serial.print(":TAGS:");
-    Serial.println(numKnownTags);
+    Serial.print(numKnownTags);
+    Serial.print(":ID:");
+    Serial.print(BOARD_ID);
+    Serial.print(":CRC:");
+    Serial.println(configChecksum(), HEX);
+    // The server answers with the changes, if any
+    configHold = true;
   }
 }
 
@@ -9,6 +9,39 @@
 extern ReaderConfig readers[MAX_READERS];
 extern uint8_t numActiveReaders;
 
+/**
+ * Initialize one RFID reader at its configured mux channel
+ */
+void initializeReader(uint8_t i) {
+  selectMuxChannel(readers[i].muxAddress, readers[i].muxChannel);
+  delay(MUX_SWITCH_DELAY);
+  
+  if (readers[i].reader == nullptr) {
+    readers[i].reader = new Adafruit_PN532(-1, -1, &Wire);
+  }
+  readers[i].reader->begin();
+  delay(10);
+  readers[i].changed = false;
+  
+  uint32_t versiondata = readers[i].reader->getFirmwareVersion();
+  if (versiondata) {
+    readers[i].reader->SAMConfig();
+    readers[i].isActive = true;
+    Serial.print("✅ Reader ");
+    Serial.print(i);
+    Serial.print(" (");
+    Serial.print(readers[i].position);
+    Serial.println(") initialized");
+  } else {
+    readers[i].isActive = false;
+    Serial.print("❌ Reader ");
+    Serial.print(i);
+    Serial.print(" (");
+    Serial.print(readers[i].position);
+    Serial.println(") not found");
+  }
+}
+
 /**
  * Initialize all RFID readers
  */
@@ -16,30 +49,7 @@ void initializeReaders() {
   Serial.println("Initializing RFID readers...");
   
   for (uint8_t i = 0; i < numActiveReaders; i++) {
-    selectMuxChannel(readers[i].muxAddress, readers[i].muxChannel);
-    delay(MUX_SWITCH_DELAY);
-    
-    readers[i].reader = new Adafruit_PN532(-1, -1, &Wire);
-    readers[i].reader->begin();
-    delay(10);
-    
-    uint32_t versiondata = readers[i].reader->getFirmwareVersion();
-    if (versiondata) {
-      readers[i].reader->SAMConfig();
-      readers[i].isActive = true;
-      Serial.print("✅ Reader ");
-      Serial.print(i);
-      Serial.print(" (");
-      Serial.print(readers[i].position);
-      Serial.println(") initialized");
-    } else {
-      readers[i].isActive = false;
-      Serial.print("❌ Reader ");
-      Serial.print(i);
-      Serial.print(" (");
-      Serial.print(readers[i].position);
-      Serial.println(") not found");
-    }
+    initializeReader(i);
   }
   
   Serial.print("Initialization complete. Active readers: ");
@@ -49,5 +59,3 @@ void initializeReaders() {
   }
   Serial.println(activeCount);
 }
-
-
@@ -15,6 +15,13 @@ ReaderConfig readers[MAX_READERS];
 TagState tagStates[MAX_READERS];
 uint8_t numActiveReaders = 0;
 uint8_t numKnownTags = 0;
+bool binaryProtocol = false;    // Switched on by PROTO:BIN from the server
+bool scheduleActive = false;    // Switched on by CONFIG_SCHEDULE from the server
+bool configHold = false;        // The server is configuring the board, hold off scanning
+uint32_t scanPass = 0;
+uint32_t reportPasses = 0;
+uint32_t reportPassMs = 0;
+uint32_t lastReport = 0;
 
 // ======================
 // MAIN FUNCTIONS
@@ -38,17 +45,31 @@ void setup() {
 }
 
 void loop() {
-  // Process serial commands
-  if (Serial.available()) {
-    String command = Serial.readStringUntil("\n");
-    processConfigCommand(command);
+  // Process serial commands (a schedule arrives as several); while the
+  // server is configuring the board, wait CONFIG_HOLD_MS for each next one
+  uint32_t lastCommand = millis();
+  while (Serial.available() || (configHold && millis() - lastCommand < CONFIG_HOLD_MS)) {
+    if (Serial.available()) {
+      String command = Serial.readStringUntil('\n');
+      processConfigCommand(command);
+      lastCommand = millis();
+    }
   }
+  configHold = false;
+  
+  uint32_t passStart = millis();
+  scanPass++;
   
-  // Scan all active readers
+  // Scan all active readers, each on the passes its scan period selects
   for (uint8_t readerIndex = 0; readerIndex < numActiveReaders; readerIndex++) {
     if (!readers[readerIndex].isActive) {
       continue;
     }
+    uint8_t period = readers[readerIndex].scanPeriod;
+    // Offset by the reader index so slow readers are spread over the passes
+    if (period == 0 || (scanPass + readerIndex) % period != 0) {
+      continue;
+    }
     
     // Select reader
     selectMuxChannel(readers[readerIndex].muxAddress, readers[readerIndex].muxChannel);
@@ -117,6 +138,17 @@ void loop() {
     
     delay(SCAN_DELAY);
   }
+  
+  if (scheduleActive) {
+    reportPasses++;
+    reportPassMs += millis() - passStart;
+    if (millis() - lastReport >= SCAN_REPORT_INTERVAL) {
+      sendScanReport(reportPasses, reportPassMs);
+      reportPasses = 0;
+      reportPassMs = 0;
+      lastReport = millis();
+    }
+  }
 }
 
 
@@ -12,6 +12,8 @@ struct ReaderConfig {
   uint8_t muxChannel;           // Channel on multiplexer (0-7)
   char position[4];             // Position notation (e.g., "a1", "b2")
   bool isActive;                // Whether this reader is connected and working
+  uint8_t scanPeriod;           // Scanned every scanPeriod-th pass (0 = never)
+  bool changed;                 // Reconfigured since it was last initialized
   Adafruit_PN532* reader;       // Pointer to PN532 instance
 };
 
@@ -8,6 +8,7 @@ extern ReaderConfig readers[MAX_READERS];
 extern TagState tagStates[MAX_READERS];
 extern uint8_t numActiveReaders;
 extern uint8_t numKnownTags;
+extern bool binaryProtocol;
 
 /**
  * Select a specific channel on a multiplexer
@@ -60,10 +61,100 @@ void uidToHexString(uint8_t* uid, uint8_t uidLength, char* hexString) {
   hexString[uidLength * 2] = '\0';
 }
 
+/**
+ * CRC-8 (polynomial 0x07) used by binary frames
+ */
+uint8_t crc8(const uint8_t* data, uint8_t length) {
+  uint8_t crc = 0;
+  for (uint8_t i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+/**
+ * CRC-16/XMODEM over the reader table: index, mux address, channel and the
+ * position zero-padded to 3 characters of every active reader
+ */
+uint16_t configChecksum() {
+  uint16_t crc = 0;
+  for (uint8_t i = 0; i < numActiveReaders; i++) {
+    uint8_t entry[6] = {i, readers[i].muxAddress, readers[i].muxChannel, 0, 0, 0};
+    strncpy((char*)entry + 3, readers[i].position, 3);
+    for (uint8_t j = 0; j < sizeof(entry); j++) {
+      crc ^= (uint16_t)entry[j] << 8;
+      for (uint8_t bit = 0; bit < 8; bit++) {
+        crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+      }
+    }
+  }
+  return crc;
+}
+
+/**
+ * Report scan passes, their mean duration and the readers that are not working
+ * Format: SCAN:passes:meanPassMs:inactiveMask (hex, reader 0 in the lowest bit)
+ */
+void sendScanReport(uint32_t passes, uint32_t totalPassMs) {
+  char mask[MAX_READERS / 4 + 1];
+  uint8_t digits = (numActiveReaders + 3) / 4;
+  for (uint8_t digit = 0; digit < digits; digit++) {
+    uint8_t nibble = 0;
+    for (uint8_t bit = 0; bit < 4; bit++) {
+      uint8_t readerIndex = digit * 4 + bit;
+      if (readerIndex < numActiveReaders && !readers[readerIndex].isActive) {
+        nibble |= 1 << bit;
+      }
+    }
+    // Most significant digit first
+    mask[digits - 1 - digit] = "0123456789ABCDEF"[nibble];
+  }
+  mask[digits] = '\0';
+  
+  Serial.print("SCAN:");
+  Serial.print(passes);
+  Serial.print(":");
+  Serial.print(passes ? totalPassMs / passes : 0);
+  Serial.print(":");
+  Serial.println(mask);
+}
+
+/**
+ * Send an event as a binary frame
+ */
+void sendBinaryMessage(uint8_t opcode, int8_t tagIndex, int8_t readerIndex, int8_t fromReader) {
+  uint8_t frame[5 + 7 + 1];
+  uint8_t uidLength = tagStates[tagIndex].uidLength;
+  
+  frame[0] = FRAME_SYNC;
+  frame[1] = opcode;
+  frame[2] = readerIndex;
+  frame[3] = (fromReader < 0) ? FRAME_NO_READER : fromReader;
+  frame[4] = uidLength;
+  memcpy(frame + 5, tagStates[tagIndex].uid, uidLength);
+  frame[5 + uidLength] = crc8(frame + 1, 4 + uidLength);
+  
+  Serial.write(frame, 6 + uidLength);
+}
+
 /**
  * Send standardized message to server
  */
 void sendMessage(const char* action, int8_t tagIndex, int8_t readerIndex, int8_t fromReader = -1) {
+  if (binaryProtocol) {
+    if (strcmp(action, "LIFT") == 0) {
+      sendBinaryMessage(FRAME_OP_LIFT, tagIndex, readerIndex, -1);
+    } else if (strcmp(action, "PLACE") == 0) {
+      sendBinaryMessage(FRAME_OP_PLACE, tagIndex, readerIndex, -1);
+    } else if (strcmp(action, "MOVE") == 0 && fromReader >= 0) {
+      sendBinaryMessage(FRAME_OP_MOVE, tagIndex, readerIndex, fromReader);
+    }
+    return;
+  }
+  
   char uidHex[15]; // Max 7 bytes * 2 + null terminator
   uidToHexString(tagStates[tagIndex].uid, tagStates[tagIndex].uidLength, uidHex);
   
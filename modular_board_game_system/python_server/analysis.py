@@ -0,0 +1,339 @@
+"""Offline statistics over recorded board sessions.
+
+    python analysis.py captures/ --game chess --board 8x8 --output stats/
+
+Inputs are serial captures and event logs, found by walking the files and
+directories given. A capture has one line from the board per line, either
+bare or prefixed with a timestamp in seconds ("12.345 MOVE:..." or
+"[12.345] MOVE:...", as logging serial terminals write them); lines that
+are not events are skipped. Event logs (--log of main.py, see event_log.py)
+are recognized by their header. Every file is one session, replayed from
+the start through a fresh GameLogic with no GUI or pipeline (and through
+an EventDebouncer with --debounce, as the server would).
+
+Files are analyzed in a process pool, a bounded number at a time. Each
+worker streams its file an event at a time and sends back a SessionStats
+whose size depends only on the board and the number of tags, which the
+parent merges. Memory use therefore does not grow with the corpus.
+
+The results are written as columnar tables (CSV files, or one JSON file
+of column lists with --format json):
+
+    squares     square, moves, invalid_moves, invalid_rate   (by destination square)
+    tags        uid, events, lifts, flickers, unknown_events, reliability
+    move_times  kind, le_seconds, count
+    summary     one row of corpus totals
+
+A flicker is a LIFT followed by the same tag reappearing on the same square
+within --window seconds (see debounce.py); reliability is the share of a
+tag's lifts that were not flickers. move_times has two distributions:
+"think", the time between consecutive valid moves of a session, and "hold",
+the time from lifting a piece to putting it down.
+"""
+import argparse
+import concurrent.futures
+import csv
+import dataclasses
+import json
+import logging
+import os
+import re
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import GameEvent, GameEventData
+from metrics import LatencyHistogram
+
+if TYPE_CHECKING:
+    from debounce import EventDebouncer
+
+log = logging.getLogger(__name__)
+
+# Timing buckets up to 2^31 microseconds (about 36 minutes)
+TIME_BUCKETS = 32
+TIMESTAMP_PREFIX = re.compile(r"^\[?(\d+(?:\.\d*)?)\]?\s+")
+
+@dataclasses.dataclass
+class SessionStats:
+    """Counts from one or more sessions; merge() adds another one in"""
+    files: int = 0
+    failed_files: int = 0
+    events: int = 0
+    skipped_lines: int = 0
+    moves: int = 0
+    invalid_moves: int = 0
+    # square -> [moves, invalid moves]
+    squares: Dict[str, List[int]] = dataclasses.field(default_factory=dict)
+    # uid -> [events, lifts, flickers, 1 per event if the tag is not one of the game's pieces]
+    tags: Dict[str, List[int]] = dataclasses.field(default_factory=dict)
+    think: LatencyHistogram = dataclasses.field(default_factory=lambda: LatencyHistogram(TIME_BUCKETS))
+    hold: LatencyHistogram = dataclasses.field(default_factory=lambda: LatencyHistogram(TIME_BUCKETS))
+    
+    def merge(self, other: "SessionStats"):
+        self.files += other.files
+        self.failed_files += other.failed_files
+        self.events += other.events
+        self.skipped_lines += other.skipped_lines
+        self.moves += other.moves
+        self.invalid_moves += other.invalid_moves
+        for table, other_table in ((self.squares, other.squares), (self.tags, other.tags)):
+            for key, counts in other_table.items():
+                mine = table.get(key)
+                if mine is None:
+                    table[key] = list(counts)
+                else:
+                    for column, count in enumerate(counts):
+                        mine[column] += count
+        self.think.merge(other.think)
+        self.hold.merge(other.hold)
+
+def find_files(paths: Iterable[str]) -> Iterator[str]:
+    """Every file under the given files and directories, in a stable order"""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, names in os.walk(path):
+                subdirectories.sort()
+                for name in sorted(names):
+                    yield os.path.join(directory, name)
+        else:
+            yield path
+
+def read_capture(path: str, stats: SessionStats) -> Iterator[Tuple[Optional[float], GameEventData]]:
+    """(timestamp or None, event) for every event line of a serial capture"""
+    from main import parse_message
+    
+    with open(path, encoding="utf-8", errors="replace") as capture:
+        for line in capture:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            timestamp = None
+            prefix = TIMESTAMP_PREFIX.match(line)
+            if prefix:
+                timestamp = float(prefix.group(1))
+                line = line[prefix.end():]
+            event = parse_message(line)
+            if event is None:
+                stats.skipped_lines += 1
+                continue
+            yield timestamp, event
+
+def read_session(path: str, board_config, stats: SessionStats) -> Iterator[Tuple[Optional[float], GameEventData]]:
+    from event_log import FILE_MAGIC, stream_events
+    
+    with open(path, "rb") as session_file:
+        is_event_log = session_file.read(len(FILE_MAGIC)) == FILE_MAGIC
+    if is_event_log:
+        return stream_events(path, board_config)
+    return read_capture(path, stats)
+
+class SessionReplay:
+    """Replays one session's events through a fresh GameLogic, counting into stats"""
+    
+    def __init__(self, game_type: str, board_size: str, window: float = 0.25, debounce: Optional[float] = None):
+        from game_logic.registry import create_game_logic
+        from main import create_board_config
+        
+        self.stats = SessionStats(files=1)
+        self.board_config = create_board_config(board_size)
+        self.game = create_game_logic(game_type, self.board_config)
+        self.known = set(self.game.initialize_pieces())
+        self.window = window
+        # As on a server started with --debounce; flickers are still counted from the raw events
+        self.debouncer: Optional["EventDebouncer"] = None
+        if debounce:
+            from debounce import EventDebouncer
+            self.debouncer = EventDebouncer(debounce)
+        # uid -> (square, time) of its last LIFT, until the tag is seen again
+        self._lifted: Dict[str, Tuple[str, Optional[float]]] = {}
+        # uid -> LIFT not yet applied to the game, see _apply
+        self._held_lifts: Dict[str, GameEventData] = {}
+        self._last_move: Optional[float] = None
+    
+    def feed(self, timestamp: Optional[float], event: GameEventData):
+        self._observe(timestamp, event)
+        if self.debouncer is None:
+            self._apply(timestamp, event)
+            return
+        # Without timestamps a held LIFT is only released by the next event
+        for passed in self.debouncer.feed(event, 0.0 if timestamp is None else timestamp):
+            self._apply(timestamp, passed)
+    
+    def finish(self) -> SessionStats:
+        if self.debouncer is not None:
+            for passed in self.debouncer.flush():
+                self._apply(None, passed)
+        for lift in list(self._held_lifts.values()):
+            self.game.handle_event(lift)
+        self._held_lifts.clear()
+        return self.stats
+    
+    def _observe(self, timestamp: Optional[float], event: GameEventData):
+        """Tag statistics, from the events as the board sent them"""
+        stats = self.stats
+        stats.events += 1
+        tag = stats.tags.get(event.piece_uid)
+        if tag is None:
+            tag = stats.tags[event.piece_uid] = [0, 0, 0, 0]
+        tag[0] += 1
+        if event.piece_uid not in self.known:
+            tag[3] += 1
+        
+        if event.event_type == GameEvent.PIECE_LIFTED:
+            tag[1] += 1
+            self._lifted[event.piece_uid] = (event.position, timestamp)
+            return
+        lift = self._lifted.pop(event.piece_uid, None)
+        if lift is None:
+            return
+        held = timestamp - lift[1] if timestamp is not None and lift[1] is not None else None
+        if event.position == lift[0] and (held is None or held <= self.window):
+            tag[2] += 1
+        elif held is not None:
+            stats.hold.record(held)
+    
+    def _apply(self, timestamp: Optional[float], event: GameEventData):
+        """Move statistics, from the game's responses.
+        
+        The board reports a move as a LIFT and then a MOVE from the lifted
+        square. The game only accepts a move of a piece still on its square,
+        so a LIFT is held back until the tag is seen again: a MOVE from that
+        square is applied on its own, anything else after the LIFT.
+        """
+        lift = self._held_lifts.pop(event.piece_uid, None)
+        if event.event_type == GameEvent.PIECE_LIFTED:
+            if lift is not None:
+                self.game.handle_event(lift)
+            self._held_lifts[event.piece_uid] = event
+            return
+        if lift is not None and not (event.event_type == GameEvent.PIECE_MOVED
+                                     and event.from_position == lift.position):
+            self.game.handle_event(lift)
+        response = self.game.handle_event(event)
+        if event.event_type != GameEvent.PIECE_MOVED:
+            return
+        stats = self.stats
+        square = stats.squares.get(event.position)
+        if square is None:
+            square = stats.squares[event.position] = [0, 0]
+        square[0] += 1
+        stats.moves += 1
+        if not response.get("valid", True):
+            square[1] += 1
+            stats.invalid_moves += 1
+        elif timestamp is not None:
+            if self._last_move is not None:
+                stats.think.record(timestamp - self._last_move)
+            self._last_move = timestamp
+
+def analyze_file(path: str, game_type: str, board_size: str, window: float = 0.25,
+                 debounce: Optional[float] = None) -> SessionStats:
+    """Replay one session and count what happened in it"""
+    replay = SessionReplay(game_type, board_size, window, debounce)
+    try:
+        for timestamp, event in read_session(path, replay.board_config, replay.stats):
+            replay.feed(timestamp, event)
+    except Exception as e:
+        # One unreadable or corrupt session must not end a run over thousands
+        log.warning("Skipping the rest of %s: %s", path, e)
+        replay.stats.failed_files += 1
+    return replay.finish()
+
+def analyze(paths: Iterable[str], game_type: str, board_size: str, workers: Optional[int] = None,
+            window: float = 0.25, debounce: Optional[float] = None, in_flight: int = 4) -> SessionStats:
+    """Analyze every session file under paths and merge the results.
+    
+    With workers=0 the files are analyzed one by one in this process. At
+    most in_flight files per worker are queued at any time.
+    """
+    total = SessionStats()
+    files = find_files(paths)
+    if workers == 0:
+        for path in files:
+            total.merge(analyze_file(path, game_type, board_size, window, debounce))
+        return total
+    
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        for path in files:
+            pending.add(pool.submit(analyze_file, path, game_type, board_size, window, debounce))
+            if len(pending) >= workers * in_flight:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    total.merge(future.result())
+        for future in concurrent.futures.as_completed(pending):
+            total.merge(future.result())
+    return total
+
+def tables(stats: SessionStats) -> Dict[str, Dict[str, List[Any]]]:
+    """The results as columns per table"""
+    squares = sorted(stats.squares.items())
+    tags = sorted(stats.tags.items())
+    move_times: Dict[str, List[Any]] = {"kind": [], "le_seconds": [], "count": []}
+    for kind, histogram in (("think", stats.think), ("hold", stats.hold)):
+        for bucket, count in enumerate(histogram.buckets):
+            if count:
+                move_times["kind"].append(kind)
+                move_times["le_seconds"].append((1 << bucket) / 1_000_000 if bucket < TIME_BUCKETS - 1 else "+Inf")
+                move_times["count"].append(count)
+    return {
+        "squares": {
+            "square": [square for square, _ in squares],
+            "moves": [counts[0] for _, counts in squares],
+            "invalid_moves": [counts[1] for _, counts in squares],
+            "invalid_rate": [round(counts[1] / counts[0], 6) if counts[0] else 0.0 for _, counts in squares],
+        },
+        "tags": {
+            "uid": [uid for uid, _ in tags],
+            "events": [counts[0] for _, counts in tags],
+            "lifts": [counts[1] for _, counts in tags],
+            "flickers": [counts[2] for _, counts in tags],
+            "unknown_events": [counts[3] for _, counts in tags],
+            "reliability": [round(1 - counts[2] / counts[1], 6) if counts[1] else 1.0 for _, counts in tags],
+        },
+        "move_times": move_times,
+        "summary": {
+            "files": [stats.files],
+            "failed_files": [stats.failed_files],
+            "events": [stats.events],
+            "skipped_lines": [stats.skipped_lines],
+            "moves": [stats.moves],
+            "invalid_moves": [stats.invalid_moves],
+            "think_p50_seconds": [stats.think.percentile(0.5)],
+            "hold_p50_seconds": [stats.hold.percentile(0.5)],
+        },
+    }
+
+def write_tables(columns: Dict[str, Dict[str, List[Any]]], output: str, output_format: str = "csv"):
+    os.makedirs(output, exist_ok=True)
+    if output_format == "json":
+        with open(os.path.join(output, "analysis.json"), "w") as json_file:
+            json.dump(columns, json_file)
+        return
+    for name, table in columns.items():
+        with open(os.path.join(output, f"{name}.csv"), "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(table.keys())
+            writer.writerows(zip(*table.values()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Statistics over recorded board sessions")
+    parser.add_argument("paths", nargs="+", help="capture files, event logs or directories of them")
+    parser.add_argument("--game", default="chess", help="game the sessions were played with")
+    parser.add_argument("--board", default="8x8", help="4x4 or 8x8")
+    parser.add_argument("--output", default="analysis", help="directory for the result tables")
+    parser.add_argument("--format", dest="output_format", default="csv", choices=["csv", "json"])
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU, 0 = none)")
+    parser.add_argument("--window", type=float, default=0.25,
+                        help="seconds within which a tag back on its square counts as a flicker")
+    parser.add_argument("--debounce", type=int, default=0, metavar="MS",
+                        help="replay as a server started with --debounce MS would (default: off)")
+    args = parser.parse_args()
+    
+    from logging_config import configure
+    configure("info")
+    
+    stats = analyze(args.paths, args.game, args.board, args.workers, args.window, args.debounce / 1000)
+    write_tables(tables(stats), args.output, args.output_format)
+    log.info("%d sessions (%d failed), %d events, %d moves of which %d invalid -> %s",
+             stats.files, stats.failed_files, stats.events, stats.moves, stats.invalid_moves, args.output)
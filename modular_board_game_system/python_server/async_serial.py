@@ -0,0 +1,75 @@
+"""asyncio transport for a SerialCommunication connection.
+
+The port's file descriptor is registered with the event loop (add_reader),
+so received bytes are framed and handed to the batch callback on the loop
+thread and no reader thread or polling sleep is involved. Where the
+connection has no pollable descriptor (Windows, the simulator's in-memory
+board) the usual reader thread is started and its batches are forwarded
+into the loop with call_soon_threadsafe. Either way `closed` is set when
+the connection fails or the board hangs up.
+
+Outgoing commands are queued with send_command() and written by the
+connection's command writer thread (see command_channel.py), so callbacks
+on the loop never block on the serial port.
+"""
+import asyncio
+from typing import Callable, List, Optional, Union
+
+from command_channel import Command
+from config import GameEventData
+from serial_communication import SerialCommunication
+
+class AsyncSerialLink:
+    """Drives a SerialCommunication from an asyncio event loop"""
+    
+    def __init__(self, serial_comm: SerialCommunication):
+        self.serial_comm = serial_comm
+        # Set whenever new messages were handed to the batch callback
+        self.data_ready = asyncio.Event()
+        self.closed = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fd: Optional[int] = None
+    
+    async def start(self) -> bool:
+        """Open the port and start reading and writing on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        if not self.serial_comm.open():
+            return False
+        
+        batch_callback = self.serial_comm.batch_callback
+        
+        def on_batch(messages: List[Union[str, GameEventData]]):
+            if batch_callback:
+                batch_callback(messages)
+            self.data_ready.set()
+        
+        try:
+            self._fd = self.serial_comm.fileno()
+            self.serial_comm.set_batch_callback(on_batch)
+            self._loop.add_reader(self._fd, self._on_readable)
+        except (AttributeError, ValueError, OSError, NotImplementedError):
+            # No pollable descriptor: read on a thread, handle batches on the loop
+            self._fd = None
+            self.serial_comm.set_batch_callback(
+                lambda messages: self._loop.call_soon_threadsafe(on_batch, messages))
+            self.serial_comm.set_disconnect_callback(lambda: self._loop.call_soon_threadsafe(self.closed.set))
+            self.serial_comm.start_reader_thread()
+        return True
+    
+    def send_command(self, command: str, on_done: Optional[Callable[[Command, bool], None]] = None,
+                     timeout: Optional[float] = None):
+        """Queue a command for the writer thread (never blocks)"""
+        self.serial_comm.send_command(command, on_done, timeout)
+    
+    async def close(self):
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self.serial_comm.stop()
+        self.closed.set()
+    
+    def _on_readable(self):
+        if not self.serial_comm.read_available():
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+            self.closed.set()
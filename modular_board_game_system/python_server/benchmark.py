@@ -0,0 +1,221 @@
+"""Reproducible micro-benchmarks for the server hot paths.
+
+Covers move generation for every piece type on 4x4 and 8x8 boards,
+GameLogic.handle_event throughput on a scripted (seeded) game, hint search
+time per node at a fixed depth, serial message parsing for the text and
+binary protocols, and BoardGUI.render frame times under SDL's headless
+dummy driver.
+
+    python benchmark.py                       # print JSON results
+    python benchmark.py --output results.json
+    python benchmark.py --compare baseline.json --threshold 0.2
+
+With --compare the run exits non-zero if any benchmark got slower than the
+baseline by more than the threshold (20% by default).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from config import BoardConfig, GameEvent, GameEventData, PieceInfo
+from game_logic.base import GameLogic
+from serial_communication import FrameDecoder, LineFramer
+
+BOARDS = {"4x4": BoardConfig.create_4x4_config, "8x8": BoardConfig.create_8x8_config}
+PIECE_TYPES = {"chess": ["pawn", "rook", "knight", "king"], "checkers": ["piece"]}
+
+def measure(func: Callable[[], object], operations: int = 1, repeat: int = 5,
+            min_time: float = 0.05) -> Dict[str, float]:
+    """Time func, returning nanoseconds per operation (best and median of repeat runs)"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - started >= min_time:
+            break
+        loops *= 2
+    
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - started) / (loops * operations) * 1e9)
+    return {"best_ns": min(samples), "median_ns": statistics.median(samples)}
+
+def _game(game_type: str, board_size: str) -> GameLogic:
+    from main import create_game_logic
+    game_logic = create_game_logic(game_type, BOARDS[board_size]())
+    game_logic.initialize_pieces()
+    return game_logic
+
+def _scripted_events(board_size: str, game_type: str, count: int) -> Tuple[List[bytes], List[bytes]]:
+    """Deterministic text and binary event streams from the simulated board"""
+    from simulator import SimulatedBoard
+    
+    uids = list(_game(game_type, board_size).pieces)
+    streams = []
+    for binary in (False, True):
+        board = SimulatedBoard(BOARDS[board_size](), uids, miss_rate=0.02, seed=1234)
+        board.binary_protocol = binary
+        messages: List[bytes] = []
+        while len(messages) < count:
+            messages.extend(board.scan())
+        streams.append(messages[:count])
+    return streams[0], streams[1]
+
+def bench_move_generation(results: Dict[str, Dict[str, float]]):
+    for game_type, piece_types in PIECE_TYPES.items():
+        for board_size in BOARDS:
+            for piece_type in piece_types:
+                game_logic = _game(game_type, board_size)
+                rows, cols = game_logic.board_config.size
+                center = game_logic.board_config.square_names[(rows // 2, cols // 2)]
+                color = "White" if game_type == "chess" else "Red"
+                piece = PieceInfo("BENCH", piece_type, color)
+                game_logic.pieces[piece.uid] = piece
+                game_logic.handle_event(GameEventData(GameEvent.PIECE_PLACED, piece.uid, center))
+                results[f"movegen.{game_type}.{board_size}.{piece_type}"] = measure(
+                    lambda: game_logic.get_possible_moves(piece))
+
+def bench_handle_event(results: Dict[str, Dict[str, float]]):
+    from main import parse_message
+    
+    for game_type in PIECE_TYPES:
+        for board_size in BOARDS:
+            text_stream, _ = _scripted_events(board_size, game_type, 2000)
+            events = [parse_message(line.decode().strip()) for line in text_stream]
+            
+            def replay():
+                game_logic = _game(game_type, board_size)
+                for event in events:
+                    game_logic.handle_event(event)
+            
+            results[f"handle_event.{game_type}.{board_size}"] = measure(replay, operations=len(events))
+
+def bench_search(results: Dict[str, Dict[str, float]]):
+    """Fixed-depth hint search with a fresh transposition table, per node searched"""
+    from game_logic.search import SearchEngine
+    
+    positions = {
+        "chess": ["a1", "e1", "b1", "d2", "a8", "e8", "g8", "d7"],
+        "checkers": ["a3", "c3", "e3", "g3", "b6", "d6", "f6", "h6"],
+    }
+    for game_type, squares in positions.items():
+        game_logic = _game(game_type, "8x8")
+        for uid, position in zip(list(game_logic.pieces), squares):
+            game_logic.handle_event(GameEventData(GameEvent.PIECE_PLACED, uid, position))
+        color = game_logic.colors()[0]
+        nodes = SearchEngine(game_logic).search(color, float("inf"), max_depth=3)[-1].nodes
+        results[f"search.{game_type}.8x8.depth3"] = measure(
+            lambda: SearchEngine(game_logic).search(color, float("inf"), max_depth=3), operations=nodes, repeat=3)
+
+def bench_parsing(results: Dict[str, Dict[str, float]]):
+    from main import parse_message
+    
+    text_stream, binary_stream = _scripted_events("8x8", "chess", 2000)
+    text_bytes = b"".join(text_stream)
+    binary_bytes = b"".join(binary_stream)
+    positions = BOARDS["8x8"]().index_names
+    
+    def parse_text():
+        for line in LineFramer(max_line_length=len(text_bytes)).feed(text_bytes):
+            parse_message(line)
+    
+    results["parse.text"] = measure(parse_text, operations=len(text_stream))
+    results["parse.binary"] = measure(lambda: FrameDecoder(positions).feed(binary_bytes),
+                                      operations=len(binary_stream))
+    # A connection keeps its decoder, whose frame cache is warm after the first few events
+    decoder = FrameDecoder(positions)
+    decoder.feed(binary_bytes)
+    results["parse.binary.steady"] = measure(lambda: decoder.feed(binary_bytes), operations=len(binary_stream))
+
+def bench_render(results: Dict[str, Dict[str, float]]):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    from gui import BoardGUI
+    
+    for board_size in BOARDS:
+        game_logic = _game("chess", board_size)
+        gui = BoardGUI(game_logic.board_config)
+        positions = list(game_logic.board_config.position_mapping)
+        for uid, position in zip(game_logic.pieces, positions):
+            game_logic.handle_event(GameEventData(GameEvent.PIECE_PLACED, uid, position))
+        gui.update_board_state(game_logic.board_state)
+        gui.render()
+        
+        def full_frame():
+            gui.mark_all_dirty()
+            gui.render()
+        
+        toggle = [0]
+        
+        def event_frame():
+            toggle[0] ^= 1
+            gui.update_highlights({"clear": True} if toggle[0] else {"selected": [positions[0]]})
+            gui.set_message(f"message {toggle[0]}")
+            gui.render()
+        
+        results[f"render.{board_size}.full"] = measure(full_frame)
+        results[f"render.{board_size}.event"] = measure(event_frame)
+        results[f"render.{board_size}.idle"] = measure(gui.render)
+        gui.quit()
+
+SUITES = {
+    "movegen": bench_move_generation,
+    "handle_event": bench_handle_event,
+    "search": bench_search,
+    "parse": bench_parsing,
+    "render": bench_render,
+}
+
+def run(suites: List[str]) -> Dict[str, object]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in suites:
+        SUITES[name](results)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], threshold: float) -> List[str]:
+    """Names of benchmarks whose best time regressed by more than threshold"""
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous and result["best_ns"] > previous["best_ns"] * (1 + threshold):
+            change = result["best_ns"] / previous["best_ns"] - 1
+            regressions.append(f"{name}: {previous['best_ns']:.0f} -> {result['best_ns']:.0f} ns (+{change:.0%})")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game board server")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES),
+                        help="suite to run (repeatable, default: all)")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before failing")
+    args = parser.parse_args()
+    
+    report = run(args.suite or list(SUITES))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+    
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
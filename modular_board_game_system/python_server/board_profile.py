@@ -0,0 +1,354 @@
+"""Board profiles: the reader wiring of a board, validated and synced to its firmware.
+
+A profile is a JSON file describing the board and which multiplexer
+channel each reader sits on:
+
+    {
+        "name": "Club board",
+        "rows": 8, "cols": 8, "square_size": 80,
+        "readers": [
+            {"index": 0, "mux": "0x70", "channel": 0, "square": "a8"},
+            ...
+        ]
+    }
+
+Reader indexes run from 0 without gaps (the firmware scans readers
+0..n-1), squares are named like the grid boards (a1 bottom left) and no
+two readers may share a square or a mux channel. Leaving "readers" out
+gives the firmware's default wiring, row-major from a<rows>, 8 readers
+per multiplexer from 0x70.
+
+BoardConfigurator brings a board in line with a profile. It asks for
+CONFIG_STATUS, whose reply carries the board's identity and a CRC-16 of
+its reader table. A board that already matches needs nothing more. If
+not, the changed readers are sent as one pipelined batch of CONFIG_READER
+lines, ended by CONFIG_COMMIT, and the board answers once. The table
+the diff is taken against comes from ProfileCache, which remembers the
+profile last applied to each board ID, or from CONFIG_DUMP when the board
+has been changed behind the cache's back.
+"""
+import binascii
+import dataclasses
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from command_channel import Command
+from config import BoardConfig
+
+log = logging.getLogger(__name__)
+
+# Mirrors arduino_firmware/config.h
+MAX_READERS = 64
+CHANNELS_PER_MUX = 8
+# TCA9548A multiplexers can be set to 0x70-0x77
+MUX_ADDRESSES = range(0x70, 0x78)
+# CONFIG_COMMIT initializes each changed or new reader before answering: a
+# mux switch, begin() and, for a missing PN532, a getFirmwareVersion() that
+# waits about a second for an answer
+READER_INIT_SECONDS = 1.2
+# What any command gets (CommandChannel's default timeout)
+COMMIT_TIMEOUT = 3.0
+
+def table_checksum(readers: List["ReaderEntry"]) -> int:
+    """CRC-16/XMODEM of a reader table, as the firmware's configChecksum() computes it"""
+    return binascii.crc_hqx(b"".join(entry.packed() for entry in readers), 0)
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ReaderEntry:
+    """Where one reader is wired and which square it is under"""
+    index: int
+    mux: int
+    channel: int
+    square: str
+    
+    def command(self) -> str:
+        """The CONFIG_READER line that sets this entry"""
+        return f"CONFIG_READER:{self.index}:{self.mux:X}:{self.channel}:{self.square}"
+    
+    def packed(self) -> bytes:
+        """The entry as the firmware's configChecksum() sees it"""
+        return bytes((self.index, self.mux, self.channel)) + self.square.encode().ljust(3, b"\0")[:3]
+    
+    @classmethod
+    def parse(cls, line: str) -> "ReaderEntry":
+        """From a CONFIG_READER:index:mux:channel:square line (as CONFIG_DUMP prints them)"""
+        _, index, mux, channel, square = line.split(":")
+        return cls(int(index), int(mux, 16), int(channel), square)
+
+@dataclasses.dataclass
+class BoardProfile:
+    """A board's dimensions and reader wiring"""
+    name: str
+    rows: int
+    cols: int
+    square_size: int = 80
+    readers: List[ReaderEntry] = dataclasses.field(default_factory=list)
+    
+    @classmethod
+    def default(cls, rows: int, cols: int, square_size: int = 80, name: str = "") -> "BoardProfile":
+        """The wiring the firmware uses when nothing else is configured"""
+        names = BoardConfig.create_grid_config(rows, cols).index_names
+        readers = [ReaderEntry(index, 0x70 + index // CHANNELS_PER_MUX, index % CHANNELS_PER_MUX, square)
+                   for index, square in enumerate(names)]
+        return cls(name or f"{rows}x{cols}", rows, cols, square_size, readers)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], source: str = "<profile>") -> "BoardProfile":
+        try:
+            rows, cols = int(data["rows"]), int(data["cols"])
+            square_size = int(data.get("square_size", 80))
+            name = str(data.get("name", os.path.splitext(os.path.basename(source))[0]))
+            if "readers" not in data:
+                profile = cls.default(rows, cols, square_size, name)
+            else:
+                readers = [ReaderEntry(int(entry["index"]),
+                                       int(entry["mux"], 16) if isinstance(entry["mux"], str) else int(entry["mux"]),
+                                       int(entry["channel"]), str(entry["square"]))
+                           for entry in data["readers"]]
+                profile = cls(name, rows, cols, square_size, sorted(readers, key=lambda entry: entry.index))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{source}: malformed board profile ({e!r})")
+        profile.validate(source)
+        return profile
+    
+    @classmethod
+    def load(cls, path: str) -> "BoardProfile":
+        with open(path) as profile_file:
+            try:
+                data = json.load(profile_file)
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}")
+        return cls.from_dict(data, source=path)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "rows": self.rows,
+            "cols": self.cols,
+            "square_size": self.square_size,
+            "readers": [{"index": entry.index, "mux": f"0x{entry.mux:X}", "channel": entry.channel,
+                         "square": entry.square} for entry in self.readers],
+        }
+    
+    def validate(self, source: str = "<profile>"):
+        """Raise ValueError naming the first problem found"""
+        if not (0 < self.rows <= 26 and 0 < self.cols <= 26) or self.rows * self.cols > MAX_READERS:
+            raise ValueError(f"{source}: {self.rows}x{self.cols} board does not fit {MAX_READERS} readers")
+        if self.square_size <= 0:
+            raise ValueError(f"{source}: square_size must be positive")
+        squares = set(self.board_config().square_index)
+        seen_squares = set()
+        seen_channels = set()
+        for expected, entry in enumerate(self.readers):
+            if entry.index != expected:
+                raise ValueError(f"{source}: reader indexes must run 0..{len(self.readers) - 1}, "
+                                 f"{expected} is missing or duplicated")
+            if entry.mux not in MUX_ADDRESSES:
+                raise ValueError(f"{source}: reader {entry.index} mux 0x{entry.mux:X} is not 0x70-0x77")
+            if not 0 <= entry.channel < CHANNELS_PER_MUX:
+                raise ValueError(f"{source}: reader {entry.index} channel {entry.channel} is not 0-7")
+            if entry.square not in squares:
+                raise ValueError(f"{source}: reader {entry.index} square {entry.square!r} is not on the board")
+            if entry.square in seen_squares:
+                raise ValueError(f"{source}: square {entry.square} has two readers")
+            if (entry.mux, entry.channel) in seen_channels:
+                raise ValueError(f"{source}: mux 0x{entry.mux:X} channel {entry.channel} has two readers")
+            seen_squares.add(entry.square)
+            seen_channels.add((entry.mux, entry.channel))
+    
+    def board_config(self) -> BoardConfig:
+        return BoardConfig.create_grid_config(self.rows, self.cols, square_size=self.square_size)
+    
+    def reader_positions(self) -> List[Optional[str]]:
+        """Square name by reader index, as SerialCommunication wants it"""
+        return [entry.square for entry in self.readers]
+    
+    def checksum(self) -> int:
+        """CRC-16/XMODEM of the reader table, as the firmware reports it in STATUS"""
+        return table_checksum(self.readers)
+    
+    def changes(self, current: Dict[int, ReaderEntry]) -> List[ReaderEntry]:
+        """The entries a board with the given reader table needs to be sent"""
+        return [entry for entry in self.readers if current.get(entry.index) != entry]
+
+@dataclasses.dataclass
+class BoardStatus:
+    """A parsed STATUS:READERS:n:TAGS:m:ID:id:CRC:hex reply"""
+    readers: int
+    tags: int
+    board_id: Optional[str] = None
+    checksum: Optional[int] = None
+    
+    @classmethod
+    def parse(cls, line: str) -> "BoardStatus":
+        parts = line.split(":")[1:]
+        fields = dict(zip(parts[::2], parts[1::2]))
+        return cls(int(fields["READERS"]), int(fields["TAGS"]), fields.get("ID"),
+                   int(fields["CRC"], 16) if "CRC" in fields else None)
+
+class ProfileCache:
+    """The profile last applied to each board, as <directory>/<board id>.json"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+    
+    def _path(self, board_id: str) -> str:
+        safe_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in board_id)
+        return os.path.join(self.directory, f"{safe_id}.json")
+    
+    def load(self, board_id: str) -> Optional[BoardProfile]:
+        try:
+            return BoardProfile.load(self._path(board_id))
+        except (OSError, ValueError):
+            return None
+    
+    def store(self, board_id: str, profile: BoardProfile):
+        """Best effort: without a writable cache every sync just takes the CONFIG_DUMP round trip"""
+        path = self._path(board_id)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as cache_file:
+                json.dump(profile.to_dict(), cache_file, indent=1)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+    
+    @classmethod
+    def beside(cls, profile_path: str) -> "ProfileCache":
+        """The cache kept in __boardcache__ next to a profile file"""
+        return cls(os.path.join(os.path.dirname(os.path.abspath(profile_path)), "__boardcache__"))
+
+class BoardConfigurator:
+    """Syncs a board's reader table to a profile, driven by the board's replies.
+    
+    start() sends CONFIG_STATUS; hosts call it once the board has booted
+    (SerialCommunication.add_ready_callback), since a board that resets on
+    open misses anything sent before. Every STATUS, CONFIG_READER,
+    CONFIG_END and CONFIG_ACK line from the board then goes to
+    on_message(), which sends the next step itself. send(text, on_done)
+    queues commands like SerialCommunication.send_command; a command the
+    board never answers fails the sync. state ends as "synced", "failed"
+    or "unsupported" (firmware without profile support).
+    """
+    
+    # stats() values that are levels, not running totals; the counts describe the last sync only
+    stats_gauges = frozenset({"profile_synced", "profile_failed", "profile_round_trips",
+                              "profile_readers_sent", "profile_sync_ms"})
+    
+    def __init__(self, profile: BoardProfile, send: Callable[[str, Callable[[Command, bool], None]], None],
+                 cache: Optional[ProfileCache] = None, name: str = "board"):
+        self.profile = profile
+        self.send = send
+        self.cache = cache
+        self.name = name
+        self.state = "idle"
+        self.board_id: Optional[str] = None
+        self.round_trips = 0
+        self.readers_sent = 0
+        self.acks = 0
+        self.elapsed = 0.0
+        self._started = 0.0
+        self._dump: Dict[int, ReaderEntry] = {}
+        # Readers the board had active when it answered CONFIG_STATUS
+        self._board_readers = 0
+    
+    def start(self):
+        self.state = "status"
+        self.round_trips = 1
+        self.readers_sent = 0
+        self.acks = 0
+        self._started = time.monotonic()
+        self.send("CONFIG_STATUS", self._on_command_done)
+    
+    def on_message(self, line: str) -> bool:
+        """Handle a configuration line from the board; False if it was not one"""
+        if line.startswith("STATUS:"):
+            if self.state == "status":
+                self._on_status(BoardStatus.parse(line))
+        elif line.startswith("CONFIG_READER:"):
+            if self.state == "dump":
+                entry = ReaderEntry.parse(line)
+                self._dump[entry.index] = entry
+        elif line.startswith("CONFIG_END:"):
+            if self.state == "dump":
+                self._upload(self._dump)
+        elif line.startswith("CONFIG_ACK:READER:"):
+            self.acks += 1
+        elif line.startswith("CONFIG_ACK:COMMIT:"):
+            if self.state == "commit":
+                self._on_commit(line)
+        elif not line.startswith("CONFIG_"):
+            return False
+        return True
+    
+    def _on_status(self, status: BoardStatus):
+        if status.checksum is None:
+            self.state = "unsupported"
+            log.warning("[%s] Firmware does not support board profiles, not syncing %s",
+                        self.name, self.profile.name)
+            return
+        self.board_id = status.board_id
+        self._board_readers = status.readers
+        if status.readers == len(self.profile.readers) and status.checksum == self.profile.checksum():
+            self._finish()
+            return
+        
+        cached = self.cache.load(status.board_id) if self.cache and status.board_id else None
+        if cached and status.readers == len(cached.readers) and status.checksum == cached.checksum():
+            self._upload({entry.index: entry for entry in cached.readers})
+            return
+        # Unknown state: read the table back first
+        self.state = "dump"
+        self._dump = {}
+        self.round_trips += 1
+        self.send("CONFIG_DUMP", self._on_command_done)
+    
+    def _upload(self, current: Dict[int, ReaderEntry]):
+        changes = self.profile.changes(current)
+        self.state = "commit"
+        self.round_trips += 1
+        self.readers_sent = len(changes)
+        # Changed readers, and newly active ones even where unchanged, are initialized
+        initialized = len(changes) + max(len(self.profile.readers) - self._board_readers, 0)
+        # One write: the board holds off scanning until CONFIG_COMMIT
+        self.send("\n".join([entry.command() for entry in changes] + [f"CONFIG_COMMIT:{len(self.profile.readers)}"]),
+                  self._on_command_done, COMMIT_TIMEOUT + initialized * READER_INIT_SECONDS)
+    
+    def _on_commit(self, line: str):
+        _, _, count, checksum = line.split(":")
+        if int(count) != len(self.profile.readers) or int(checksum, 16) != self.profile.checksum():
+            self.state = "failed"
+            log.error("[%s] Board %s rejected profile %s (%s readers, checksum %s)",
+                      self.name, self.board_id, self.profile.name, count, checksum)
+            return
+        self._finish()
+    
+    def _on_command_done(self, command: Command, ok: bool):
+        """A command of the sync was answered, or given up after its retries"""
+        if ok or self.state not in ("status", "dump", "commit"):
+            return
+        self.state = "failed"
+        self.elapsed = time.monotonic() - self._started
+        log.error("[%s] No answer to %s, profile %s not synced", self.name, command.text, self.profile.name)
+    
+    def _finish(self):
+        self.state = "synced"
+        self.elapsed = time.monotonic() - self._started
+        if self.cache and self.board_id:
+            self.cache.store(self.board_id, self.profile)
+        log.info("[%s] Board %s has profile %s: %d readers sent, %d round trips, %.0f ms",
+                 self.name, self.board_id, self.profile.name, self.readers_sent, self.round_trips,
+                 self.elapsed * 1000)
+    
+    def stats(self) -> Dict[str, float]:
+        return {
+            "profile_synced": self.state == "synced",
+            "profile_failed": self.state == "failed",
+            "profile_round_trips": self.round_trips,
+            "profile_readers_sent": self.readers_sent,
+            "profile_sync_ms": self.elapsed * 1000,
+        }
@@ -0,0 +1,283 @@
+"""Outbound command queue for one board connection.
+
+Commands are queued by whoever sends them (the serial reader, the
+pipeline worker, the event loop) and written by a dedicated writer
+thread, so sending never blocks on the serial port. Commands that queue
+up while a write is in progress go out together in the next write,
+in the order they were sent.
+
+Every command gets a sequence number. Commands the firmware answers
+(CONFIG_READER -> CONFIG_ACK:READER:<index>, CONFIG_STATUS -> STATUS:...,
+see expected_reply()) stay in flight until the reply arrives. The
+firmware handles commands strictly in order, so a reply belongs to the
+oldest in-flight command expecting it. The time from the write to the
+reply is recorded per command kind. A command without a reply within
+timeout seconds (its own, if send() was given one) is written again, up
+to retries times, and then given up. As replies come in order, a command
+is never overdue before the commands written ahead of it are.
+
+Feedback that is only worth sending once is coalesced: a CONFIG_SCHEDULE
+chunk replaces a queued one for the same readers, and an INVALID_MOVE is
+dropped while another one is queued or was written within
+coalesce_window seconds.
+"""
+import dataclasses
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from metrics import LatencyHistogram
+
+log = logging.getLogger(__name__)
+
+# Commands whose reply starts with (ends in ":") or equals the given text
+REPLIES = {
+    "CONFIG_COMMIT": "CONFIG_ACK:COMMIT:",
+    "CONFIG_RESET": "CONFIG_ACK:RESET",
+    "CONFIG_STATUS": "STATUS:",
+    "CONFIG_DUMP": "CONFIG_END:",
+    "CONFIG_TAGS": "TAGS_END:",
+    "PROTO:BIN": "PROTO_ACK:BIN",
+    "PROTO:TEXT": "PROTO_ACK:TEXT",
+}
+# Commands acknowledged with CONFIG_ACK:<what>:<first argument>
+INDEXED_REPLIES = {
+    "CONFIG_READER": "CONFIG_ACK:READER:",
+    "CONFIG_SCHEDULE": "CONFIG_ACK:SCHEDULE:",
+}
+# Pure feedback: nothing is lost by sending only one of a burst
+FEEDBACK = {"INVALID_MOVE"}
+
+def command_kind(command: str) -> str:
+    """The command's name, e.g. CONFIG_READER for CONFIG_READER:3:70:3:d4"""
+    return command if command in REPLIES else command.split(":", 1)[0]
+
+def expected_reply(command: str) -> Optional[str]:
+    """What the firmware answers a command with, None if it does not answer"""
+    if command in REPLIES:
+        return REPLIES[command]
+    name, _, arguments = command.partition(":")
+    if name in INDEXED_REPLIES:
+        return INDEXED_REPLIES[name] + arguments.split(":", 1)[0]
+    return REPLIES.get(name)
+
+def coalesce_key(command: str) -> Optional[str]:
+    """Queued commands with the same key are redundant: the newest one wins"""
+    if command in FEEDBACK:
+        return command
+    if command.startswith("CONFIG_SCHEDULE:"):
+        return command.rsplit(":", 1)[0]
+    return None
+
+@dataclasses.dataclass
+class Command:
+    """A queued or in-flight command"""
+    seq: int
+    text: str
+    reply: Optional[str]
+    key: Optional[str] = None
+    on_done: Optional[Callable[["Command", bool], None]] = None
+    timeout: float = 0.0
+    attempts: int = 0
+    sent_at: float = 0.0
+    rtt: Optional[float] = None
+    
+    def matches(self, line: str) -> bool:
+        return line == self.reply or (self.reply.endswith(":") and line.startswith(self.reply))
+
+class CommandChannel:
+    """Queues commands for a writer thread and matches the board's replies to them"""
+    
+    # stats() values that are levels, not running totals
+    stats_gauges = frozenset({"commands_pending", "commands_in_flight"})
+    
+    def __init__(self, write: Callable[[bytes], None], timeout: float = 3.0, retries: int = 2,
+                 coalesce_window: float = 0.1):
+        self.write = write
+        # The firmware reads commands between scan passes, which take up to ~2.5 s on 8x8
+        self.timeout = timeout
+        self.retries = retries
+        self.coalesce_window = coalesce_window
+        self._pending: Deque[Command] = deque()
+        self._in_flight: Deque[Command] = deque()
+        self._last_written: Dict[str, float] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._next_seq = 1
+        
+        self.rtt = LatencyHistogram()
+        self.rtt_by_kind = {kind: LatencyHistogram() for kind in list(REPLIES) + list(INDEXED_REPLIES)}
+        self.sent = 0
+        self.acked = 0
+        self.retried = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.late_acks = 0
+    
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True, name="command-writer")
+            self._thread.start()
+    
+    def stop(self):
+        """Stop the writer; whatever is queued or unanswered is abandoned"""
+        with self._condition:
+            self._running = False
+            abandoned = list(self._pending) + list(self._in_flight)
+            self._pending.clear()
+            self._in_flight.clear()
+            self._condition.notify()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=1)
+        with self._condition:
+            if self._thread is thread:
+                self._thread = None
+        for command in abandoned:
+            self._finish(command, False)
+    
+    def send(self, text: str, on_done: Optional[Callable[[Command, bool], None]] = None,
+             timeout: Optional[float] = None) -> List[Command]:
+        """Queue one command per line of text (never blocks); returns those not coalesced away.
+        
+        timeout replaces the channel's for these commands, for ones the
+        firmware takes long to answer (CONFIG_COMMIT initializes readers).
+        """
+        queued = []
+        now = time.monotonic()
+        with self._condition:
+            for line in text.split("\n"):
+                line = line.strip()
+                if line:
+                    command = self._enqueue(line, on_done, self.timeout if timeout is None else timeout, now)
+                    if command is not None:
+                        queued.append(command)
+            if queued:
+                self._condition.notify()
+        return queued
+    
+    def _enqueue(self, text: str, on_done: Optional[Callable[[Command, bool], None]], timeout: float,
+                 now: float) -> Optional[Command]:
+        key = coalesce_key(text)
+        if key is not None:
+            for queued in self._pending:
+                if queued.key == key:
+                    queued.text = text
+                    self.coalesced += 1
+                    return queued
+            if text in FEEDBACK and now - self._last_written.get(text, -self.coalesce_window) < self.coalesce_window:
+                self.coalesced += 1
+                return None
+        command = Command(self._next_seq, text, expected_reply(text), key, on_done, timeout)
+        self._next_seq += 1
+        self._pending.append(command)
+        return command
+    
+    def on_reply(self, line: str) -> bool:
+        """Match a line from the board to the oldest in-flight command it answers"""
+        if not self._in_flight and not line.startswith("CONFIG_ACK:"):
+            # Nothing awaits a reply: the usual case for event lines
+            return False
+        now = time.monotonic()
+        with self._condition:
+            for command in self._in_flight:
+                if command.matches(line):
+                    self._in_flight.remove(command)
+                    break
+            else:
+                command = None
+        if command is None:
+            # E.g. the first answer to a command that was already retried
+            if line.startswith("CONFIG_ACK:"):
+                self.late_acks += 1
+            return False
+        command.rtt = now - command.sent_at
+        self.rtt.record(command.rtt)
+        kind_rtt = self.rtt_by_kind.get(command_kind(command.text))
+        if kind_rtt is not None:
+            kind_rtt.record(command.rtt)
+        self.acked += 1
+        self._finish(command, True)
+        return True
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "commands_sent": self.sent,
+            "commands_acked": self.acked,
+            "commands_retried": self.retried,
+            "commands_failed": self.failed,
+            "commands_coalesced": self.coalesced,
+            "commands_pending": len(self._pending),
+            "commands_in_flight": len(self._in_flight),
+            "commands_late_acks": self.late_acks,
+        }
+    
+    def _finish(self, command: Command, ok: bool):
+        if command.on_done:
+            try:
+                command.on_done(command, ok)
+            except Exception as e:
+                log.exception("Command callback failed for %s: %s", command.text, e)
+    
+    def _expire(self, now: float) -> List[Command]:
+        """Requeue timed-out commands (ahead of newer ones); returns those out of retries"""
+        given_up = []
+        retry = []
+        deadline = 0.0
+        while self._in_flight:
+            # A command waits for the answers to those ahead of it
+            deadline = max(deadline, self._in_flight[0].sent_at + self._in_flight[0].timeout)
+            if now < deadline:
+                break
+            command = self._in_flight.popleft()
+            if command.attempts > self.retries:
+                given_up.append(command)
+            else:
+                retry.append(command)
+        self.retried += len(retry)
+        self._pending.extendleft(reversed(retry))
+        return given_up
+    
+    def _run(self):
+        # A writer that stop() gave up waiting for must not carry on beside the next one
+        me = threading.current_thread()
+        while True:
+            with self._condition:
+                while self._running and self._thread is me and not self._pending:
+                    # Sleep until something is queued or the oldest reply is overdue
+                    oldest = self._in_flight[0] if self._in_flight else None
+                    wait = oldest.sent_at + oldest.timeout - time.monotonic() if oldest else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                if not self._running or self._thread is not me:
+                    return
+                now = time.monotonic()
+                given_up = self._expire(now)
+                batch = list(self._pending)
+                self._pending.clear()
+                for command in batch:
+                    command.attempts += 1
+                    command.sent_at = now
+                    if command.reply is not None:
+                        self._in_flight.append(command)
+                    elif command.key is not None:
+                        self._last_written[command.text] = now
+                self.sent += len(batch)
+            
+            self.failed += len(given_up)
+            for command in given_up:
+                log.warning("No reply to %s after %d attempts", command.text, command.attempts)
+                self._finish(command, False)
+            if batch:
+                # In flight before the write, so even an instant reply finds its command
+                self.write(("\n".join(command.text for command in batch) + "\n").encode())
+                for command in batch:
+                    if command.reply is None:
+                        self._finish(command, True)
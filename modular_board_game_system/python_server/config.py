@@ -1,64 +1,201 @@
 import dataclasses
-from typing import Dict, List, Tuple, Optional, Any
+import sys
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Tuple, Optional, Any
 from enum import Enum
 
 @dataclasses.dataclass
 class BoardConfig:
-    """Configuration for board layout and hardware mapping"""
+    """Configuration for board layout and hardware mapping.
+    
+    The lookup indexes below are derived from position_mapping once, when
+    the config is created, and are read-only afterwards:
+    square_names maps (row, col) -> position, square_index maps position ->
+    row-major square number (row * cols + col) and index_names is the
+    inverse of square_index (None for squares without a name).
+    """
     size: Tuple[int, int]  # (rows, cols)
     position_mapping: Dict[str, Tuple[int, int]]  # position -> (row, col)
     square_size: int = 150
+    square_names: Mapping[Tuple[int, int], str] = dataclasses.field(init=False, repr=False, compare=False)
+    square_index: Mapping[str, int] = dataclasses.field(init=False, repr=False, compare=False)
+    index_names: Tuple[Optional[str], ...] = dataclasses.field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        rows, cols = self.size
+        square_names = {}
+        square_index = {}
+        index_names: List[Optional[str]] = [None] * (rows * cols)
+        for pos_name, (row, col) in self.position_mapping.items():
+            square_names[(row, col)] = pos_name
+            if 0 <= row < rows and 0 <= col < cols:
+                square_index[pos_name] = row * cols + col
+                index_names[row * cols + col] = pos_name
+        
+        self.square_names = MappingProxyType(square_names)
+        self.square_index = MappingProxyType(square_index)
+        self.index_names = tuple(index_names)
     
     @classmethod
-    def create_4x4_config(cls):
-        """Create standard 4x4 board configuration"""
+    def create_grid_config(cls, rows: int, cols: int, square_size: int = 80):
+        """Create a rows x cols board named like a chessboard (a1 bottom left)"""
         positions = {}
-        for row in range(4):
-            for col in range(4):
-                pos_name = f"{chr(97 + col)}{4 - row}"  # a1, b1, etc.
+        for row in range(rows):
+            for col in range(cols):
+                pos_name = f"{chr(97 + col)}{rows - row}"  # a1, b1, etc.
                 positions[pos_name] = (row, col)
         
         return cls(
-            size=(4, 4),
+            size=(rows, cols),
             position_mapping=positions,
-            square_size=150
+            square_size=square_size
         )
     
+    @classmethod
+    def create_4x4_config(cls):
+        """Create standard 4x4 board configuration"""
+        return cls.create_grid_config(4, 4, square_size=150)
+    
     @classmethod
     def create_8x8_config(cls):
         """Create standard 8x8 board configuration"""
-        positions = {}
-        for row in range(8):
-            for col in range(8):
-                pos_name = f"{chr(97 + col)}{8 - row}"  # a1, b1, etc.
-                positions[pos_name] = (row, col)
-        
-        return cls(
-            size=(8, 8),
-            position_mapping=positions,
-            square_size=80
-        )
+        return cls.create_grid_config(8, 8, square_size=80)
 
-@dataclasses.dataclass
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if type(value) is str else value
+
+@dataclasses.dataclass(slots=True)
 class PieceInfo:
-    """Information about a game piece"""
+    """Information about a game piece.
+    
+    Slotted, and its strings are interned, so every piece of a type shares
+    one copy of the type and color names however it was created.
+    """
     uid: str
     piece_type: str
     color: str
     position: Optional[str] = None
     
+    def __post_init__(self):
+        self.uid = _intern(self.uid)
+        self.piece_type = _intern(self.piece_type)
+        self.color = _intern(self.color)
+        self.position = _intern(self.position)
+
 class GameEvent(Enum):
     """Types of game events"""
     PIECE_PLACED = "PLACE"
     PIECE_LIFTED = "LIFT"
     PIECE_MOVED = "MOVE"
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class GameEventData:
-    """Data for a game event"""
+    """Data for a game event.
+    
+    Immutable and slotted; uids and positions are interned, so a long list
+    of events holds one copy of each uid and square name between them.
+    """
     event_type: GameEvent
     piece_uid: str
     position: str
     from_position: Optional[str] = None
+    
+    def __post_init__(self):
+        object.__setattr__(self, "piece_uid", _intern(self.piece_uid))
+        object.__setattr__(self, "position", _intern(self.position))
+        object.__setattr__(self, "from_position", _intern(self.from_position))
+    
+    @classmethod
+    def from_interned(cls, event_type: GameEvent, piece_uid: str, position: str,
+                      from_position: Optional[str] = None) -> "GameEventData":
+        """Build an event from strings that are interned already, skipping __post_init__ (for decoders)"""
+        event = object.__new__(cls)
+        set_type, set_uid, set_position, set_from = _EVENT_SLOT_SETTERS
+        set_type(event, event_type)
+        set_uid(event, piece_uid)
+        set_position(event, position)
+        set_from(event, from_position)
+        return event
+    
+    def squares(self, board_config: BoardConfig) -> Tuple[Optional[int], Optional[int]]:
+        """(to, from) as square indexes (None for positions not on the board)"""
+        square_index = board_config.square_index
+        return square_index.get(self.position), square_index.get(self.from_position)
+    
+    @classmethod
+    def from_squares(cls, event_type: GameEvent, piece_uid: str, square: Optional[int],
+                     from_square: Optional[int], board_config: BoardConfig) -> "GameEventData":
+        """Build an event from square indexes, using the board's own position names"""
+        names = board_config.index_names
+        return cls(event_type, piece_uid, names[square] if square is not None else "",
+                   names[from_square] if from_square is not None else None)
 
+# Slot descriptors of GameEventData, which set fields even though it is frozen
+_EVENT_SLOT_SETTERS = tuple(GameEventData.__dict__[name].__set__ for name in GameEventData.__slots__)
 
+class BoardView(Mapping[str, Optional[PieceInfo]]):
+    """Read-only board contents stored as one slot per square index.
+    
+    Behaves like a Dict[str, Optional[PieceInfo]] keyed by position name
+    that holds every named square (None when empty), in square order.
+    at() reads by square index without going through the name.
+    """
+    __slots__ = ("board_config", "squares")
+    
+    def __init__(self, board_config: BoardConfig, squares: Optional[List[Optional[PieceInfo]]] = None):
+        rows, cols = board_config.size
+        self.board_config = board_config
+        self.squares: List[Optional[PieceInfo]] = squares if squares is not None else [None] * (rows * cols)
+    
+    def at(self, square: int) -> Optional[PieceInfo]:
+        return self.squares[square]
+    
+    def __getitem__(self, position: str) -> Optional[PieceInfo]:
+        return self.squares[self.board_config.square_index[position]]
+    
+    def get(self, position: Optional[str], default: Optional[PieceInfo] = None) -> Optional[PieceInfo]:
+        index = self.board_config.square_index.get(position)
+        return self.squares[index] if index is not None else default
+    
+    def __contains__(self, position: object) -> bool:
+        return position in self.board_config.square_index
+    
+    def __iter__(self) -> Iterator[str]:
+        return (name for name in self.board_config.index_names if name is not None)
+    
+    def __len__(self) -> int:
+        return len(self.board_config.square_index)
+    
+    def occupied(self) -> Iterator[Tuple[int, PieceInfo]]:
+        """(square index, piece) for every occupied square"""
+        return ((square, piece) for square, piece in enumerate(self.squares) if piece is not None)
+    
+    def to_dict(self) -> Dict[str, Optional[PieceInfo]]:
+        return dict(self.items())
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({ {name: piece for name, piece in self.items() if piece} })"
+
+class BoardState(BoardView):
+    """The live board: a BoardView that the game logic updates in place"""
+    __slots__ = ()
+    
+    def put(self, square: int, piece: Optional[PieceInfo]):
+        self.squares[square] = piece
+    
+    def __setitem__(self, position: str, piece: Optional[PieceInfo]):
+        self.squares[self.board_config.square_index[position]] = piece
+    
+    def snapshot(self, previous: Optional[BoardView] = None) -> BoardView:
+        """Frozen copy for other threads. Pieces unchanged since previous are shared with it"""
+        squares: List[Optional[PieceInfo]] = []
+        for index, piece in enumerate(self.squares):
+            if piece is None:
+                squares.append(None)
+                continue
+            earlier = previous.squares[index] if previous is not None else None
+            if (earlier is None or earlier.uid != piece.uid or earlier.piece_type != piece.piece_type
+                    or earlier.color != piece.color or earlier.position != piece.position):
+                earlier = PieceInfo(piece.uid, piece.piece_type, piece.color, piece.position)
+            squares.append(earlier)
+        return BoardView(self.board_config, squares)
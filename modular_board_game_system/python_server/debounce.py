@@ -0,0 +1,109 @@
+"""Tag debouncing between the serial reader and the game logic.
+
+The firmware reports a LIFT once a tag has been missed MISS_THRESHOLD times
+in a row, and a PLACE (or, for a tag that was placed before, a MOVE from
+the square it was lifted from) as soon as it reads the tag again. A flaky
+read therefore shows up as LIFT x followed by MOVE x->x, and the game logic
+answers the MOVE of a piece it thinks is off the board with an invalid-move
+response. A real move arrives as LIFT x followed by PLACE/MOVE to y.
+
+EventDebouncer holds back a LIFT for up to window seconds:
+
+    LIFT x, then PLACE x or MOVE x->x    dropped, the piece never left
+    LIFT x, then PLACE y or MOVE ?->y    one MOVE x->y
+    LIFT x, then LIFT x again            the repeat is dropped
+    LIFT x, then nothing within window   the LIFT is passed on late
+
+An event for another piece releases a held LIFT first, so events of
+different pieces keep their order (a capture lifts the victim first). A
+PLACE or MOVE repeating the previous event of the same piece within the
+window is dropped as well.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import GameEvent, GameEventData
+
+class EventDebouncer:
+    """Filters one board's event stream; not thread safe (the pipeline locks around it)"""
+    
+    def __init__(self, window: float = 0.25):
+        self.window = window
+        # The LIFT being held back and when it arrived
+        self._held: Optional[Tuple[GameEventData, float]] = None
+        # Last event passed on per piece, and when
+        self._last: Dict[str, Tuple[GameEventData, float]] = {}
+        
+        self.received = 0
+        self.emitted = 0
+        self.suppressed = 0
+        self.merged = 0
+    
+    def feed(self, event: GameEventData, now: Optional[float] = None) -> List[GameEventData]:
+        """Take one event; returns the events to pass on now, in order"""
+        now = time.monotonic() if now is None else now
+        self.received += 1
+        output = self.expire(now)
+        
+        held = self._held
+        if held is not None and held[0].piece_uid == event.piece_uid:
+            lift = held[0]
+            if event.event_type == GameEvent.PIECE_LIFTED:
+                self.suppressed += 1
+                return output
+            self._held = None
+            if event.position == lift.position:
+                # Put back where it was lifted from: neither event happened
+                self.suppressed += 2
+                return output
+            self.suppressed += 1
+            self.merged += 1
+            return output + self._emit(GameEventData(GameEvent.PIECE_MOVED, event.piece_uid,
+                                                     event.position, lift.position), now)
+        
+        if held is not None:
+            output += self.flush()
+        if event.event_type == GameEvent.PIECE_LIFTED:
+            self._held = (event, now)
+            return output
+        
+        last = self._last.get(event.piece_uid)
+        if last is not None and last[0] == event and now - last[1] <= self.window:
+            self.suppressed += 1
+            return output
+        return output + self._emit(event, now)
+    
+    def expire(self, now: Optional[float] = None) -> List[GameEventData]:
+        """Release a held LIFT whose window has passed"""
+        now = time.monotonic() if now is None else now
+        if self._held is not None and now - self._held[1] >= self.window:
+            return self.flush()
+        return []
+    
+    def flush(self) -> List[GameEventData]:
+        """Release whatever is held, regardless of the window"""
+        if self._held is None:
+            return []
+        lift, held_at = self._held
+        self._held = None
+        return self._emit(lift, held_at)
+    
+    def next_release(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until a held LIFT is due (0 if overdue), None if nothing is held"""
+        if self._held is None:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._held[1] + self.window - now)
+    
+    def _emit(self, event: GameEventData, now: float) -> List[GameEventData]:
+        self._last[event.piece_uid] = (event, now)
+        self.emitted += 1
+        return [event]
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "debounce_received": self.received,
+            "debounce_suppressed": self.suppressed,
+            "debounce_merged": self.merged,
+            "debounce_held": int(self._held is not None),
+        }
@@ -0,0 +1,226 @@
+"""Append-only game event log with periodic state snapshots.
+
+File layout (little endian):
+
+    header   magic "MGBLOG01", rows u16, cols u16
+    records  kind u8, length u32, crc32 u32, payload[length]
+
+Event payloads are fixed binary (timestamp f64, opcode u8, to-square u16,
+from-square u16, uid length u8, uid) using BoardConfig.square_index, so a
+typical event takes about 30 bytes. Snapshot payloads hold the event count
+they were taken at followed by GameLogic.export_state() as compact JSON.
+
+A torn record at the end of the file (crash during a write) fails its CRC
+and is truncated away when the log is reopened for writing. Reading goes
+through mmap, and seek_to() restores any point in the game by loading the
+nearest earlier snapshot and replaying only the events after it.
+stream_events() reads a log front to back without building an index, for
+bulk processing of many logs.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import BoardConfig, GameEvent, GameEventData
+from game_logic.base import GameLogic
+
+FILE_MAGIC = b"MGBLOG01"
+FILE_HEADER = struct.Struct("<8sHH")
+RECORD_HEADER = struct.Struct("<BII")
+EVENT_PAYLOAD = struct.Struct("<dBHHB")
+SNAPSHOT_SEQUENCE = struct.Struct("<Q")
+
+RECORD_EVENT = 1
+RECORD_SNAPSHOT = 2
+NO_SQUARE = 0xFFFF
+
+EVENT_OPCODES = {
+    GameEvent.PIECE_PLACED: 1,
+    GameEvent.PIECE_LIFTED: 2,
+    GameEvent.PIECE_MOVED: 3,
+}
+OPCODE_EVENTS = {opcode: event_type for event_type, opcode in EVENT_OPCODES.items()}
+
+def _scan_records(data, start: int) -> Iterator[Tuple[int, int, int, int]]:
+    """Yield (kind, payload offset, payload length, record end) for every intact record"""
+    offset = start
+    end = len(data)
+    while offset + RECORD_HEADER.size <= end:
+        kind, length, crc = RECORD_HEADER.unpack_from(data, offset)
+        payload = offset + RECORD_HEADER.size
+        if kind not in (RECORD_EVENT, RECORD_SNAPSHOT) or payload + length > end:
+            return
+        if zlib.crc32(data[payload:payload + length]) != crc:
+            return
+        yield kind, payload, length, payload + length
+        offset = payload + length
+
+def _decode_event(data, offset: int, names: Sequence[Optional[str]], uids: Dict[bytes, str]) -> Tuple[float, GameEventData]:
+    timestamp, opcode, to_square, from_square, uid_length = EVENT_PAYLOAD.unpack_from(data, offset)
+    uid_start = offset + EVENT_PAYLOAD.size
+    uid_bytes = data[uid_start:uid_start + uid_length]
+    uid = uids.get(uid_bytes)
+    if uid is None:
+        uid = uids[uid_bytes] = uid_bytes.decode()
+    
+    return timestamp, GameEventData(
+        OPCODE_EVENTS[opcode],
+        uid,
+        names[to_square] if to_square != NO_SQUARE else "",
+        names[from_square] if from_square != NO_SQUARE else None,
+    )
+
+def stream_events(path: str, board_config: BoardConfig) -> Iterator[Tuple[float, GameEventData]]:
+    """Yield (timestamp, event) for every event in a log, in constant memory"""
+    with open(path, "rb") as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, rows, cols = FILE_HEADER.unpack_from(data, 0)
+        if magic != FILE_MAGIC or (rows, cols) != tuple(board_config.size):
+            raise ValueError(f"{path} is not an event log for this board")
+        uids: Dict[bytes, str] = {}
+        for kind, payload, _, _ in _scan_records(data, FILE_HEADER.size):
+            if kind == RECORD_EVENT:
+                yield _decode_event(data, payload, board_config.index_names, uids)
+
+class EventLogWriter:
+    """Appends applied events (and a snapshot every snapshot_interval events)"""
+    
+    def __init__(self, path: str, board_config: BoardConfig, snapshot_interval: int = 200,
+                 fsync: bool = False):
+        self.path = path
+        self.board_config = board_config
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.event_count = 0
+        self._since_snapshot = 0
+        
+        rows, cols = board_config.size
+        if os.path.exists(path) and os.path.getsize(path) >= FILE_HEADER.size:
+            self.event_count, valid_end = self._recover(rows, cols)
+            self._file = open(path, "r+b")
+            self._file.truncate(valid_end)
+            self._file.seek(valid_end)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(FILE_HEADER.pack(FILE_MAGIC, rows, cols))
+            self._file.flush()
+    
+    def _recover(self, rows: int, cols: int) -> Tuple[int, int]:
+        """Count intact events and find where the intact part of the file ends"""
+        with open(self.path, "rb") as existing:
+            data = existing.read()
+        magic, log_rows, log_cols = FILE_HEADER.unpack_from(data, 0)
+        if magic != FILE_MAGIC or (log_rows, log_cols) != (rows, cols):
+            raise ValueError(f"{self.path} is not an event log for a {rows}x{cols} board")
+        
+        events = 0
+        valid_end = FILE_HEADER.size
+        for kind, _, _, record_end in _scan_records(data, FILE_HEADER.size):
+            if kind == RECORD_EVENT:
+                events += 1
+            valid_end = record_end
+        return events, valid_end
+    
+    def _write_record(self, kind: int, payload: bytes):
+        self._file.write(RECORD_HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+    
+    def append(self, event: GameEventData, game_logic: Optional[GameLogic] = None,
+               timestamp: Optional[float] = None):
+        """Record an event that has just been applied to game_logic"""
+        square_index = self.board_config.square_index
+        uid = event.piece_uid.encode()
+        payload = EVENT_PAYLOAD.pack(
+            time.time() if timestamp is None else timestamp,
+            EVENT_OPCODES[event.event_type],
+            square_index.get(event.position, NO_SQUARE),
+            square_index.get(event.from_position, NO_SQUARE) if event.from_position else NO_SQUARE,
+            len(uid),
+        ) + uid
+        self._write_record(RECORD_EVENT, payload)
+        self.event_count += 1
+        self._since_snapshot += 1
+        
+        if game_logic is not None and self._since_snapshot >= self.snapshot_interval:
+            self.write_snapshot(game_logic)
+    
+    def write_snapshot(self, game_logic: GameLogic):
+        """Store the full game state as of the events written so far"""
+        state = json.dumps(game_logic.export_state(), separators=(",", ":")).encode()
+        self._write_record(RECORD_SNAPSHOT, SNAPSHOT_SEQUENCE.pack(self.event_count) + state)
+        self._since_snapshot = 0
+    
+    def close(self):
+        self._file.close()
+
+class EventLogReader:
+    """Memory-mapped, indexed read access to an event log"""
+    
+    def __init__(self, path: str, board_config: BoardConfig):
+        self.path = path
+        self.board_config = board_config
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, rows, cols = FILE_HEADER.unpack_from(self._data, 0)
+        if magic != FILE_MAGIC or (rows, cols) != tuple(board_config.size):
+            raise ValueError(f"{path} is not an event log for this board")
+        
+        # Offsets of every event, and (event count, offset, length) of every snapshot
+        self.event_offsets: List[int] = []
+        self.snapshots: List[Tuple[int, int, int]] = []
+        for kind, payload, length, _ in _scan_records(self._data, FILE_HEADER.size):
+            if kind == RECORD_EVENT:
+                self.event_offsets.append(payload)
+            else:
+                self.snapshots.append((len(self.event_offsets), payload, length))
+        self._snapshot_counts = [count for count, _, _ in self.snapshots]
+        self._uids: Dict[bytes, str] = {}
+    
+    def __len__(self) -> int:
+        return len(self.event_offsets)
+    
+    def read_event(self, offset: int) -> Tuple[float, GameEventData]:
+        return _decode_event(self._data, offset, self.board_config.index_names, self._uids)
+    
+    def events(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[float, GameEventData]]:
+        """Yield (timestamp, event) for events [start, stop)"""
+        for offset in self.event_offsets[start:stop]:
+            yield self.read_event(offset)
+    
+    def nearest_snapshot(self, event_number: int) -> Optional[Tuple[int, dict]]:
+        """Latest snapshot taken at or before event_number as (event count, state)"""
+        index = bisect.bisect_right(self._snapshot_counts, event_number) - 1
+        if index < 0:
+            return None
+        count, offset, length = self.snapshots[index]
+        state = json.loads(self._data[offset + SNAPSHOT_SEQUENCE.size:offset + length])
+        return count, state
+    
+    def seek_to(self, game_logic: GameLogic, event_number: Optional[int] = None) -> int:
+        """Put a freshly initialized game_logic in the state after event_number events"""
+        if event_number is None:
+            event_number = len(self)
+        snapshot = self.nearest_snapshot(event_number)
+        start = 0
+        if snapshot:
+            start, state = snapshot
+            game_logic.load_state(state)
+        for _, event in self.events(start, event_number):
+            game_logic.handle_event(event)
+        return event_number
+    
+    def replay(self, game_logic: GameLogic) -> Iterator[Tuple[float, GameEventData, dict]]:
+        """Apply every event from the start, yielding (timestamp, event, response)"""
+        for timestamp, event in self.events():
+            yield timestamp, event, game_logic.handle_event(event)
+    
+    def close(self):
+        self._data.close()
+        self._file.close()
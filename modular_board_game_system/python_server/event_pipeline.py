@@ -0,0 +1,325 @@
+import dataclasses
+import logging
+import threading
+import time
+from collections import deque
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Mapping, Optional, Union
+
+from config import BoardView, GameEvent, GameEventData, PieceInfo
+from game_logic.base import GameLogic
+from metrics import LatencyHistogram
+
+if TYPE_CHECKING:
+    from debounce import EventDebouncer
+    from event_log import EventLogWriter
+
+log = logging.getLogger(__name__)
+
+@dataclasses.dataclass(frozen=True)
+class BoardSnapshot:
+    """Immutable view of the game published after each batch of events"""
+    version: int
+    # A BoardView, sharing unchanged pieces with the previous snapshot's
+    board_state: Mapping[str, Optional[PieceInfo]]
+    highlights: Mapping[str, Any]
+    message: str
+
+@dataclasses.dataclass(frozen=True)
+class BoardResync:
+    """Where the board reports every tag (uid -> square), queued in line with the events"""
+    placements: Mapping[str, str]
+
+class EventPipeline:
+    """Bounded queue between the serial reader and the game logic.
+    
+    The reader thread only calls submit(), which never blocks. A worker
+    thread drains the queue, applies the events to the GameLogic and then
+    publishes a BoardSnapshot that the render loop picks up with
+    latest_snapshot(). Only a PLACE repeated for the same piece and square
+    is coalesced with the queued one. Applied events are appended to
+    event_log when one is given, and on_snapshot is called with every
+    published snapshot.
+    
+    At most max_queue events wait. Every event changes the game, so one
+    that does not fit is not simply lost: on_overflow is called once, for
+    the host to ask the board where every tag is (CONFIG_TAGS), and events
+    are dropped (and counted) until the answer arrives, since it covers
+    them. The answer, fed to feed_tag_line(), is queued behind the events
+    as a BoardResync that puts the game back in step with the physical
+    board. If the board never answers, the host calls resync_failed() and
+    events are accepted again.
+    
+    With a debouncer, submitted events go through it first (see
+    debounce.py); a LIFT it holds back is queued when its window ends.
+    
+    Without start() no worker thread is used; a caller (such as the
+    multi-board host's worker pool) drains the queue with process_pending().
+    """
+    
+    # stats() values that are levels, not running totals (see metrics.py)
+    stats_gauges = frozenset({"queue_depth", "max_depth", "debounce_held", "move_cache_entries"})
+    
+    def __init__(self, game_logic: GameLogic, max_queue: int = 256,
+                 on_response: Optional[Callable[[GameEventData, Dict[str, Any]], None]] = None,
+                 event_log: Optional["EventLogWriter"] = None,
+                 on_snapshot: Optional[Callable[[BoardSnapshot], None]] = None,
+                 debouncer: Optional["EventDebouncer"] = None,
+                 on_overflow: Optional[Callable[[], None]] = None):
+        self.game_logic = game_logic
+        self.max_queue = max_queue
+        self.on_response = on_response
+        self.event_log = event_log
+        self.on_snapshot = on_snapshot
+        self.debouncer = debouncer
+        self.on_overflow = on_overflow
+        
+        self._queue: Deque[Union[GameEventData, BoardResync]] = deque()
+        self._condition = threading.Condition()
+        # Held while game state and highlights change and a snapshot is published
+        self._apply_lock = threading.Lock()
+        self._running = False
+        self._worker: Optional[threading.Thread] = None
+        # Tags reported so far by a CONFIG_TAGS answer, and whether one is awaited
+        self._tag_dump: Dict[str, str] = {}
+        self._resync_requested = False
+        
+        self._highlights: Dict[str, Any] = {}
+        self._message = ""
+        self._snapshot = BoardSnapshot(0, BoardView(game_logic.board_config), MappingProxyType({}), "")
+        # The game may start from a resumed session, show that before any event arrives
+        self._publish()
+        
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.overflows = 0
+        self.resyncs = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.failed = 0
+        self.invalid = 0
+        self.events_by_type: Dict[GameEvent, int] = {event_type: 0 for event_type in GameEvent}
+        # Time spent in GameLogic.handle_event per event
+        self.handle_latency = LatencyHistogram()
+    
+    def start(self):
+        self._running = True
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._worker:
+            self._worker.join(timeout=1)
+    
+    def submit(self, event: GameEventData) -> bool:
+        """Queue an event without blocking. Returns False if it was dropped (see the class docstring)"""
+        with self._condition:
+            self.submitted += 1
+            if self._resync_requested:
+                # The board's answer to CONFIG_TAGS will include this event
+                self.dropped += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                self.overflows += 1
+                self._resync_requested = self.on_overflow is not None
+                depth = len(self._queue)
+            else:
+                if self.debouncer is None:
+                    self._enqueue(event)
+                else:
+                    for passed in self.debouncer.feed(event):
+                        self._enqueue(passed)
+                self._condition.notify_all()
+                return True
+        log.warning("Event queue full (%d waiting), dropping events until the board reports its tags", depth)
+        if self.on_overflow:
+            self.on_overflow()
+        return False
+    
+    def resync_failed(self):
+        """The board did not answer CONFIG_TAGS: accept events again, and ask again on the next overflow"""
+        with self._condition:
+            self._resync_requested = False
+            self._tag_dump = {}
+        log.warning("Board did not report its tags, the game may be out of step with it")
+    
+    def _enqueue(self, event: GameEventData):
+        """Append to the queue (the condition must be held)"""
+        last = self._queue[-1] if self._queue else None
+        if last is not None and last == event and event.event_type == GameEvent.PIECE_PLACED:
+            # Re-reported placement, applying it twice changes nothing
+            self.coalesced += 1
+        else:
+            self._queue.append(event)
+        self.max_depth = max(self.max_depth, len(self._queue))
+    
+    def feed_tag_line(self, line: str):
+        """TAG:<uid>:<square> per tag on the board, then TAGS_END:<count> (answering CONFIG_TAGS).
+        
+        Lines are ignored unless a resync was requested, such as a second
+        answer to a CONFIG_TAGS the command channel sent again.
+        """
+        with self._condition:
+            if not self._resync_requested:
+                return
+            if line.startswith("TAG:"):
+                parts = line.split(":")
+                if len(parts) != 3 or not parts[1] or not parts[2]:
+                    log.warning("Malformed tag line from the board: %r", line)
+                    return
+                self._tag_dump[parts[1].upper()] = parts[2]
+                return
+            placements, self._tag_dump = self._tag_dump, {}
+            self._resync_requested = False
+            # A LIFT held back by the debouncer was sent before the answer, which covers it
+            if self.debouncer is not None:
+                for event in self.debouncer.flush():
+                    self._enqueue(event)
+            # Everything else the board sent before its answer is already queued
+            self._queue.append(BoardResync(MappingProxyType(placements)))
+            self._condition.notify_all()
+    
+    def _release_due(self):
+        """Queue held-back events whose debounce window has ended (the condition must be held)"""
+        if self.debouncer is not None:
+            for event in self.debouncer.expire():
+                self._enqueue(event)
+    
+    def next_release(self) -> Optional[float]:
+        """Seconds until the debouncer releases a held event, None if it holds none.
+        
+        Callers draining with process_pending() should call it again by then.
+        """
+        if self.debouncer is None:
+            return None
+        with self._condition:
+            return self.debouncer.next_release()
+    
+    def submit_many(self, events: List[GameEventData]):
+        for event in events:
+            self.submit(event)
+    
+    def latest_snapshot(self) -> BoardSnapshot:
+        return self._snapshot
+    
+    def queue_depth(self) -> int:
+        return len(self._queue)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "overflows": self.overflows,
+            "resyncs": self.resyncs,
+            "coalesced": self.coalesced,
+            "queue_depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "failed": self.failed,
+            "invalid_moves": self.invalid,
+            **{f"events_{event_type.name.lower()}": count for event_type, count in self.events_by_type.items()},
+            **(self.debouncer.stats() if self.debouncer else {}),
+            **self.game_logic.move_cache_stats(),
+        }
+    
+    def process_pending(self) -> int:
+        """Apply everything currently queued on the calling thread and publish a snapshot"""
+        with self._condition:
+            self._release_due()
+            batch = list(self._queue)
+            self._queue.clear()
+        if batch:
+            self._apply(batch)
+        return len(batch)
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    # Wake up for a held-back LIFT too
+                    self._condition.wait(self.debouncer.next_release() if self.debouncer else None)
+                    self._release_due()
+                if not self._running:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+            self._apply(batch)
+    
+    def add_highlights(self, highlights: Dict[str, Any], message: Optional[str] = None,
+                       version: Optional[int] = None) -> bool:
+        """Merge highlights from outside the event stream (such as a hint) and publish them.
+        
+        With version, nothing happens (and False is returned) if the latest
+        snapshot is no longer that version, i.e. the board changed meanwhile.
+        """
+        with self._apply_lock:
+            if version is not None and version != self._snapshot.version:
+                return False
+            self._highlights.update(highlights)
+            if message is not None:
+                self._message = message
+            self._publish()
+        return True
+    
+    def _apply(self, batch: List[Union[GameEventData, BoardResync]]):
+        with self._apply_lock:
+            self._apply_locked(batch)
+    
+    def _resync(self, resync: BoardResync):
+        self.game_logic.sync_positions(dict(resync.placements))
+        self.resyncs += 1
+        self._highlights = {}
+        self._message = f"Resynchronized with the board ({len(resync.placements)} pieces)"
+        log.info(self._message)
+        if self.event_log:
+            # Replays start from here, the events before no longer add up
+            self.event_log.write_snapshot(self.game_logic)
+    
+    def _apply_locked(self, batch: List[Union[GameEventData, BoardResync]]):
+        for event in batch:
+            if event.__class__ is BoardResync:
+                self._resync(event)
+                continue
+            started = time.perf_counter()
+            try:
+                response = self.game_logic.handle_event(event)
+            except Exception as e:
+                self.failed += 1
+                log.exception("Error processing event %s: %s", event, e)
+                continue
+            self.handle_latency.record(time.perf_counter() - started)
+            self.processed += 1
+            self.events_by_type[event.event_type] += 1
+            if not response.get("valid", True):
+                self.invalid += 1
+            if self.event_log:
+                self.event_log.append(event, self.game_logic)
+            
+            # Same accumulation rules as BoardGUI.update_highlights
+            highlights = response.get("highlights", {})
+            if highlights.get("clear"):
+                self._highlights = {}
+            else:
+                self._highlights.update(highlights)
+            self._message = response.get("message", "")
+            
+            if self.on_response:
+                self.on_response(event, response)
+        
+        self._publish()
+    
+    def _publish(self):
+        self._snapshot = BoardSnapshot(
+            version=self._snapshot.version + 1,
+            board_state=self.game_logic.board_state.snapshot(self._snapshot.board_state),
+            highlights=MappingProxyType({key: list(value) if isinstance(value, list) else value
+                                         for key, value in self._highlights.items()}),
+            message=self._message,
+        )
+        if self.on_snapshot:
+            self.on_snapshot(self._snapshot)
@@ -0,0 +1,72 @@
+from typing import Callable, Dict, Optional
+from config import PieceInfo
+from game_logic.bitboard import BitBoard
+
+class AttackMap:
+    """Squares attacked by each color, kept up to date square by square.
+    
+    attacks_from[square] holds what the piece on that square attacks. When a
+    square changes only that square's piece and the sliding pieces whose rays
+    touch it are recomputed; every other piece's attacks cannot have changed.
+    The per-color unions are then rebuilt from the cached masks, which is a
+    handful of ORs instead of a full move generation for every piece.
+    """
+    
+    def __init__(self, bitboard: BitBoard, attacks_of: Callable[[PieceInfo, int, int], int],
+                 is_slider: Callable[[PieceInfo], bool]):
+        self.bitboard = bitboard
+        self.attacks_of = attacks_of
+        self.is_slider = is_slider
+        self.attacks_from: Dict[int, int] = {}
+        self.pieces: Dict[int, PieceInfo] = {}
+        self.sliders = 0
+        self.by_color: Dict[str, int] = {}
+        self.sliders_by_color: Dict[str, int] = {}
+        self.recomputed = 0
+    
+    def update(self, square: int, piece: Optional[PieceInfo]):
+        """Call after the bitboard changed on square"""
+        colors = set()
+        previous = self.pieces.pop(square, None)
+        if previous is not None:
+            colors.add(previous.color)
+        self.attacks_from.pop(square, None)
+        self.sliders &= ~(1 << square)
+        
+        occupied = self.bitboard.occupied
+        if piece is not None:
+            self.pieces[square] = piece
+            self.attacks_from[square] = self.attacks_of(piece, square, occupied)
+            if self.is_slider(piece):
+                self.sliders |= 1 << square
+            colors.add(piece.color)
+            self.recomputed += 1
+        
+        # Sliders whose rays reach this square see a different blocker now
+        bit = 1 << square
+        for slider_square, attacks in list(self.attacks_from.items()):
+            if slider_square != square and attacks & bit and self.sliders >> slider_square & 1:
+                slider = self.pieces[slider_square]
+                self.attacks_from[slider_square] = self.attacks_of(slider, slider_square, occupied)
+                colors.add(slider.color)
+                self.recomputed += 1
+        
+        for color in colors:
+            attacked = 0
+            slider_attacks = 0
+            for piece_square, attacks in self.attacks_from.items():
+                if self.pieces[piece_square].color == color:
+                    attacked |= attacks
+                    if self.sliders >> piece_square & 1:
+                        slider_attacks |= attacks
+            self.by_color[color] = attacked
+            self.sliders_by_color[color] = slider_attacks
+    
+    def attacked_by_others(self, color: str, sliders_only: bool = False) -> int:
+        """Union of the squares attacked by every color except color"""
+        masks = self.sliders_by_color if sliders_only else self.by_color
+        attacked = 0
+        for other, mask in masks.items():
+            if other != color:
+                attacked |= mask
+        return attacked
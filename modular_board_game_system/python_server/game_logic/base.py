@@ -1,18 +1,45 @@
 import abc
-from typing import Dict, List, Any
-from config import BoardConfig, PieceInfo, GameEvent, GameEventData
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Any, Optional, Tuple
+from config import BoardConfig, BoardState, PieceInfo, GameEvent, GameEventData
+from game_logic.bitboard import BitBoard, MoveTables
+
+if TYPE_CHECKING:
+    from metrics import LatencyHistogram
 
 class GameLogic(abc.ABC):
     """Abstract base class for game logic implementations"""
     
+    # Material value per piece type, for the search engine (other types count 100)
+    piece_values: Dict[str, int] = {}
+    
     def __init__(self, board_config: BoardConfig):
         self.board_config = board_config
         self.pieces: Dict[str, PieceInfo] = {}
-        self.board_state: Dict[str, Optional[PieceInfo]] = {}
+        # Every named square, empty (None) to start with; readable by name or by square index
+        self.board_state = BoardState(board_config)
+        
+        # Move tables are shared by every game on the same board layout
+        self.tables = MoveTables.for_config(board_config)
+        self.bitboard = BitBoard(self.tables)
+        
+        # (kind, uid) -> (square, type, color, context, value, dependency mask); see _cached_moves
+        self._move_cache: Dict[Tuple[str, str], Tuple[int, str, str, Any, Any, int]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_invalidations = 0
+        # Time per move computation on a cache miss, when the server measures it
+        self.move_latency: Optional["LatencyHistogram"] = None
+        
+        # (position, previous piece, its type and color) per square change while a move is made; see make_move
+        self._journal: Optional[List[Tuple[str, Optional[PieceInfo], Optional[Tuple[str, str]]]]] = None
         
-        # Initialize empty board
-        for position in board_config.position_mapping.keys():
-            self.board_state[position] = None
+        # One bound method per event type instead of comparing the type against each
+        self._event_handlers: Dict[GameEvent, Callable[[GameEventData], Dict[str, Any]]] = {
+            GameEvent.PIECE_PLACED: self._handle_piece_placed,
+            GameEvent.PIECE_LIFTED: self._handle_piece_lifted,
+            GameEvent.PIECE_MOVED: self._handle_piece_moved,
+        }
     
     @abc.abstractmethod
     def get_game_name(self) -> str:
@@ -34,19 +61,171 @@ class GameLogic(abc.ABC):
         """Get all possible moves for a piece"""
         pass
     
+    def _set_square(self, position: str, piece: Optional[PieceInfo]):
+        """Update board_state and the bitboard mirror together"""
+        index = self.tables.square_index.get(position)
+        if index is None:
+            return
+        if self._journal is not None:
+            previous = self.board_state.at(index)
+            self._journal.append((position, previous, (previous.piece_type, previous.color) if previous else None))
+        self.board_state.put(index, piece)
+        self.bitboard.set_square(position, piece)
+        
+        # Drop the cached moves that looked at this square
+        if self._move_cache:
+            bit = 1 << index
+            stale = [key for key, entry in self._move_cache.items() if entry[5] & bit]
+            for key in stale:
+                del self._move_cache[key]
+            self.cache_invalidations += len(stale)
+    
+    def _cached_moves(self, kind: str, piece: PieceInfo, square: int,
+                      compute: Callable[[], Tuple[Any, int]], context: Any = None) -> Any:
+        """Per-piece cache for move generation results.
+        
+        compute() returns (value, dependency mask): the squares whose contents
+        the value was derived from. The entry stays valid until one of those
+        squares changes, the piece moves, changes type or changes color, or
+        context (anything else the value depends on) differs. The piece's own
+        square is never a dependency, so lifting a piece and putting it back
+        on the same square keeps its entry.
+        """
+        key = (kind, piece.uid)
+        entry = self._move_cache.get(key)
+        if (entry and entry[0] == square and entry[1] == piece.piece_type and entry[2] == piece.color
+                and entry[3] == context):
+            self.cache_hits += 1
+            return entry[4]
+        
+        self.cache_misses += 1
+        if self.move_latency is None:
+            value, dependencies = compute()
+        else:
+            started = time.perf_counter()
+            value, dependencies = compute()
+            self.move_latency.record(time.perf_counter() - started)
+        self._move_cache[key] = (square, piece.piece_type, piece.color, context, value,
+                                 dependencies & ~(1 << square))
+        return value
+    
+    def move_cache_stats(self) -> Dict[str, int]:
+        return {
+            'move_cache_hits': self.cache_hits,
+            'move_cache_misses': self.cache_misses,
+            'move_cache_invalidations': self.cache_invalidations,
+            'move_cache_entries': len(self._move_cache),
+        }
+    
+    def piece_value(self, piece_type: str) -> int:
+        if piece_type == "unknown":
+            return 0
+        return self.piece_values.get(piece_type, 100)
+    
+    def colors(self) -> List[str]:
+        """The colors playing, in the order their pieces were initialized"""
+        return list(dict.fromkeys(piece.color for piece in self.pieces.values() if piece.color != "unknown"))
+    
+    def legal_moves(self, color: str) -> List[Tuple[PieceInfo, str, str]]:
+        """Every (piece, from, to) move a color can make on the current board"""
+        moves = []
+        for piece in list(self.pieces.values()):
+            if piece.color == color and piece.position and self.board_state.get(piece.position) is piece:
+                from_pos = piece.position
+                for to_pos in self.get_possible_moves(piece):
+                    moves.append((piece, from_pos, to_pos))
+        return moves
+    
+    def is_capture(self, piece: PieceInfo, from_pos: str, to_pos: str) -> bool:
+        """Whether a legal move takes a piece"""
+        target = self.board_state.get(to_pos)
+        return target is not None and target.color != piece.color
+    
+    def no_moves_result(self, color: str) -> int:
+        """Outcome for a color left without legal moves: -1 lost, 0 drawn"""
+        return -1
+    
+    def _rule_state(self) -> Any:
+        """What the rules remember beyond the board (such as castling rights), for unmake_move"""
+        return None
+    
+    def _restore_rule_state(self, state: Any):
+        pass
+    
+    def make_move(self, piece: PieceInfo, from_pos: str, to_pos: str) -> Tuple[list, Dict[str, PieceInfo], Any]:
+        """Apply a move as a MOVE event would, returning what unmake_move needs to take it back"""
+        pieces = dict(self.pieces)
+        rule_state = self._rule_state()
+        self._journal = []
+        try:
+            self.handle_event(GameEventData(GameEvent.PIECE_MOVED, piece.uid, to_pos, from_pos))
+            return self._journal, pieces, rule_state
+        finally:
+            self._journal = None
+    
+    def unmake_move(self, undo: Tuple[list, Dict[str, PieceInfo], Any]):
+        journal, pieces, rule_state = undo
+        for position, previous, kind in reversed(journal):
+            if previous is not None:
+                # Promotions change the piece in place, and captures clear its position
+                previous.piece_type, previous.color = kind
+                previous.position = position
+            self._set_square(position, previous)
+        self.pieces.clear()
+        self.pieces.update(pieces)
+        self._restore_rule_state(rule_state)
+    
+    def export_state(self) -> Dict[str, Any]:
+        """Plain-data copy of pieces and board, for snapshots"""
+        def encode(piece: PieceInfo) -> List[Any]:
+            return [piece.uid, piece.piece_type, piece.color, piece.position]
+        
+        return {
+            'pieces': [encode(piece) for piece in self.pieces.values()],
+            'board': {self.tables.square_names[square]: encode(piece)
+                      for square, piece in self.board_state.occupied()},
+        }
+    
+    def load_state(self, state: Dict[str, Any]):
+        """Replace the game state with one produced by export_state"""
+        self._move_cache.clear()
+        self.pieces = {uid: PieceInfo(uid, piece_type, color, position)
+                       for uid, piece_type, color, position in state['pieces']}
+        
+        # Board entries may refer to pieces no longer in self.pieces (captured)
+        detached: Dict[str, PieceInfo] = {}
+        for square, _ in list(self.board_state.occupied()):
+            self._set_square(self.tables.square_names[square], None)
+        for position, (uid, piece_type, color, piece_position) in state['board'].items():
+            piece = self.pieces.get(uid) or detached.get(uid)
+            if piece is None:
+                piece = detached[uid] = PieceInfo(uid, piece_type, color, piece_position)
+            self._set_square(position, piece)
+    
+    def sync_positions(self, placements: Dict[str, str]):
+        """Put every piece where the board reports it (uid -> square); the rest are off the board"""
+        for square, piece in list(self.board_state.occupied()):
+            position = self.tables.square_names[square]
+            if placements.get(piece.uid) != position:
+                self._set_square(position, None)
+                if piece.position == position:
+                    piece.position = None
+        for uid, position in placements.items():
+            piece = self.pieces.get(uid)
+            if piece is None:
+                piece = self.pieces[uid] = PieceInfo(uid, "unknown", "unknown", position)
+            piece.position = position
+            self._set_square(position, piece)
+    
     def handle_event(self, event: GameEventData) -> Dict[str, Any]:
         """
         Handle a game event and return response data
         Returns dict with keys: 'valid', 'message', 'highlights', etc.
         """
-        if event.event_type == GameEvent.PIECE_PLACED:
-            return self._handle_piece_placed(event)
-        elif event.event_type == GameEvent.PIECE_LIFTED:
-            return self._handle_piece_lifted(event)
-        elif event.event_type == GameEvent.PIECE_MOVED:
-            return self._handle_piece_moved(event)
-        
-        return {'valid': False, 'message': 'Unknown event type'}
+        handler = self._event_handlers.get(event.event_type)
+        if handler is None:
+            return {'valid': False, 'message': 'Unknown event type'}
+        return handler(event)
     
     def _handle_piece_placed(self, event: GameEventData) -> Dict[str, Any]:
         """Handle piece placement"""
@@ -63,7 +242,7 @@ class GameLogic(abc.ABC):
         
         # Update board state
         piece.position = event.position
-        self.board_state[event.position] = piece
+        self._set_square(event.position, piece)
         
         # Get possible moves for highlighting
         possible_moves = self.get_possible_moves(piece)
@@ -85,7 +264,7 @@ class GameLogic(abc.ABC):
         
         # Clear board position
         if piece.position:
-            self.board_state[piece.position] = None
+            self._set_square(piece.position, None)
         piece.position = None
         
         return {
@@ -110,7 +289,7 @@ class GameLogic(abc.ABC):
         
         # Execute move
         if event.from_position:
-            self.board_state[event.from_position] = None
+            self._set_square(event.from_position, None)
         
         # Check for capture
         captured_piece = self.board_state.get(event.position)
@@ -123,7 +302,7 @@ class GameLogic(abc.ABC):
         
         # Place piece
         piece.position = event.position
-        self.board_state[event.position] = piece
+        self._set_square(event.position, piece)
         
         return {
             'valid': True,
@@ -0,0 +1,157 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import BoardConfig, PieceInfo
+
+# (row, col) deltas used to build the per-square tables
+KING_STEPS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+DIAGONAL_STEPS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+ORTHOGONAL_STEPS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+KNIGHT_STEPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+
+class MoveTables:
+    """Per-square move masks precomputed once per board configuration.
+
+    Squares are numbered like BoardConfig.square_index (row * cols + col) and
+    every table is a list indexed by square holding a bitmask of targets.
+    Squares that have no name in the board config never appear in a mask.
+    """
+
+    _cache: Dict[Tuple, "MoveTables"] = {}
+
+    def __init__(self, board_config: BoardConfig):
+        self.rows, self.cols = board_config.size
+        self.num_squares = self.rows * self.cols
+        self.square_index = board_config.square_index
+        self.square_names = board_config.index_names
+
+        self.named_mask = 0
+        for index in self.square_index.values():
+            self.named_mask |= 1 << index
+
+        squares = range(self.num_squares)
+        self.king = [self._step_mask(sq, KING_STEPS, 1) for sq in squares]
+        self.knight = [self._step_mask(sq, KNIGHT_STEPS, 1) for sq in squares]
+
+        # Unlimited rays per step, and whether the step increases the square number
+        self.rays: Dict[Tuple[int, int], List[int]] = {
+            step: [self._step_mask(sq, [step], max(self.rows, self.cols)) for sq in squares]
+            for step in KING_STEPS
+        }
+        self.ascending = {step: step[0] * self.cols + step[1] > 0 for step in KING_STEPS}
+        # Every square on a rank, file or diagonal through the square
+        self.lines = [0] * self.num_squares
+        for ray in self.rays.values():
+            for sq in squares:
+                self.lines[sq] |= ray[sq]
+
+        # Keyed by row direction: -1 moves towards row 0, +1 away from it.
+        # pawn_attack doubles as the forward diagonal step of a checkers man,
+        # and jumps lists the (jumped square, landing square) pairs per square.
+        self.pawn_push: Dict[int, List[int]] = {}
+        self.pawn_attack: Dict[int, List[int]] = {}
+        self.jumps: Dict[int, List[List[Tuple[int, int]]]] = {}
+        for direction in (-1, 1):
+            self.pawn_push[direction] = [self._step_mask(sq, [(direction, 0)], 1) for sq in squares]
+            self.pawn_attack[direction] = [
+                self._step_mask(sq, [(direction, -1), (direction, 1)], 1) for sq in squares
+            ]
+            self.jumps[direction] = [self._jump_list(sq, direction) for sq in squares]
+
+    @classmethod
+    def for_config(cls, board_config: BoardConfig) -> "MoveTables":
+        """Return the (shared) tables for a board configuration"""
+        key = (tuple(board_config.size), tuple(sorted(board_config.position_mapping.items())))
+        tables = cls._cache.get(key)
+        if tables is None:
+            tables = cls(board_config)
+            cls._cache[key] = tables
+        return tables
+
+    def _step_mask(self, square: int, steps: List[Tuple[int, int]], max_distance: int) -> int:
+        """Mask of squares reachable by repeating each step up to max_distance times"""
+        row, col = divmod(square, self.cols)
+        mask = 0
+        for d_row, d_col in steps:
+            for distance in range(1, max_distance + 1):
+                to_row = row + d_row * distance
+                to_col = col + d_col * distance
+                if not (0 <= to_row < self.rows and 0 <= to_col < self.cols):
+                    break
+                mask |= 1 << (to_row * self.cols + to_col)
+        return mask & self.named_mask
+
+    def _jump_list(self, square: int, direction: int) -> List[Tuple[int, int]]:
+        row, col = divmod(square, self.cols)
+        jumps = []
+        for d_col in (-1, 1):
+            over = self._step_mask(square, [(direction, d_col)], 1)
+            land_row, land_col = row + 2 * direction, col + 2 * d_col
+            if over and 0 <= land_row < self.rows and 0 <= land_col < self.cols:
+                land = land_row * self.cols + land_col
+                if self.named_mask >> land & 1:
+                    jumps.append((over.bit_length() - 1, land))
+        return jumps
+
+    def slide(self, square: int, steps: List[Tuple[int, int]], occupied: int) -> int:
+        """Squares a sliding piece reaches along each step, up to and including the first blocker"""
+        reach = 0
+        for step in steps:
+            ray = self.rays[step]
+            targets = ray[square]
+            blockers = targets & occupied
+            if blockers:
+                # Nearest blocker: lowest bit on ascending rays, highest on descending ones
+                first = (blockers & -blockers).bit_length() - 1 if self.ascending[step] else blockers.bit_length() - 1
+                targets &= ~ray[first]
+            reach |= targets
+        return reach
+
+    def first_square(self, mask: int) -> Optional[int]:
+        """Lowest square in a mask (None if empty)"""
+        return (mask & -mask).bit_length() - 1 if mask else None
+
+    def iter_squares(self, mask: int) -> Iterator[int]:
+        """Yield the square indexes set in a mask, lowest first"""
+        while mask:
+            low_bit = mask & -mask
+            yield low_bit.bit_length() - 1
+            mask ^= low_bit
+
+    def names(self, mask: int) -> List[str]:
+        """Convert a mask to a list of position names in square order"""
+        return [self.square_names[sq] for sq in self.iter_squares(mask)]
+
+
+class BitBoard:
+    """Integer occupancy masks per color and piece type, mirroring board_state"""
+
+    def __init__(self, tables: MoveTables):
+        self.tables = tables
+        self.occupied = 0
+        self.by_color: Dict[str, int] = {}
+        self.by_type: Dict[str, int] = {}
+
+    def clear_square(self, position: str):
+        """Remove whatever occupies a square"""
+        index = self.tables.square_index.get(position)
+        if index is None:
+            return
+        keep = ~(1 << index)
+        self.occupied &= keep
+        for color in self.by_color:
+            self.by_color[color] &= keep
+        for piece_type in self.by_type:
+            self.by_type[piece_type] &= keep
+
+    def set_square(self, position: str, piece: Optional[PieceInfo]):
+        """Put a piece on a square (or empty it when piece is None)"""
+        self.clear_square(position)
+        index = self.tables.square_index.get(position)
+        if index is None or piece is None:
+            return
+        bit = 1 << index
+        self.occupied |= bit
+        self.by_color[piece.color] = self.by_color.get(piece.color, 0) | bit
+        self.by_type[piece.piece_type] = self.by_type.get(piece.piece_type, 0) | bit
+
+    def color_mask(self, color: str) -> int:
+        return self.by_color.get(color, 0)
@@ -1,9 +1,19 @@
-from typing import Dict, List, Optional
-from config import PieceInfo
+from typing import Any, Dict, List, Optional, Tuple
+from config import GameEventData, PieceInfo
 from game_logic.base import GameLogic
 
 class CheckersLogic(GameLogic):
-    """Checkers game logic implementation"""
+    """Checkers game logic implementation
+    
+    Men ("piece") step diagonally forward and kings ("king") diagonally in
+    any direction. Captures jump an adjacent opposing piece onto the empty
+    square behind it and may chain into multi-jumps; a move event from the
+    start to the final landing square removes every piece jumped on the way.
+    Capturing is compulsory: while any piece of a color can jump, that
+    color's plain steps are invalid. A man reaching the far row is crowned.
+    """
+    
+    piece_values = {"piece": 100, "king": 160}
     
     def get_game_name(self) -> str:
         return "Checkers"
@@ -39,32 +49,121 @@ class CheckersLogic(GameLogic):
         if not piece.position or piece.position != from_pos:
             return False
         
-        from_row, from_col = self.board_config.position_mapping[from_pos]
-        to_row, to_col = self.board_config.position_mapping[to_pos]
+        to_index = self.tables.square_index.get(to_pos)
+        if to_index is None:
+            return False
+        
+        return bool(self._move_mask(piece) >> to_index & 1)
+    
+    def _forward(self, color: str) -> int:
+        return -1 if color == "Red" else 1
+    
+    def _directions(self, piece: PieceInfo) -> List[int]:
+        return [self._forward(piece.color)] if piece.piece_type == "piece" else [-1, 1]
+    
+    def _crown_row(self, color: str) -> int:
+        return 0 if self._forward(color) < 0 else self.tables.rows - 1
+    
+    def _jumps(self, piece: PieceInfo, square: int) -> Dict[int, int]:
+        """Landing square -> mask of jumped pieces, for every single and multi-jump"""
+        return self._cached_moves("jumps", piece, square, lambda: self._search_jumps(piece, square))
+    
+    def _search_jumps(self, piece: PieceInfo, square: int) -> Tuple[Dict[int, int], int]:
+        """Jump search, also returning every square it looked at"""
+        found: Dict[int, int] = {}
+        examined = 0
+        # The jumping piece has left its square; jumped pieces stay until the move ends
+        occupied = self.bitboard.occupied & ~(1 << square)
+        enemy = occupied & ~self.bitboard.color_mask(piece.color)
+        directions = self._directions(piece)
+        crown_row = self._crown_row(piece.color) if piece.piece_type == "piece" else None
         
-        # Diagonal moves only
-        if abs(from_row - to_row) != abs(from_col - to_col):
+        pending = [(square, 0)]
+        while pending:
+            at, captured = pending.pop()
+            for direction in directions:
+                for over, land in self.tables.jumps[direction][at]:
+                    over_bit = 1 << over
+                    examined |= over_bit | 1 << land
+                    if not enemy & over_bit or captured & over_bit or occupied >> land & 1:
+                        continue
+                    total = captured | over_bit
+                    if land in found and bin(found[land]).count("1") >= bin(total).count("1"):
+                        continue
+                    found[land] = total
+                    # Being crowned ends the move
+                    if land // self.tables.cols != crown_row:
+                        pending.append((land, total))
+        return found, examined
+    
+    def _color_can_jump(self, color: str) -> bool:
+        for square in self.tables.iter_squares(self.bitboard.color_mask(color)):
+            piece = self.board_state.at(square)
+            if piece and piece.piece_type in ("piece", "king") and self._jumps(piece, square):
+                return True
+        return False
+    
+    def _move_mask(self, piece: PieceInfo) -> int:
+        """Bitmask of destination squares for a piece on its current position"""
+        square = self.tables.square_index.get(piece.position)
+        if square is None or piece.piece_type not in ("piece", "king"):
+            return 0
+        
+        jumps = self._jumps(piece, square)
+        if jumps:
+            mask = 0
+            for land in jumps:
+                mask |= 1 << land
+            return mask
+        if self._color_can_jump(piece.color):
+            return 0
+        
+        steps = 0
+        for direction in self._directions(piece):
+            steps |= self.tables.pawn_attack[direction][square]
+        return steps & ~self.bitboard.occupied
+    
+    def is_capture(self, piece: PieceInfo, from_pos: str, to_pos: str) -> bool:
+        """Checkers captures by jumping onto an empty square"""
+        from_index = self.tables.square_index.get(from_pos)
+        to_index = self.tables.square_index.get(to_pos)
+        if from_index is None or piece.piece_type not in ("piece", "king"):
             return False
+        return to_index in self._jumps(piece, from_index)
+    
+    def _handle_piece_moved(self, event: GameEventData) -> Dict[str, Any]:
+        piece = self.pieces.get(event.piece_uid)
+        captured = 0
+        if piece and self.is_valid_move(piece, event.from_position, event.position):
+            from_index = self.tables.square_index[event.from_position]
+            captured = self._jumps(piece, from_index).get(self.tables.square_index[event.position], 0)
         
-        # Check direction (simplified)
-        direction = -1 if piece.color == "Red" else 1
-        if piece.piece_type == "piece" and (to_row - from_row) * direction <= 0:
-            return False  # Regular pieces can only move forward
+        response = super()._handle_piece_moved(event)
+        if not response['valid']:
+            return response
         
-        # Check if destination is empty
-        target_piece = self.board_state.get(to_pos)
-        return target_piece is None or target_piece.color != piece.color
+        jumped = []
+        for square in self.tables.iter_squares(captured):
+            position = self.tables.square_names[square]
+            victim = self.board_state.get(position)
+            self._set_square(position, None)
+            if victim:
+                victim.position = None
+                self.pieces.pop(victim.uid, None)
+                jumped.append(position)
+        if jumped:
+            response['message'] += f' (jumped {", ".join(jumped)})'
+        
+        to_index = self.tables.square_index[event.position]
+        if piece.piece_type == "piece" and to_index // self.tables.cols == self._crown_row(piece.color):
+            piece.piece_type = "king"
+            self._set_square(event.position, piece)
+            response['message'] += ' and was crowned'
+        return response
     
     def get_possible_moves(self, piece: PieceInfo) -> List[str]:
         """Get all possible moves for a checkers piece"""
         if not piece.position:
             return []
         
-        possible_moves = []
-        for position in self.board_config.position_mapping.keys():
-            if self.is_valid_move(piece, piece.position, position):
-                possible_moves.append(position)
-        
-        return possible_moves
-
-
+        return self.tables.names(self._move_mask(piece))
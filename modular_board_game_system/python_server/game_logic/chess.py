@@ -1,9 +1,41 @@
-from typing import Dict, List, Optional
-from config import PieceInfo
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from config import BoardConfig, GameEventData, PieceInfo
+from game_logic.attacks import AttackMap
 from game_logic.base import GameLogic
+from game_logic.bitboard import DIAGONAL_STEPS, KING_STEPS, ORTHOGONAL_STEPS
+
+SLIDING_STEPS = {"rook": ORTHOGONAL_STEPS, "bishop": DIAGONAL_STEPS, "queen": KING_STEPS}
 
 class ChessLogic(GameLogic):
-    """Chess game logic implementation"""
+    """Chess game logic implementation
+    
+    Pieces move by the full chess rules: sliding pieces stop at the first
+    blocker, knights jump, pawns push (two squares from their starting row),
+    capture diagonally (en passant too) and become queens on the last row,
+    kings castle, and no move may leave the mover's own king attacked.
+    Attacked squares are tracked by an AttackMap that is updated on every
+    board change, so the king-safety check usually costs a couple of bit
+    tests.
+    
+    A king that has not moved castles with an unmoved rook of its row by
+    moving two squares toward it, on any board size; the game moves the
+    rook to the square the king crossed, and the player's MOVE of that rook
+    afterwards is accepted as the end of the castling. Likewise an en
+    passant capture takes the pawn off the game at once.
+    """
+    
+    # The king is never captured; losing it is scored as checkmate instead
+    piece_values = {"pawn": 100, "knight": 320, "bishop": 330, "rook": 500, "queen": 900, "king": 0}
+    
+    def __init__(self, board_config: BoardConfig):
+        super().__init__(board_config)
+        self.attack_map = AttackMap(self.bitboard, self._attacks, lambda piece: piece.piece_type in SLIDING_STEPS)
+        # Kings and rooks that have moved, and can no longer castle
+        self.moved: FrozenSet[str] = frozenset()
+        # (square passed over, square of the pawn) right after a pawn's double push
+        self.en_passant: Optional[Tuple[int, int]] = None
+        # (uid, from, to) of the rook the game moved when a king castled, until the player moves it
+        self._castling_rook: Optional[Tuple[str, str, str]] = None
     
     def get_game_name(self) -> str:
         return "Chess"
@@ -39,72 +71,307 @@ class ChessLogic(GameLogic):
         if not piece.position or piece.position != from_pos:
             return False
         
-        from_row, from_col = self.board_config.position_mapping[from_pos]
-        to_row, to_col = self.board_config.position_mapping[to_pos]
-        
-        # Basic bounds check
-        if not (0 <= to_row < self.board_config.size[0] and 0 <= to_col < self.board_config.size[1]):
+        to_index = self.tables.square_index.get(to_pos)
+        if to_index is None:
             return False
         
-        # Check if destination has friendly piece
-        target_piece = self.board_state.get(to_pos)
-        if target_piece and target_piece.color == piece.color:
-            return False
-        
-        # Piece-specific movement rules
+        return bool(self._move_mask(piece) >> to_index & 1)
+    
+    def _set_square(self, position: str, piece: Optional[PieceInfo]):
+        super()._set_square(position, piece)
+        square = self.tables.square_index.get(position)
+        if square is not None:
+            self.attack_map.update(square, piece)
+    
+    def _forward(self, color: str) -> int:
+        return -1 if color == "White" else 1
+    
+    def _attacks(self, piece: PieceInfo, square: int, occupied: int) -> int:
+        """Squares a piece on square attacks (regardless of what stands on them)"""
+        tables = self.tables
         if piece.piece_type == "pawn":
-            return self._is_valid_pawn_move(piece, from_row, from_col, to_row, to_col, target_piece)
-        elif piece.piece_type == "rook":
-            return self._is_valid_rook_move(from_row, from_col, to_row, to_col)
+            return tables.pawn_attack[self._forward(piece.color)][square]
         elif piece.piece_type == "knight":
-            return self._is_valid_knight_move(from_row, from_col, to_row, to_col)
+            return tables.knight[square]
         elif piece.piece_type == "king":
-            return self._is_valid_king_move(from_row, from_col, to_row, to_col)
+            return tables.king[square]
+        steps = SLIDING_STEPS.get(piece.piece_type)
+        if steps:
+            return tables.slide(square, steps, occupied)
+        return 0
+    
+    def _move_mask(self, piece: PieceInfo) -> int:
+        """Bitmask of legal destination squares for a piece on its current position"""
+        square = self.tables.square_index.get(piece.position)
+        if square is None:
+            return 0
         
-        return False
+        # Which squares hold this color's king decides what counts as self-check
+        kings = self.bitboard.by_type.get("king", 0) & self.bitboard.color_mask(piece.color)
+        if piece.piece_type == "pawn":
+            context = (kings, self._en_passant_for(piece, square))
+        elif piece.piece_type == "king":
+            context = (kings, self.moved)
+        else:
+            context = kings
+        return self._cached_moves("moves", piece, square, lambda: self._compute_moves(piece, square), context)
+    
+    def _en_passant_for(self, piece: PieceInfo, square: int) -> Optional[Tuple[int, int]]:
+        """The en passant capture a pawn on square can make, if any"""
+        en_passant = self.en_passant
+        if (en_passant is None or piece.piece_type != "pawn"
+                or not self.tables.pawn_attack[self._forward(piece.color)][square] >> en_passant[0] & 1):
+            return None
+        victim = self.board_state.at(en_passant[1])
+        if victim is None or victim.piece_type != "pawn" or victim.color == piece.color:
+            return None
+        return en_passant
     
-    def _is_valid_pawn_move(self, piece: PieceInfo, from_row: int, from_col: int, 
-                           to_row: int, to_col: int, target_piece: Optional[PieceInfo]) -> bool:
-        """Validate pawn movement"""
-        direction = -1 if piece.color == "White" else 1
+    def _castling_targets(self, piece: PieceInfo, square: int) -> int:
+        """Squares an unmoved king not in check reaches by castling"""
+        if piece.uid in self.moved:
+            return 0
+        tables = self.tables
+        occupied = self.bitboard.occupied
+        if self._is_attacked(square, piece.color, occupied):
+            return 0
+        # The king does not shield the squares it crosses
+        without_king = occupied & ~(1 << square)
+        rooks = self.bitboard.by_type.get("rook", 0) & self.bitboard.color_mask(piece.color)
+        targets = 0
+        for rook_square in tables.iter_squares(rooks):
+            rook = self.board_state.at(rook_square)
+            if (rook.uid in self.moved or rook_square // tables.cols != square // tables.cols
+                    or abs(rook_square - square) < 3):
+                continue
+            step = 1 if rook_square > square else -1
+            between = sum(1 << between for between in range(square + step, rook_square, step))
+            if occupied & between:
+                continue
+            if not any(self._is_attacked(crossed, piece.color, without_king)
+                       for crossed in (square + step, square + 2 * step)):
+                targets |= 1 << square + 2 * step
+        return targets
+    
+    def _compute_moves(self, piece: PieceInfo, square: int) -> Tuple[int, int]:
+        """Legal destinations, and the squares whose contents decided them"""
+        tables = self.tables
+        occupied = self.bitboard.occupied
+        friendly = self.bitboard.color_mask(piece.color)
         
-        # Forward move
-        if from_col == to_col and to_row == from_row + direction:
-            return target_piece is None
+        if piece.piece_type == "pawn":
+            direction = self._forward(piece.color)
+            push = tables.pawn_push[direction][square]
+            dependencies = push | tables.pawn_attack[direction][square]
+            targets = push & ~occupied
+            start_row = tables.rows - 2 if direction < 0 else 1
+            if push and square // tables.cols == start_row:
+                double_push = tables.pawn_push[direction][push.bit_length() - 1]
+                dependencies |= double_push
+                if targets:
+                    targets |= double_push & ~occupied
+            targets |= tables.pawn_attack[direction][square] & occupied & ~friendly
+            en_passant = self._en_passant_for(piece, square)
+            if en_passant:
+                targets |= 1 << en_passant[0]
+                dependencies |= 1 << en_passant[1]
+        else:
+            # Sliders only look as far as the first blocker on each ray
+            if self.attack_map.pieces.get(square) is piece:
+                dependencies = self.attack_map.attacks_from[square]
+            else:
+                dependencies = self._attacks(piece, square, occupied)
+            targets = dependencies & ~friendly
         
-        # Diagonal capture
-        if abs(from_col - to_col) == 1 and to_row == from_row + direction:
-            return target_piece is not None and target_piece.color != piece.color
+        kings = self.bitboard.by_type.get("king", 0) & friendly
+        if piece.piece_type == "king":
+            # Anything anywhere may attack the king's targets
+            dependencies = tables.named_mask
+        elif kings:
+            # Checks against the king (as seen once this piece has left its square),
+            # and enemy sliders that could pin this piece
+            king_square = tables.first_square(kings)
+            dependencies |= (tables.slide(king_square, KING_STEPS, occupied & ~(1 << square))
+                             | tables.knight[king_square] | tables.king[king_square] | 1 << king_square
+                             | tables.slide(square, KING_STEPS, occupied))
         
-        return False
+        legal = self._without_self_check(piece, square, targets)
+        if piece.piece_type == "king":
+            legal |= self._castling_targets(piece, square)
+        return legal, dependencies
     
-    def _is_valid_rook_move(self, from_row: int, from_col: int, to_row: int, to_col: int) -> bool:
-        """Validate rook movement (simplified - no path checking)"""
-        # Horizontal or vertical movement only
-        if from_row == to_row or from_col == to_col:
-            # In a real implementation, we'd check for pieces blocking the path
-            return abs(from_row - to_row) + abs(from_col - to_col) <= 2  # Limited range for 4x4
+    def _without_self_check(self, piece: PieceInfo, square: int, targets: int) -> int:
+        """Drop the targets that would leave the mover's king attacked"""
+        kings = self.bitboard.by_type.get("king", 0) & self.bitboard.color_mask(piece.color)
+        if not kings or not targets:
+            return targets
+        king_square = self.tables.first_square(kings)
+        
+        enemy_attacks = self.attack_map.attacked_by_others(piece.color)
+        enemy_slider_attacks = self.attack_map.attacked_by_others(piece.color, sliders_only=True)
+        if piece.piece_type == "king":
+            # Unless a slider sees the king (and could x-ray past it), the attack map decides
+            if not enemy_slider_attacks >> king_square & 1:
+                return targets & ~enemy_attacks
+        # Taking en passant also empties the captured pawn's square, which a slider may see through
+        en_passant = self._en_passant_for(piece, square)
+        if en_passant and not targets >> en_passant[0] & 1:
+            en_passant = None
+        if (not enemy_attacks >> king_square & 1 and not enemy_slider_attacks >> square & 1
+                and en_passant is None and piece.piece_type != "king"):
+            # Only a king in check, or a piece that an enemy slider might pin, needs the full test
+            return targets
+        
+        legal = 0
+        from_bit = 1 << square
+        for target in self.tables.iter_squares(targets):
+            to_bit = 1 << target
+            taken = 1 << en_passant[1] if en_passant and target == en_passant[0] else 0
+            occupied = (self.bitboard.occupied & ~from_bit & ~taken) | to_bit
+            guarded = target if piece.piece_type == "king" else king_square
+            if not self._is_attacked(guarded, piece.color, occupied, captured=to_bit | taken):
+                legal |= to_bit
+        return legal
+    
+    def _is_attacked(self, square: int, color: str, occupied: int, captured: int = 0) -> bool:
+        """Whether any other color attacks square on a board with the given occupancy"""
+        tables = self.tables
+        by_type = self.bitboard.by_type
+        enemy = occupied & ~self.bitboard.color_mask(color) & ~captured
+        
+        if tables.knight[square] & by_type.get("knight", 0) & enemy:
+            return True
+        if tables.king[square] & by_type.get("king", 0) & enemy:
+            return True
+        for other, mask in self.bitboard.by_color.items():
+            if other != color:
+                # A pawn attacks square from one row behind it, seen from the pawn's side
+                pawns = by_type.get("pawn", 0) & mask & enemy
+                if pawns and tables.pawn_attack[-self._forward(other)][square] & pawns:
+                    return True
+        
+        rooks = (by_type.get("rook", 0) | by_type.get("queen", 0)) & enemy
+        if rooks and tables.slide(square, ORTHOGONAL_STEPS, occupied) & rooks:
+            return True
+        bishops = (by_type.get("bishop", 0) | by_type.get("queen", 0)) & enemy
+        if bishops and tables.slide(square, DIAGONAL_STEPS, occupied) & bishops:
+            return True
         return False
     
-    def _is_valid_knight_move(self, from_row: int, from_col: int, to_row: int, to_col: int) -> bool:
-        """Validate knight movement (simplified for 4x4)"""
-        # Diagonal moves only in 4x4 chess
-        return abs(from_row - to_row) == 1 and abs(from_col - to_col) == 1
+    def in_check(self, color: str) -> bool:
+        kings = self.bitboard.by_type.get("king", 0) & self.bitboard.color_mask(color)
+        return bool(kings & self.attack_map.attacked_by_others(color))
+    
+    def no_moves_result(self, color: str) -> int:
+        """Checkmate loses, stalemate is a draw"""
+        return -1 if self.in_check(color) else 0
+    
+    def is_capture(self, piece: PieceInfo, from_pos: str, to_pos: str) -> bool:
+        if super().is_capture(piece, from_pos, to_pos):
+            return True
+        en_passant = self._en_passant_for(piece, self.tables.square_index[from_pos])
+        return en_passant is not None and self.tables.square_index[to_pos] == en_passant[0]
+    
+    def _rule_state(self) -> Any:
+        return self.moved, self.en_passant, self._castling_rook
+    
+    def _restore_rule_state(self, state: Any):
+        self.moved, self.en_passant, self._castling_rook = state
+    
+    def export_state(self) -> Dict[str, Any]:
+        state = super().export_state()
+        state['moved'] = sorted(self.moved)
+        state['en_passant'] = list(self.en_passant) if self.en_passant else None
+        return state
+    
+    def load_state(self, state: Dict[str, Any]):
+        super().load_state(state)
+        # Snapshots written before castling and en passant were tracked have neither
+        self.moved = frozenset(state.get('moved', ()))
+        self.en_passant = tuple(state['en_passant']) if state.get('en_passant') else None
+        self._castling_rook = None
+    
+    def sync_positions(self, placements: Dict[str, str]):
+        super().sync_positions(placements)
+        self.en_passant = None
+        self._castling_rook = None
     
-    def _is_valid_king_move(self, from_row: int, from_col: int, to_row: int, to_col: int) -> bool:
-        """Validate king movement"""
-        return abs(from_row - to_row) <= 1 and abs(from_col - to_col) <= 1
+    def _handle_piece_lifted(self, event: GameEventData) -> Dict[str, Any]:
+        rook = self._castling_rook
+        if rook and event.piece_uid == rook[0] and event.position == rook[1]:
+            # The game already put this rook where castling takes it
+            return {'valid': True, 'message': f'Rook lifted from {event.position} to complete castling',
+                    'highlights': {'selected': [rook[2]]}}
+        return super()._handle_piece_lifted(event)
+    
+    def _handle_piece_moved(self, event: GameEventData) -> Dict[str, Any]:
+        rook, self._castling_rook = self._castling_rook, None
+        if rook and (event.piece_uid, event.from_position, event.position) == rook:
+            return {'valid': True, 'message': f'Castling completed, rook on {event.position}',
+                    'highlights': {'clear': True}}
+        
+        piece = self.pieces.get(event.piece_uid)
+        from_index = self.tables.square_index.get(event.from_position)
+        en_passant = None
+        if piece is not None and from_index is not None:
+            en_passant = self._en_passant_for(piece, from_index)
+        
+        response = super()._handle_piece_moved(event)
+        if not response['valid']:
+            self._castling_rook = rook
+            return response
+        
+        tables = self.tables
+        to_index = tables.square_index[event.position]
+        self.en_passant = None
+        if piece.piece_type == "pawn":
+            if en_passant and to_index == en_passant[0]:
+                victim = self.board_state.at(en_passant[1])
+                self._set_square(tables.square_names[en_passant[1]], None)
+                victim.position = None
+                self.pieces.pop(victim.uid, None)
+                response['message'] += f' (captured {victim.color} pawn en passant)'
+            if abs(to_index - from_index) == 2 * tables.cols:
+                self.en_passant = ((from_index + to_index) // 2, to_index)
+            last_row = 0 if self._forward(piece.color) < 0 else tables.rows - 1
+            if to_index // tables.cols == last_row:
+                piece.piece_type = "queen"
+                self._set_square(event.position, piece)
+                response['message'] += ' and was promoted to queen'
+        elif piece.piece_type in ("king", "rook"):
+            if (piece.piece_type == "king" and abs(to_index - from_index) == 2
+                    and to_index // tables.cols == from_index // tables.cols):
+                # Castling: the rook lands on the square the king crossed
+                rook_square = self._castling_rook_square(from_index, to_index)
+                castled = self.board_state.at(rook_square)
+                crossed = tables.square_names[(from_index + to_index) // 2]
+                self._castling_rook = (castled.uid, tables.square_names[rook_square], crossed)
+                self._set_square(tables.square_names[rook_square], None)
+                castled.position = crossed
+                self._set_square(crossed, castled)
+                self.moved = self.moved | {castled.uid}
+                response['message'] += f' (castling, move the rook from {tables.square_names[rook_square]} to {crossed})'
+            if piece.uid not in self.moved:
+                self.moved = self.moved | {piece.uid}
+        
+        attacked = self.attack_map.by_color.get(piece.color, 0)
+        for other, mask in self.bitboard.by_color.items():
+            kings = self.bitboard.by_type.get("king", 0) & mask
+            if other != piece.color and kings & attacked:
+                response['message'] += f' - {other} king in check'
+        return response
+    
+    def _castling_rook_square(self, from_index: int, to_index: int) -> int:
+        """The square of the rook a king castling from from_index to to_index takes along"""
+        step = 1 if to_index > from_index else -1
+        square = to_index + step
+        while self.board_state.at(square) is None:
+            square += step
+        return square
     
     def get_possible_moves(self, piece: PieceInfo) -> List[str]:
         """Get all possible moves for a piece"""
         if not piece.position:
             return []
         
-        possible_moves = []
-        for position in self.board_config.position_mapping.keys():
-            if self.is_valid_move(piece, piece.position, position):
-                possible_moves.append(position)
-        
-        return possible_moves
-
-
+        return self.tables.names(self._move_mask(piece))
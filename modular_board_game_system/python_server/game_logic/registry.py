@@ -0,0 +1,75 @@
+"""Registry of the games the server can run.
+
+Built-in games are Python classes registered by module and class name and
+imported only when chosen. Rule-defined games come from JSON rule files
+(see game_logic.rules): every *.json file in the rules directory is
+registered under its file name, and register_rule_file() adds others.
+"""
+import importlib
+import os
+from typing import Dict, List, Tuple
+
+from config import BoardConfig
+from game_logic.base import GameLogic
+
+RULES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules")
+
+# Game type -> (module, class), imported when the game is chosen
+GAME_TYPES: Dict[str, Tuple[str, str]] = {
+    "chess": ("game_logic.chess", "ChessLogic"),
+    "checkers": ("game_logic.checkers", "CheckersLogic"),
+}
+
+# Game type -> rule file path
+RULE_FILES: Dict[str, str] = {}
+
+_discovered = False
+
+def register_game(name: str, module_name: str, class_name: str):
+    """Register a GameLogic subclass taking only the board config"""
+    GAME_TYPES[name.lower()] = (module_name, class_name)
+
+def register_rule_file(path: str, name: str = "") -> str:
+    """Register a rule file (by default under its file name). Returns the game type"""
+    name = (name or os.path.splitext(os.path.basename(path))[0]).lower()
+    RULE_FILES[name] = path
+    return name
+
+def discover_rule_files(directory: str = RULES_DIRECTORY):
+    if not os.path.isdir(directory):
+        return
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith(".json"):
+            register_rule_file(os.path.join(directory, file_name))
+
+def _discover_once():
+    global _discovered
+    if not _discovered:
+        _discovered = True
+        discover_rule_files()
+
+def available_games() -> List[str]:
+    _discover_once()
+    return sorted(set(GAME_TYPES) | set(RULE_FILES))
+
+def create_game_logic(game_type: str, board_config: BoardConfig) -> GameLogic:
+    """Instantiate the game logic for a game type name or a rule file path"""
+    if game_type.endswith(".json") and os.path.isfile(game_type):
+        return _rule_game(game_type, board_config)
+    _discover_once()
+    
+    name = game_type.lower()
+    if name in GAME_TYPES:
+        module_name, class_name = GAME_TYPES[name]
+        logic_class = getattr(importlib.import_module(module_name), class_name)
+        return logic_class(board_config)
+    if name in RULE_FILES:
+        return _rule_game(RULE_FILES[name], board_config)
+    
+    choices = ", ".join(f"'{choice}'" for choice in available_games())
+    raise ValueError(f"Unsupported game type. Choose one of {choices} or a rule file.")
+
+def _rule_game(path: str, board_config: BoardConfig) -> GameLogic:
+    from game_logic.rule_based import RuleBasedLogic
+    from game_logic.rules import load_rules
+    return RuleBasedLogic(board_config, load_rules(path, board_config))
@@ -0,0 +1,101 @@
+from typing import Any, Dict, List, Tuple
+from config import BoardConfig, GameEventData, PieceInfo
+from game_logic.base import GameLogic
+from game_logic.rules import CompiledRules
+
+class RuleBasedLogic(GameLogic):
+    """Game logic driven entirely by a compiled rule file"""
+    
+    def __init__(self, board_config: BoardConfig, rules: CompiledRules):
+        super().__init__(board_config)
+        self.rules = rules
+        self.piece_values = rules.values
+    
+    def get_game_name(self) -> str:
+        return self.rules.name
+    
+    def initialize_pieces(self) -> Dict[str, PieceInfo]:
+        """Initialize the pieces listed in the rule file's uid mapping"""
+        pieces = {}
+        for uid, (piece_type, color) in self.rules.uids.items():
+            piece = PieceInfo(uid=uid, piece_type=piece_type, color=color)
+            pieces[uid] = piece
+            self.pieces[uid] = piece
+        
+        return pieces
+    
+    def is_valid_move(self, piece: PieceInfo, from_pos: str, to_pos: str) -> bool:
+        if not piece.position or piece.position != from_pos:
+            return False
+        
+        to_index = self.tables.square_index.get(to_pos)
+        if to_index is None:
+            return False
+        
+        return bool(self._move_mask(piece) >> to_index & 1)
+    
+    def _move_mask(self, piece: PieceInfo) -> int:
+        """Bitmask of destination squares for a piece on its current position"""
+        square = self.tables.square_index.get(piece.position)
+        if square is None:
+            return 0
+        
+        return self._cached_moves("moves", piece, square, lambda: self._compute_moves(piece, square))
+    
+    def _compute_moves(self, piece: PieceInfo, square: int) -> Tuple[int, int]:
+        """Destinations, and the squares whose contents decided them"""
+        components = self.rules.moves.get(piece.piece_type, {}).get(piece.color)
+        if not components:
+            return 0, 0
+        
+        occupied = self.bitboard.occupied
+        friendly = self.bitboard.color_mask(piece.color)
+        mask = 0
+        dependencies = 0
+        for component in components:
+            if component.leaps is not None:
+                targets = component.leaps[square]
+                dependencies |= targets
+            else:
+                targets = 0
+                for ascending, ray, beyond in component.rays:
+                    reach = ray[square]
+                    blockers = reach & occupied
+                    if blockers:
+                        # The nearest blocker is the lowest bit on ascending rays, the highest otherwise
+                        first = (blockers & -blockers) if ascending else 1 << (blockers.bit_length() - 1)
+                        reach &= ~beyond[first.bit_length() - 1]
+                    targets |= reach
+                # Nothing past the first blocker matters
+                dependencies |= targets
+            
+            if component.capture == "move":
+                targets &= ~occupied
+            elif component.capture == "capture":
+                targets &= occupied & ~friendly
+            else:
+                targets &= ~friendly
+            mask |= targets
+        return mask, dependencies
+    
+    def get_possible_moves(self, piece: PieceInfo) -> List[str]:
+        if not piece.position:
+            return []
+        
+        return self.tables.names(self._move_mask(piece))
+    
+    def _handle_piece_moved(self, event: GameEventData) -> Dict[str, Any]:
+        response = super()._handle_piece_moved(event)
+        if not response['valid']:
+            return response
+        
+        piece = self.pieces[event.piece_uid]
+        promotion = self.rules.promotions.get(piece.piece_type)
+        to_index = self.tables.square_index.get(event.position)
+        if promotion and to_index is not None:
+            promoted_type, zones = promotion
+            if zones.get(piece.color, 0) >> to_index & 1:
+                piece.piece_type = promoted_type
+                self._set_square(event.position, piece)
+                response['message'] += f' and promoted to {promoted_type}'
+        return response
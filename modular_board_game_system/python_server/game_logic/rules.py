@@ -0,0 +1,235 @@
+"""Declarative game rules compiled into per-square move tables.
+
+A rule file is JSON:
+
+    {
+        "name": "Minichess",
+        "colors": {"White": {"forward": -1}, "Black": {"forward": 1}},
+        "pieces": {
+            "rook":   {"moves": [{"vectors": "orthogonal", "slide": true}]},
+            "knight": {"moves": [{"vectors": "knight"}]},
+            "pawn":   {"moves": [{"vectors": [[-1, 0]], "relative": true, "capture": false},
+                                 {"vectors": [[-1, -1], [-1, 1]], "relative": true, "capture": "only"}],
+                       "promotion": {"to": "queen", "zone": "last_row"},
+                       "value": 100}
+        },
+        "uids": {"C5B7BD01": ["rook", "White"], ...}
+    }
+
+Vectors are (row, col) steps or one of the names in NAMED_VECTORS. A move
+leaps by each vector once unless "slide" is true (any distance) or a number
+(at most that many steps); sliding moves stop at the first occupied square.
+"relative" vectors are written for a color moving towards row 0 (forward
+-1) and flipped for colors whose forward direction is +1. "capture" is true (move or capture, the default),
+false (only onto empty squares) or "only" (only onto enemy pieces). A
+promotion zone is "last_row" or a list of row numbers; a piece ending a
+move there becomes the "to" type. "value" is the piece's material worth
+for move suggestions (default 100).
+
+Rules are compiled once per rule file and board layout into plain integer
+masks, so move generation for a rule-defined game costs the same as for a
+built-in one. The compiled form is pickled to a __rulecache__ directory next
+to the rule file, keyed by a hash of the file's contents and the layout.
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import BoardConfig
+
+# Bump when the compiled layout changes so stale cache files are ignored
+RULES_FORMAT = 2
+
+ORTHOGONAL = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+DIAGONAL = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+NAMED_VECTORS: Dict[str, List[Tuple[int, int]]] = {
+    "orthogonal": ORTHOGONAL,
+    "diagonal": DIAGONAL,
+    "king": ORTHOGONAL + DIAGONAL,
+    "knight": [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)],
+}
+CAPTURE_MODES = {True: "both", False: "move", "only": "capture"}
+
+@dataclasses.dataclass
+class MoveComponent:
+    """One compiled move rule for a piece type and color.
+    
+    Leaping moves use leaps[square]. Sliding moves have one entry per
+    direction in rays: (ascending, ray, beyond), where ray[square] holds the
+    squares the slide can reach on an empty board and beyond[square] the
+    unlimited ray, used to cut everything behind the first blocker.
+    """
+    capture: str
+    leaps: Optional[List[int]] = None
+    rays: List[Tuple[bool, List[int], List[int]]] = dataclasses.field(default_factory=list)
+
+@dataclasses.dataclass
+class CompiledRules:
+    name: str
+    uids: Dict[str, Tuple[str, str]]
+    # piece type -> color -> move components
+    moves: Dict[str, Dict[str, List[MoveComponent]]]
+    # piece type -> (promoted type, color -> mask of promotion squares)
+    promotions: Dict[str, Tuple[str, Dict[str, int]]]
+    # piece type -> material value
+    values: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+class RuleCompiler:
+    """Turns a parsed rule file into CompiledRules for one board layout"""
+    
+    def __init__(self, board_config: BoardConfig, source: str = "rules"):
+        self.rows, self.cols = board_config.size
+        self.square_index = board_config.square_index
+        self.source = source
+        self.named_mask = 0
+        for index in self.square_index.values():
+            self.named_mask |= 1 << index
+    
+    def compile(self, rules: Dict[str, Any]) -> CompiledRules:
+        name = rules.get("name")
+        colors = rules.get("colors")
+        pieces = rules.get("pieces")
+        if not isinstance(name, str) or not isinstance(colors, dict) or not isinstance(pieces, dict):
+            raise ValueError(f"{self.source}: 'name', 'colors' and 'pieces' are required")
+        forward = {color: self._forward(color, spec) for color, spec in colors.items()}
+        
+        moves: Dict[str, Dict[str, List[MoveComponent]]] = {}
+        promotions: Dict[str, Tuple[str, Dict[str, int]]] = {}
+        values: Dict[str, int] = {}
+        for piece_type, spec in pieces.items():
+            value = spec.get("value", 100)
+            if not isinstance(value, int):
+                raise ValueError(f"{self.source}: value for {piece_type} must be an integer")
+            values[piece_type] = value
+            moves[piece_type] = {
+                color: [self._component(piece_type, move, direction) for move in spec.get("moves", [])]
+                for color, direction in forward.items()
+            }
+            if "promotion" in spec:
+                promotions[piece_type] = self._promotion(piece_type, spec["promotion"], forward, pieces)
+        
+        uids: Dict[str, Tuple[str, str]] = {}
+        for uid, (piece_type, color) in rules.get("uids", {}).items():
+            if piece_type not in pieces or color not in colors:
+                raise ValueError(f"{self.source}: uid {uid} has unknown type or color")
+            uids[uid] = (piece_type, color)
+        
+        return CompiledRules(name, uids, moves, promotions, values)
+    
+    def _forward(self, color: str, spec: Dict[str, Any]) -> int:
+        direction = spec.get("forward", -1)
+        if direction not in (-1, 1):
+            raise ValueError(f"{self.source}: forward for {color} must be -1 or 1")
+        return direction
+    
+    def _vectors(self, piece_type: str, move: Dict[str, Any], forward: int) -> List[Tuple[int, int]]:
+        vectors = move.get("vectors")
+        if isinstance(vectors, str):
+            if vectors not in NAMED_VECTORS:
+                raise ValueError(f"{self.source}: unknown vector set '{vectors}' for {piece_type}")
+            vectors = NAMED_VECTORS[vectors]
+        if not isinstance(vectors, list) or not vectors:
+            raise ValueError(f"{self.source}: {piece_type} move needs vectors")
+        
+        # Relative vectors are written for a piece moving up the board (forward = -1)
+        flip = -forward if move.get("relative") else 1
+        return [(int(d_row) * flip, int(d_col)) for d_row, d_col in vectors]
+    
+    def _component(self, piece_type: str, move: Dict[str, Any], forward: int) -> MoveComponent:
+        capture = move.get("capture", True)
+        if capture not in CAPTURE_MODES:
+            raise ValueError(f"{self.source}: capture for {piece_type} must be true, false or \"only\"")
+        vectors = self._vectors(piece_type, move, forward)
+        component = MoveComponent(CAPTURE_MODES[capture])
+        
+        slide = move.get("slide", False)
+        squares = range(self.rows * self.cols)
+        if slide is False:
+            component.leaps = [self._ray(sq, vectors, 1) for sq in squares]
+            return component
+        
+        unlimited = max(self.rows, self.cols)
+        distance = unlimited if slide is True else int(slide)
+        for vector in vectors:
+            beyond = [self._ray(sq, [vector], unlimited) for sq in squares]
+            ray = beyond if distance >= unlimited else [self._ray(sq, [vector], distance) for sq in squares]
+            ascending = vector[0] * self.cols + vector[1] > 0
+            component.rays.append((ascending, ray, beyond))
+        return component
+    
+    def _promotion(self, piece_type: str, spec: Dict[str, Any], forward: Dict[str, int],
+                   pieces: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        promoted = spec.get("to")
+        if promoted not in pieces:
+            raise ValueError(f"{self.source}: {piece_type} promotes to unknown type {promoted}")
+        zones: Dict[str, int] = {}
+        for color, direction in forward.items():
+            rows = spec.get("zone", "last_row")
+            if rows == "last_row":
+                rows = [0 if direction < 0 else self.rows - 1]
+            mask = 0
+            for row in rows:
+                for col in range(self.cols):
+                    mask |= 1 << (row * self.cols + col)
+            zones[color] = mask & self.named_mask
+        return promoted, zones
+    
+    def _ray(self, square: int, vectors: List[Tuple[int, int]], max_distance: int) -> int:
+        """Mask of squares reached by repeating each vector up to max_distance times"""
+        row, col = divmod(square, self.cols)
+        mask = 0
+        for d_row, d_col in vectors:
+            for distance in range(1, max_distance + 1):
+                to_row = row + d_row * distance
+                to_col = col + d_col * distance
+                if not (0 <= to_row < self.rows and 0 <= to_col < self.cols):
+                    break
+                mask |= 1 << (to_row * self.cols + to_col)
+        return mask & self.named_mask
+
+# Compiled rules by cache key, shared by every game in the process
+_compiled: Dict[str, CompiledRules] = {}
+
+def load_rules(path: str, board_config: BoardConfig) -> CompiledRules:
+    """Compiled rules for a rule file on a board layout, from memory, disk cache or compiler"""
+    with open(path, "rb") as rule_file:
+        source = rule_file.read()
+    layout = (RULES_FORMAT, tuple(board_config.size), tuple(sorted(board_config.position_mapping.items())))
+    key = hashlib.sha256(source + repr(layout).encode()).hexdigest()[:16]
+    
+    rules = _compiled.get(key)
+    if rules is not None:
+        return rules
+    
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(os.path.dirname(os.path.abspath(path)), "__rulecache__", f"{stem}.{key}.pickle")
+    try:
+        with open(cache_path, "rb") as cache_file:
+            rules = pickle.load(cache_file)
+    except Exception:
+        # Missing, truncated, or pickled by code that has changed since: unpickling can raise almost anything
+        rules = None
+    if not isinstance(rules, CompiledRules):
+        try:
+            parsed = json.loads(source)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}")
+        rules = RuleCompiler(board_config, source=path).compile(parsed)
+        _write_cache(cache_path, rules)
+    
+    _compiled[key] = rules
+    return rules
+
+def _write_cache(cache_path: str, rules: CompiledRules):
+    """Best effort: a read-only install just compiles on every start"""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as cache_file:
+            pickle.dump(rules, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass
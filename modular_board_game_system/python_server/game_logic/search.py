@@ -0,0 +1,327 @@
+"""Best-move search over any GameLogic, used for hints.
+
+Negamax alpha-beta with iterative deepening and a capture-only quiescence
+search at the leaves. Positions are identified by Zobrist keys that are
+updated from the squares a move changed (GameLogic.make_move journals
+them), and searched positions are remembered in a fixed-size
+transposition table. Moves are made and taken back on the GameLogic
+itself, so every game's own rules (check, forced captures, promotion)
+apply unchanged.
+
+The evaluation is material (GameLogic.piece_value) plus a small bonus for
+pieces near the center, from the point of view of the side to move.
+"""
+import dataclasses
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import PieceInfo
+from game_logic.base import GameLogic
+
+# (piece uid, from, to): plain data, so results can cross process boundaries
+Move = Tuple[str, str, str]
+
+MATE_SCORE = 1000000
+# Scores this close to MATE_SCORE are mates, stored relative to the node in the table
+MATE_BOUND = MATE_SCORE - 1000
+INFINITY = MATE_SCORE + 1
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class SearchTimeout(Exception):
+    """The deadline passed in the middle of a search"""
+
+@dataclasses.dataclass
+class SearchResult:
+    depth: int
+    score: int
+    move: Move
+    nodes: int
+
+class ZobristKeys:
+    """Random 64-bit keys per (piece type, color) and square, and per side to move.
+    
+    Piece types are whatever the game uses, so keys are drawn the first time
+    a type is seen, from a seeded generator.
+    """
+    
+    def __init__(self, squares: int, seed: int = 0x5EED):
+        self.squares = squares
+        self._random = random.Random(seed)
+        self._pieces: Dict[Tuple[str, str], List[int]] = {}
+        self._sides: Dict[str, int] = {}
+    
+    def piece(self, kind: Tuple[str, str], square: int) -> int:
+        keys = self._pieces.get(kind)
+        if keys is None:
+            keys = self._pieces[kind] = [self._random.getrandbits(64) for _ in range(self.squares)]
+        return keys[square]
+    
+    def side(self, color: str) -> int:
+        key = self._sides.get(color)
+        if key is None:
+            key = self._sides[color] = self._random.getrandbits(64)
+        return key
+    
+    def position(self, game: GameLogic, color: str) -> int:
+        """Key of the whole board with color to move"""
+        key = self.side(color)
+        for square, piece in game.board_state.occupied():
+            key ^= self.piece((piece.piece_type, piece.color), square)
+        return key
+
+class TranspositionTable:
+    """Fixed number of slots, indexed by the low bits of the Zobrist key.
+    
+    Each slot holds (key, depth, score, flag, move, generation). A slot is
+    only overwritten by a result searched at least as deep, unless its entry
+    was stored by an earlier search (new_search() starts a generation), so
+    deep results survive within a search and stale ones age out between them.
+    """
+    
+    def __init__(self, size: int = 1 << 16):
+        self.size = 1 << max(size - 1, 1).bit_length()
+        self.mask = self.size - 1
+        self.slots: List[Optional[Tuple[int, int, int, int, Optional[Move], int]]] = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+        self.rejected = 0
+    
+    def new_search(self):
+        self.generation += 1
+    
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, int, Optional[Move], int]]:
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+    
+    def store(self, key: int, depth: int, score: int, flag: int, move: Optional[Move]):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is not None and entry[5] == self.generation and entry[1] > depth:
+            self.rejected += 1
+            return
+        self.slots[index] = (key, depth, score, flag, move, self.generation)
+        self.stores += 1
+
+class SearchEngine:
+    """Iterative deepening alpha-beta search on a GameLogic"""
+    
+    def __init__(self, game: GameLogic, table_size: int = 1 << 16, quiescence_depth: int = 4):
+        self.game = game
+        self.keys = ZobristKeys(game.tables.rows * game.tables.cols)
+        self.table = TranspositionTable(table_size)
+        self.quiescence_depth = quiescence_depth
+        self.nodes = 0
+        self.deadline = 0.0
+        self._colors: List[str] = []
+        
+        # Center bonus per square: distance from the edges, row plus column
+        rows, cols = game.tables.rows, game.tables.cols
+        self._center = [min(row, rows - 1 - row) + min(col, cols - 1 - col)
+                        for row in range(rows) for col in range(cols)]
+    
+    def search(self, color: str, deadline: float, max_depth: int = 64,
+               root_moves: Optional[Sequence[Move]] = None) -> List[SearchResult]:
+        """Search for color until time.time() passes deadline.
+        
+        Returns one result per completed depth, deepest last (empty if there
+        is no legal move or not even depth 1 finished). root_moves limits the
+        moves tried at the root, for splitting a search between processes.
+        """
+        self.deadline = deadline
+        self.nodes = 0
+        self._colors = self.game.colors()
+        self.table.new_search()
+        
+        moves = self._named_moves(color)
+        if root_moves is not None:
+            allowed = set(root_moves)
+            moves = [move for move in moves if move[0] in allowed]
+        if not moves:
+            return []
+        
+        key = self.keys.position(self.game, color)
+        results: List[SearchResult] = []
+        best: Optional[Move] = None
+        try:
+            for depth in range(1, max_depth + 1):
+                score, best = self._root(moves, depth, color, key, best)
+                results.append(SearchResult(depth, score, best, self.nodes))
+                if abs(score) > MATE_BOUND:
+                    break
+        except SearchTimeout:
+            pass
+        return results
+    
+    def root_moves(self, color: str) -> List[Move]:
+        """The root moves in search order (captures first), for splitting between processes"""
+        self._colors = self.game.colors()
+        return [move for move, _ in self._named_moves(color)]
+    
+    def _named_moves(self, color: str) -> List[Tuple[Move, Tuple[PieceInfo, str, str]]]:
+        moves = self._ordered(self.game.legal_moves(color), None)
+        return [((piece.uid, from_pos, to_pos), (piece, from_pos, to_pos)) for piece, from_pos, to_pos in moves]
+    
+    def _root(self, moves: List[Tuple[Move, Tuple[PieceInfo, str, str]]], depth: int, color: str, key: int,
+              previous_best: Optional[Move]) -> Tuple[int, Move]:
+        # The previous iteration's best move is searched first
+        moves.sort(key=lambda move: move[0] != previous_best)
+        other = self._opponent(color)
+        alpha = -INFINITY
+        best = moves[0][0]
+        for name, (piece, from_pos, to_pos) in moves:
+            undo = self.game.make_move(piece, from_pos, to_pos)
+            try:
+                score = -self._negamax(depth - 1, -INFINITY, -alpha, other, 1, self._next_key(key, undo[0], color, other))
+            finally:
+                self.game.unmake_move(undo)
+            if score > alpha:
+                alpha, best = score, name
+        return alpha, best
+    
+    def _negamax(self, depth: int, alpha: int, beta: int, color: str, ply: int, key: int) -> int:
+        self._count_node()
+        if depth <= 0:
+            return self._quiescence(alpha, beta, color, 0)
+        
+        hash_move = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            hash_move = entry[4]
+            if entry[1] >= depth:
+                score = self._from_table(entry[2], ply)
+                flag = entry[3]
+                if flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha):
+                    return score
+        
+        moves = self.game.legal_moves(color)
+        if not moves:
+            return self.game.no_moves_result(color) * (MATE_SCORE - ply)
+        
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move: Optional[Move] = None
+        other = self._opponent(color)
+        for piece, from_pos, to_pos in self._ordered(moves, hash_move):
+            undo = self.game.make_move(piece, from_pos, to_pos)
+            try:
+                score = -self._negamax(depth - 1, -beta, -alpha, other, ply + 1,
+                                       self._next_key(key, undo[0], color, other))
+            finally:
+                self.game.unmake_move(undo)
+            if score > best_score:
+                best_score, best_move = score, (piece.uid, from_pos, to_pos)
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, self._to_table(best_score, ply), flag, best_move)
+        return best_score
+    
+    def _quiescence(self, alpha: int, beta: int, color: str, depth: int) -> int:
+        """Only captures are searched, until the position is quiet"""
+        self._count_node()
+        standing = self.evaluate(color)
+        if standing >= beta or depth >= self.quiescence_depth:
+            return standing
+        alpha = max(alpha, standing)
+        
+        captures = [move for move in self.game.legal_moves(color) if self.game.is_capture(*move)]
+        other = self._opponent(color)
+        for piece, from_pos, to_pos in self._ordered(captures, None):
+            undo = self.game.make_move(piece, from_pos, to_pos)
+            try:
+                score = -self._quiescence(-beta, -alpha, other, depth + 1)
+            finally:
+                self.game.unmake_move(undo)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+    
+    def evaluate(self, color: str) -> int:
+        """Material and centralization of color minus everyone else's"""
+        game = self.game
+        own = game.bitboard.color_mask(color)
+        score = 0
+        for piece_type, mask in game.bitboard.by_type.items():
+            if mask:
+                value = game.piece_value(piece_type)
+                score += value * (bin(mask & own).count("1") - bin(mask & ~own).count("1"))
+                if value:
+                    for square in game.tables.iter_squares(mask):
+                        score += self._center[square] * (2 if own >> square & 1 else -2)
+        return score
+    
+    def _ordered(self, moves: List[Tuple[PieceInfo, str, str]], hash_move: Optional[Move]) -> List[Tuple[PieceInfo, str, str]]:
+        """Hash move first, then captures of the most valuable piece by the least valuable one"""
+        game = self.game
+        
+        def priority(move: Tuple[PieceInfo, str, str]) -> int:
+            piece, from_pos, to_pos = move
+            if hash_move is not None and (piece.uid, from_pos, to_pos) == hash_move:
+                return -INFINITY
+            if not game.is_capture(piece, from_pos, to_pos):
+                return 0
+            victim = game.board_state.get(to_pos)
+            gain = game.piece_value(victim.piece_type) if victim else 100
+            return -(10 * gain - game.piece_value(piece.piece_type)) - 1
+        
+        return sorted(moves, key=priority)
+    
+    def _next_key(self, key: int, journal: list, color: str, other: str) -> int:
+        """Key after a move, from the squares it changed"""
+        game = self.game
+        seen = set()
+        for position, _, kind in journal:
+            # The first journal entry of a square has what stood there before the move
+            if position in seen:
+                continue
+            seen.add(position)
+            square = game.tables.square_index.get(position)
+            if square is None:
+                continue
+            if kind:
+                key ^= self.keys.piece(kind, square)
+            piece = game.board_state.at(square)
+            if piece:
+                key ^= self.keys.piece((piece.piece_type, piece.color), square)
+        return key ^ self.keys.side(color) ^ self.keys.side(other)
+    
+    def _opponent(self, color: str) -> str:
+        colors = self._colors
+        if color not in colors:
+            return color
+        return colors[(colors.index(color) + 1) % len(colors)]
+    
+    def _count_node(self):
+        self.nodes += 1
+        if not self.nodes & 255 and time.time() > self.deadline:
+            raise SearchTimeout()
+    
+    def _to_table(self, score: int, ply: int) -> int:
+        # Mate scores are stored as distance from this node, not from the root
+        if score > MATE_BOUND:
+            return score + ply
+        if score < -MATE_BOUND:
+            return score - ply
+        return score
+    
+    def _from_table(self, score: int, ply: int) -> int:
+        if score > MATE_BOUND:
+            return score - ply
+        if score < -MATE_BOUND:
+            return score + ply
+        return score
@@ -1,89 +1,277 @@
+import threading
+import time
 import pygame
-from typing import Dict, Tuple, List, Any, Optional
+from typing import Callable, Dict, Tuple, List, Any, Mapping, Optional, Iterable, Set
 from config import BoardConfig, PieceInfo
+from event_pipeline import BoardSnapshot
+from metrics import LatencyHistogram
 
 class BoardGUI:
-    """Graphical User Interface for the game board"""
-    
+    """Graphical User Interface for the game board.
+
+    Rendering is incremental: the update_* / set_message calls record which
+    squares changed, and render() only redraws and pushes those rectangles to
+    the display. When nothing changed the frame is skipped entirely.
+
+    Text is never rasterized per frame: square colors and coordinate labels
+    are baked into one static background surface, piece sprites are cached
+    per (type, color), and the message surface is rebuilt only when the
+    message text changes.
+    """
+
     def __init__(self, board_config: BoardConfig, title: str = "Modular Game Board"):
-        pygame.init()
+        # Only the subsystems the board needs; pygame.init() would also start audio, joysticks...
+        pygame.display.init()
+        pygame.font.init()
         self.board_config = board_config
         self.screen_width = self.board_config.size[1] * self.board_config.square_size
         self.screen_height = self.board_config.size[0] * self.board_config.square_size
         self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
         pygame.display.set_caption(title)
-        
+
         self.font = pygame.font.Font(None, 36)
-        self.board_state: Dict[str, Optional[PieceInfo]] = {}
+        self.board_state: Mapping[str, Optional[PieceInfo]] = {}
         self.highlights: Dict[str, List[str]] = {}
         self.message: str = ""
-        
-    def update_board_state(self, new_state: Dict[str, Optional[PieceInfo]]):
+        self._snapshot_version = 0
+        # Called when the H key is pressed
+        self.on_hint_requested: Optional[Callable[[], None]] = None
+
+        # What is currently on screen, per square, so updates can be diffed
+        self._drawn_pieces: Dict[str, Tuple[str, str]] = {}
+        self._drawn_highlights: Dict[str, Tuple[int, int, int]] = {}
+        self._message_rect: Optional[pygame.Rect] = None
+        self._message_surface: Optional[pygame.Surface] = None
+
+        # Pre-rendered surfaces
+        self._background: Optional[pygame.Surface] = None
+        self._piece_sprites: Dict[Tuple[str, str], pygame.Surface] = {}
+        self._build_background()
+
+        # Updates arrive from the serial thread, rendering happens on the main thread
+        self._dirty_lock = threading.Lock()
+        self._dirty_squares: Set[str] = set()
+        self._message_changed = True
+        self._full_redraw = True
+
+        # Time to apply a new snapshot, and to draw a frame that was not skipped
+        self.update_latency = LatencyHistogram()
+        self.render_latency = LatencyHistogram()
+
+    def update_board_state(self, new_state: Mapping[str, Optional[PieceInfo]]):
         self.board_state = new_state
-        
+        drawn = {
+            piece.position: (piece.piece_type, piece.color)
+            for piece in new_state.values() if piece and piece.position
+        }
+        changed = [
+            position for position in drawn.keys() | self._drawn_pieces.keys()
+            if drawn.get(position) != self._drawn_pieces.get(position)
+        ]
+        self._drawn_pieces = drawn
+        self._mark_dirty(changed)
+
     def update_highlights(self, new_highlights: Dict[str, List[str]]):
         if 'clear' in new_highlights and new_highlights['clear']:
-            self.highlights = {}
+            self.set_highlights({})
         else:
-            self.highlights.update(new_highlights)
-            
+            self.set_highlights({**self.highlights, **new_highlights})
+
+    def set_highlights(self, highlights: Dict[str, List[str]]):
+        """Replace all highlights"""
+        self.highlights = dict(highlights)
+        drawn = self._highlight_colors()
+        changed = [
+            position for position in drawn.keys() | self._drawn_highlights.keys()
+            if drawn.get(position) != self._drawn_highlights.get(position)
+        ]
+        self._drawn_highlights = drawn
+        self._mark_dirty(changed)
+
     def set_message(self, message: str):
+        if message == self.message:
+            return
         self.message = message
+        # The surface is re-rendered on the render thread, fonts are not thread safe
+        with self._dirty_lock:
+            self._message_changed = True
+
+    def apply_snapshot(self, snapshot: BoardSnapshot):
+        """Show a snapshot published by the event pipeline (no-op if already shown)"""
+        if snapshot.version == self._snapshot_version:
+            return
+        started = time.perf_counter()
+        self._snapshot_version = snapshot.version
+        self.set_message(snapshot.message)
+        self.set_highlights(snapshot.highlights)
+        self.update_board_state(snapshot.board_state)
+        self.update_latency.record(time.perf_counter() - started)
+
+    def mark_all_dirty(self):
+        """Force a full redraw on the next frame"""
+        with self._dirty_lock:
+            self._full_redraw = True
+
+    def _build_background(self):
+        """Bake square colors and coordinate labels into one static surface"""
+        self._background = pygame.Surface((self.screen_width, self.screen_height))
+        self._background.fill((0, 0, 0))
+        for pos_name, (row, col) in self.board_config.position_mapping.items():
+            rect = self._square_rect(pos_name)
+            color = (200, 200, 200) if (row + col) % 2 == 0 else (100, 100, 100)
+            pygame.draw.rect(self._background, color, rect)
+
+            text_surface = self.font.render(pos_name, True, (255, 255, 255))
+            self._background.blit(text_surface, (rect.x + 5, rect.y + 5))
+
+        # Sprites depend on the square size
+        self._piece_sprites = {}
+
+    def _piece_sprite(self, piece_type: str, piece_color: str) -> pygame.Surface:
+        """Cached circle + letter sprite for a piece type and color"""
+        key = (piece_type, piece_color)
+        sprite = self._piece_sprites.get(key)
+        if sprite is None:
+            size = self.board_config.square_size
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            center = (size // 2, size // 2)
+
+            color = (255, 255, 255) if piece_color == "White" else (0, 0, 0)
+            pygame.draw.circle(sprite, color, center, size // 3)
+
+            text_surface = self.font.render(piece_type[0].upper(), True, (0, 255, 0) if piece_color == "White" else (255, 255, 255))
+            sprite.blit(text_surface, text_surface.get_rect(center=center))
+            self._piece_sprites[key] = sprite
+        return sprite
+
+    def _update_message_surface(self) -> List[str]:
+        """Re-render the message; returns the squares under the old and new text"""
+        old_rect = self._message_rect
+        self._message_surface = self.font.render(self.message, True, (255, 255, 0))
+        self._message_rect = self._message_surface.get_rect(topleft=(10, self.screen_height - 40))
+
+        # The message is drawn over the squares, so both text areas are repainted
+        squares = self._squares_in_rect(self._message_rect)
+        if old_rect:
+            squares += self._squares_in_rect(old_rect)
+        return squares
+
+    def _mark_dirty(self, positions: Iterable[str]):
+        with self._dirty_lock:
+            self._dirty_squares.update(positions)
+
+    def _highlight_colors(self) -> Dict[str, Tuple[int, int, int]]:
+        """Outline color per highlighted square (selected > hint > possible_moves > invalid)"""
+        colors: Dict[str, Tuple[int, int, int]] = {}
+        for category, color in (('invalid', (255, 0, 0)),
+                                ('possible_moves', (0, 0, 255)),
+                                ('hint', (255, 165, 0)),
+                                ('selected', (0, 255, 0))):
+            for position in self.highlights.get(category, []):
+                colors[position] = color
+        return colors
+
+    def _square_rect(self, pos_name: str) -> pygame.Rect:
+        row, col = self.board_config.position_mapping[pos_name]
+        size = self.board_config.square_size
+        return pygame.Rect(col * size, row * size, size, size)
+
+    def _squares_in_rect(self, rect: pygame.Rect) -> List[str]:
+        size = self.board_config.square_size
+        rows, cols = self.board_config.size
+        names = []
+        for row in range(max(rect.top // size, 0), min((rect.bottom - 1) // size + 1, rows)):
+            for col in range(max(rect.left // size, 0), min((rect.right - 1) // size + 1, cols)):
+                pos_name = self.board_config.square_names.get((row, col))
+                if pos_name:
+                    names.append(pos_name)
+        return names
+
+    def _draw_square(self, pos_name: str):
+        """Draw background, label and highlight of a single square"""
+        rect = self._square_rect(pos_name)
+        self.screen.blit(self._background, rect, rect)
+
+        # Draw highlights
+        highlight = self._drawn_highlights.get(pos_name)
+        if highlight:
+            pygame.draw.rect(self.screen, highlight, rect, 5)
+
+    def _draw_piece(self, pos_name: str):
+        drawn = self._drawn_pieces.get(pos_name)
+        if not drawn:
+            return
+        piece_type, piece_color = drawn
+        self.screen.blit(self._piece_sprite(piece_type, piece_color), self._square_rect(pos_name))
 
     def draw_board(self):
-        for row in range(self.board_config.size[0]):
-            for col in range(self.board_config.size[1]):
-                x = col * self.board_config.square_size
-                y = row * self.board_config.square_size
-                
-                color = (200, 200, 200) if (row + col) % 2 == 0 else (100, 100, 100)
-                pygame.draw.rect(self.screen, color, (x, y, self.board_config.square_size, self.board_config.square_size))
-                
-                # Draw position label
-                pos_name = next(key for key, val in self.board_config.position_mapping.items() if val == (row, col))
-                text_surface = self.font.render(pos_name, True, (255, 255, 255))
-                self.screen.blit(text_surface, (x + 5, y + 5))
-                
-                # Draw highlights
-                if 'selected' in self.highlights and pos_name in self.highlights['selected']:
-                    pygame.draw.rect(self.screen, (0, 255, 0), (x, y, self.board_config.square_size, self.board_config.square_size), 5)
-                elif 'possible_moves' in self.highlights and pos_name in self.highlights['possible_moves']:
-                    pygame.draw.rect(self.screen, (0, 0, 255), (x, y, self.board_config.square_size, self.board_config.square_size), 5)
-                elif 'invalid' in self.highlights and pos_name in self.highlights['invalid']:
-                    pygame.draw.rect(self.screen, (255, 0, 0), (x, y, self.board_config.square_size, self.board_config.square_size), 5)
+        self.screen.blit(self._background, (0, 0))
+        for pos_name in self._drawn_highlights:
+            if pos_name in self.board_config.position_mapping:
+                pygame.draw.rect(self.screen, self._drawn_highlights[pos_name], self._square_rect(pos_name), 5)
 
     def draw_pieces(self):
-        for position, piece in self.board_state.items():
-            if piece and piece.position:
-                row, col = self.board_config.position_mapping[piece.position]
-                x = col * self.board_config.square_size + self.board_config.square_size // 2
-                y = row * self.board_config.square_size + self.board_config.square_size // 2
-                
-                color = (255, 255, 255) if piece.color == "White" else (0, 0, 0)
-                pygame.draw.circle(self.screen, color, (x, y), self.board_config.square_size // 3)
-                
-                text_surface = self.font.render(piece.piece_type[0].upper(), True, (0, 255, 0) if piece.color == "White" else (255, 255, 255))
-                text_rect = text_surface.get_rect(center=(x, y))
-                self.screen.blit(text_surface, text_rect)
+        for pos_name in list(self._drawn_pieces):
+            self._draw_piece(pos_name)
 
     def draw_message(self):
-        text_surface = self.font.render(self.message, True, (255, 255, 0))
-        self.screen.blit(text_surface, (10, self.screen_height - 40))
+        if self._message_surface:
+            self.screen.blit(self._message_surface, self._message_rect)
+
+    def needs_render(self) -> bool:
+        """True if the next render() would draw anything"""
+        with self._dirty_lock:
+            return self._full_redraw or bool(self._dirty_squares) or self._message_changed
 
-    def render(self):
-        self.screen.fill((0, 0, 0)) # Clear screen
-        self.draw_board()
-        self.draw_pieces()
-        self.draw_message()
-        pygame.display.flip()
+    def render(self) -> bool:
+        """Redraw what changed since the last frame. Returns False if the frame was skipped"""
+        started = time.perf_counter()
+        drawn = self._draw_frame()
+        if drawn:
+            self.render_latency.record(time.perf_counter() - started)
+        return drawn
+
+    def _draw_frame(self) -> bool:
+        with self._dirty_lock:
+            if not self._full_redraw and not self._dirty_squares and not self._message_changed:
+                return False
+            full_redraw, self._full_redraw = self._full_redraw, False
+            message_changed, self._message_changed = self._message_changed, False
+            dirty, self._dirty_squares = self._dirty_squares, set()
+
+        if message_changed:
+            dirty.update(self._update_message_surface())
+
+        if full_redraw:
+            self.draw_board()
+            self.draw_pieces()
+            self.draw_message()
+            pygame.display.flip()
+            return True
+
+        rects = []
+        for pos_name in dirty:
+            if pos_name not in self.board_config.position_mapping:
+                continue
+            self._draw_square(pos_name)
+            self._draw_piece(pos_name)
+            rects.append(self._square_rect(pos_name))
+
+        if self._message_rect and self._message_rect.collidelist(rects) != -1:
+            self.draw_message()
+
+        pygame.display.update(rects)
+        return True
 
     def handle_input(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 return False
+            elif event.type == pygame.VIDEOEXPOSE:
+                self.mark_all_dirty()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_h and self.on_hint_requested:
+                self.on_hint_requested()
         return True
 
     def quit(self):
         pygame.quit()
-
-
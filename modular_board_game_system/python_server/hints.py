@@ -0,0 +1,187 @@
+"""Move hints searched in a pool of worker processes.
+
+The root moves of the position are dealt out round-robin to the workers.
+Every worker runs its own iterative deepening search (game_logic.search) on
+its share, with a transposition table it keeps between requests, and
+reports the best move of each depth it completed. The deepest depth that
+all reporting workers completed decides the hint.
+
+Each request has a hard time budget: the workers stop searching a little
+before the deadline so their results can travel back, and whatever has not
+arrived by the deadline is left out. Searching happens outside the server
+process, so the render loop and the event pipeline are never starved of
+the interpreter while a hint is computed.
+"""
+import concurrent.futures
+import dataclasses
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import BoardConfig
+from event_pipeline import BoardSnapshot
+from game_logic.search import Move, SearchEngine, SearchResult
+
+@dataclasses.dataclass
+class Hint:
+    color: str
+    move: Move
+    score: int
+    depth: int
+    nodes: int
+    elapsed: float
+    
+    def highlights(self) -> Dict[str, List[str]]:
+        """The 'hint' highlight: the move's from and to squares"""
+        return {'hint': [self.move[1], self.move[2]]}
+    
+    def message(self) -> str:
+        return f'Hint for {self.color}: {self.move[1]} to {self.move[2]}'
+
+def state_from_snapshot(snapshot: BoardSnapshot) -> Dict[str, Any]:
+    """export_state() data for the pieces on the board in a snapshot"""
+    board = {
+        position: [piece.uid, piece.piece_type, piece.color, position]
+        for position, piece in snapshot.board_state.items() if piece
+    }
+    return {'pieces': list(board.values()), 'board': board}
+
+# Worker side: one engine per game and board layout, kept between requests
+_engines: Dict[Tuple[Any, ...], SearchEngine] = {}
+
+def _engine(layout: Tuple[Any, ...], table_size: int) -> SearchEngine:
+    engine = _engines.get(layout)
+    if engine is None:
+        from game_logic.registry import create_game_logic
+        game_type, size, mapping = layout
+        game_logic = create_game_logic(game_type, BoardConfig(size, dict(mapping)))
+        engine = _engines[layout] = SearchEngine(game_logic, table_size)
+    return engine
+
+def _warm_up(layout: Tuple[Any, ...], table_size: int) -> int:
+    _engine(layout, table_size)
+    return os.getpid()
+
+def search_share(layout: Tuple[Any, ...], table_size: int, state: Dict[str, Any], color: str,
+                 index: int, count: int, deadline: float) -> Tuple[int, List[SearchResult]]:
+    """Search the index-th of count shares of the root moves. Returns (share size, results per depth)"""
+    engine = _engine(layout, table_size)
+    engine.game.load_state(state)
+    share = engine.root_moves(color)[index::count]
+    if not share:
+        return 0, []
+    return len(share), engine.search(color, deadline, root_moves=share)
+
+class HintService:
+    """Answers hint requests within budget seconds.
+    
+    With processes=0 the search runs on the calling thread instead of a
+    process pool (it then competes with the render loop for the GIL).
+    """
+    
+    def __init__(self, game_type: str, board_config: BoardConfig, budget: float = 0.3,
+                 processes: Optional[int] = None, table_size: int = 1 << 16):
+        # Everything a worker needs to rebuild the game; BoardConfig itself holds unpicklable views
+        self.layout = (game_type, tuple(board_config.size), tuple(sorted(board_config.position_mapping.items())))
+        self.budget = budget
+        self.processes = max(1, (os.cpu_count() or 2) - 1) if processes is None else processes
+        self.table_size = table_size
+        
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        # Requests are searched one at a time; a newer request supersedes a waiting one
+        self._requests = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._latest = 0
+        self._lock = threading.Lock()
+        
+        self.requested = 0
+        self.answered = 0
+        self.superseded = 0
+        self.late_workers = 0
+        self.incomplete = 0
+    
+    def start(self):
+        if self.processes:
+            # spawn: the server has threads (and maybe pygame) that must not be forked
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context("spawn"))
+            # Start the workers and build their games now instead of on the first request
+            for _ in range(self.processes):
+                self._pool.submit(_warm_up, self.layout, self.table_size)
+    
+    def stop(self):
+        self._requests.shutdown(wait=False, cancel_futures=True)
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def request(self, state: Dict[str, Any], color: str, on_hint: Callable[[Optional[Hint]], None]):
+        """Search in the background and call on_hint (from a helper thread) with the result"""
+        with self._lock:
+            self.requested += 1
+            self._latest += 1
+            number = self._latest
+        
+        def run():
+            if number != self._latest:
+                self.superseded += 1
+                return
+            on_hint(self.suggest(state, color))
+        
+        self._requests.submit(run)
+    
+    def suggest(self, state: Dict[str, Any], color: str) -> Optional[Hint]:
+        """Best move for color in a position (export_state() data), or None; returns within the budget.
+        
+        None also means the budget was too short for every root move to be
+        searched to depth 1.
+        """
+        started = time.time()
+        deadline = started + self.budget
+        # Leave the workers time to send their results back
+        search_deadline = deadline - min(0.05, self.budget / 5)
+        
+        if self._pool is None:
+            count = 1
+            shares = [search_share(self.layout, self.table_size, state, color, 0, 1, search_deadline)]
+        else:
+            count = self.processes
+            futures = [
+                self._pool.submit(search_share, self.layout, self.table_size, state, color,
+                                  index, self.processes, search_deadline)
+                for index in range(self.processes)
+            ]
+            done, late = concurrent.futures.wait(futures, timeout=max(0.0, deadline - time.time()))
+            for future in late:
+                future.cancel()
+            self.late_workers += len(late)
+            shares = [future.result() for future in done if future.exception() is None]
+        
+        # A share that is missing, or did not finish depth 1, leaves its root moves unsearched,
+        # and the best of the other moves may be far worse than one of those
+        if len(shares) < count or any(size and not results for size, results in shares):
+            self.incomplete += 1
+            return None
+        hint = self._combine(color, [results for size, results in shares if results], started)
+        if hint:
+            self.answered += 1
+        return hint
+    
+    def _combine(self, color: str, shares: List[List[SearchResult]], started: float) -> Optional[Hint]:
+        if not shares:
+            return None
+        # Scores are only comparable at the same depth
+        depth = min(len(results) for results in shares)
+        best = max((results[depth - 1] for results in shares), key=lambda result: result.score)
+        nodes = sum(results[-1].nodes for results in shares)
+        return Hint(color, best.move, best.score, depth, nodes, time.time() - started)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hints_requested": self.requested,
+            "hints_answered": self.answered,
+            "hints_superseded": self.superseded,
+            "hint_late_workers": self.late_workers,
+            "hints_incomplete": self.incomplete,
+        }
@@ -0,0 +1,64 @@
+"""Leveled, rate-limited logging for the server.
+
+Modules log through logging.getLogger(__name__); per-message detail such
+as every received line goes to DEBUG, which costs next to nothing while
+the level is INFO. configure() installs one stderr handler whose
+RateLimitFilter lets each call site log at most burst records per
+interval seconds, so a flood (a wrong baud rate, a reader spewing errors)
+cannot slow the event path down; what was suppressed is counted in the
+next record from the same call site. DEBUG records are never limited:
+whoever turns DEBUG on wants to see every line.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Tuple
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+class RateLimitFilter(logging.Filter):
+    """At most burst records per call site (logger and line) every interval seconds, from min_level up"""
+    
+    def __init__(self, burst: int = 10, interval: float = 1.0, min_level: int = logging.INFO):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.min_level = min_level
+        # (logger, line) -> [window start, records let through, records suppressed]
+        self._sites: Dict[Tuple[str, int], List[float]] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level:
+            return True
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.interval:
+                missed = int(site[2]) if site else 0
+                self._sites[key] = [now, 1, 0]
+                if missed:
+                    record.msg = f"{record.msg} [{missed} similar messages suppressed]"
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            self.suppressed += 1
+            return False
+
+def configure(level: str = "info", burst: int = 10, interval: float = 1.0) -> RateLimitFilter:
+    """Log to stderr at level (debug, info, warning, error), rate limited per call site"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    rate_limit = RateLimitFilter(burst, interval)
+    handler.addFilter(rate_limit)
+    
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    return rate_limit
@@ -1,121 +1,554 @@
-import sys
 import time
+_MODULE_STARTED = time.perf_counter()
+
+import argparse
+import logging
+import os
+import signal
+import sys
 import json
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Callable, Dict, Any, List, Optional, Tuple, Union
 
+from command_channel import Command
 from config import BoardConfig, GameEvent, GameEventData, PieceInfo
 from serial_communication import SerialCommunication
-from gui import BoardGUI
+from event_pipeline import EventPipeline
 from game_logic.base import GameLogic
-from game_logic.chess import ChessLogic
-from game_logic.checkers import CheckersLogic
+from game_logic.registry import create_game_logic
+from metrics import LatencyHistogram, Metrics, SamplingProfiler
+
+# Everything else (pygame, asyncio, the game modules, the event log) is
+# imported only by the modes and games that use it, to keep startup short
+if TYPE_CHECKING:
+    from board_profile import BoardConfigurator, BoardProfile
+    from debounce import EventDebouncer
+    from event_log import EventLogWriter
+    from hints import Hint, HintService
+    from metrics import MetricsDumper, MetricsServer
+    from scan_scheduler import ScanScheduler
+    from spectator import SpectatorServer
+
+log = logging.getLogger(__name__)
+
+class StartupProfile:
+    """Time spent in each startup phase, printed with --profile-startup"""
+    
+    def __init__(self, started: float):
+        self.started = started
+        self.last = started
+        self.phases: List[Tuple[str, float]] = []
+    
+    def mark(self, phase: str):
+        """Close the phase that ends now"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+    
+    def report(self):
+        for phase, seconds in self.phases:
+            print(f"  {phase:<20} {seconds * 1000:8.1f} ms")
+        print(f"  {'total':<20} {(self.last - self.started) * 1000:8.1f} ms")
+
+def load_board_profile(board_size: str) -> Optional["BoardProfile"]:
+    """The board profile a board size argument names, None for a plain size"""
+    if not board_size.endswith(".json"):
+        return None
+    from board_profile import BoardProfile
+    return BoardProfile.load(board_size)
+
+def create_board_config(board_size: str) -> BoardConfig:
+    """Board configuration for a board size name or a board profile file"""
+    profile = load_board_profile(board_size)
+    if profile:
+        return profile.board_config()
+    if board_size == "4x4":
+        return BoardConfig.create_4x4_config()
+    elif board_size == "8x8":
+        return BoardConfig.create_8x8_config()
+    raise ValueError("Unsupported board size. Choose '4x4' or '8x8'.")
+
+# Event keyword -> (event type, number of ':'-separated fields)
+EVENT_FORMATS = {
+    "PLACE": (GameEvent.PIECE_PLACED, 3),
+    "LIFT": (GameEvent.PIECE_LIFTED, 3),
+    "MOVE": (GameEvent.PIECE_MOVED, 4),
+}
+
+def parse_message(message: str) -> Optional[GameEventData]:
+    """Turn one line from the Arduino into a game event (None if it is not one).
+    
+    Boot and status lines ("Initializing RFID readers...") are not events.
+    """
+    parts = message.split(":")
+    event_format = EVENT_FORMATS.get(parts[0])
+    if event_format is None:
+        return None
+    event_type, fields = event_format
+    if len(parts) < fields:
+        log.warning("Truncated event from the Arduino: %r", message)
+        return None
+    
+    if event_type == GameEvent.PIECE_MOVED:
+        return GameEventData(event_type, parts[1], parts[3], parts[2])
+    return GameEventData(event_type, parts[1], parts[2])
 
 class GameSystem:
     """Main class for the modular game board system"""
     
-    def __init__(self, serial_port: str, board_size: str = "4x4", game_type: str = "chess"):
+    def __init__(self, serial_port: str, board_size: str = "4x4", game_type: str = "chess", protocol: str = "text",
+                 event_log_path: Optional[str] = None, headless: bool = False,
+                 spectator_port: Optional[int] = None, profile: Optional[StartupProfile] = None,
+                 hint_budget: Optional[float] = None, debounce: Optional[float] = None,
+                 metrics_port: Optional[int] = None, metrics_file: Optional[str] = None,
+                 scan_schedule: bool = False):
         self.serial_port = serial_port
+        self.profile = profile
+        self._first_event_seen = False
         
-        if board_size == "4x4":
-            self.board_config = BoardConfig.create_4x4_config()
-        elif board_size == "8x8":
-            self.board_config = BoardConfig.create_8x8_config()
-        else:
-            raise ValueError("Unsupported board size. Choose '4x4' or '8x8'.")
-
-        if game_type.lower() == "chess":
-            self.game_logic: GameLogic = ChessLogic(self.board_config)
-        elif game_type.lower() == "checkers":
-            self.game_logic: GameLogic = CheckersLogic(self.board_config)
-        else:
-            raise ValueError("Unsupported game type. Choose 'chess' or 'checkers'.")
-
-        self.serial_comm = SerialCommunication(self.serial_port)
-        self.serial_comm.set_message_callback(self._handle_serial_message)
+        # A board profile also says which reader is under which square
+        self.board_profile = load_board_profile(board_size)
+        self.board_config = self.board_profile.board_config() if self.board_profile else create_board_config(board_size)
+        reader_positions = self.board_profile.reader_positions() if self.board_profile else None
         
-        self.gui = BoardGUI(self.board_config, title=f"Modular Board - {self.game_logic.get_game_name()}")
+        self.game_logic: GameLogic = create_game_logic(game_type, self.board_config)
         
-        self.current_board_state: Dict[str, Optional[PieceInfo]] = {}
         self.pieces = self.game_logic.initialize_pieces()
+        self._mark("game logic")
         
-        print(f"Initialized {self.game_logic.get_game_name()} on a {board_size} board.")
-
-    def _handle_serial_message(self, message: str):
-        """Callback for messages received from Arduino"""
-        print(f"Received from Arduino: {message}")
+        # Resume the session recorded in the event log, then keep appending to it
+        self.event_log: Optional["EventLogWriter"] = None
+        if event_log_path:
+            from event_log import EventLogReader, EventLogWriter
+            if os.path.exists(event_log_path):
+                reader = EventLogReader(event_log_path, self.board_config)
+                resumed = reader.seek_to(self.game_logic)
+                reader.close()
+                log.info("Resumed %d events from %s", resumed, event_log_path)
+            self.event_log = EventLogWriter(event_log_path, self.board_config)
+            self._mark("event log")
         
-        try:
-            parts = message.split(":")
-            event_type_str = parts[0]
-            piece_uid = parts[1]
-            
-            event_type = None
-            if event_type_str == "PLACE":
-                event_type = GameEvent.PIECE_PLACED
-                position = parts[2]
-                event_data = GameEventData(event_type, piece_uid, position)
-            elif event_type_str == "LIFT":
-                event_type = GameEvent.PIECE_LIFTED
-                position = parts[2]
-                event_data = GameEventData(event_type, piece_uid, position)
-            elif event_type_str == "MOVE":
-                event_type = GameEvent.PIECE_MOVED
-                from_position = parts[2]
-                to_position = parts[3]
-                event_data = GameEventData(event_type, piece_uid, to_position, from_position)
-            else:
-                print(f"Unknown event type: {event_type_str}")
-                return
+        # Tag flicker (LIFT x, MOVE x->x) is filtered out within debounce seconds
+        debouncer: Optional["EventDebouncer"] = None
+        if debounce:
+            from debounce import EventDebouncer
+            debouncer = EventDebouncer(debounce)
+        
+        # Serial thread -> event queue -> worker thread -> snapshots -> render loop
+        self.pipeline = EventPipeline(self.game_logic, on_response=self._handle_response,
+                                      event_log=self.event_log, debouncer=debouncer,
+                                      on_overflow=lambda: self.send_command("CONFIG_TAGS", self._on_tags_done))
+        
+        # Without a profile, binary mode asks the board which reader is under which square
+        self.serial_comm = SerialCommunication(self.serial_port, protocol=protocol,
+                                               reader_positions=reader_positions)
+        self.serial_comm.set_batch_callback(self._handle_serial_batch)
+        # Where outgoing commands go; run_async() routes them through its write queue
+        self.send_command = self.serial_comm.send_command
+        
+        # Readers near the action are scanned more often than the rest
+        self.scheduler: Optional["ScanScheduler"] = None
+        if scan_schedule:
+            from scan_scheduler import ScanScheduler
+            self.scheduler = ScanScheduler(self.board_config, self.game_logic,
+                                           send=lambda command: self.send_command(command),
+                                           reader_positions=reader_positions)
+        
+        # The board's reader table is brought in line with the profile once connected
+        self.configurator: Optional["BoardConfigurator"] = None
+        if self.board_profile:
+            from board_profile import BoardConfigurator, ProfileCache
             
-            response = self.game_logic.handle_event(event_data)
-            self.gui.set_message(response.get("message", ""))
-            self.gui.update_highlights(response.get("highlights", {}))
-            self.gui.update_board_state(self.game_logic.board_state)
+            def send_config(command: str, on_done: Callable, timeout: Optional[float] = None):
+                self.send_command(command, on_done, timeout)
             
-            # Send feedback to Arduino if needed (e.g., invalid move indication)
-            if not response.get("valid", True):
-                self.serial_comm.send_command("INVALID_MOVE") # Example command
-                
-        except Exception as e:
-            print(f"Error processing serial message: {e}")
-
+            self.configurator = BoardConfigurator(self.board_profile, send=send_config,
+                                                  cache=ProfileCache.beside(board_size), name=serial_port)
+            # Not before the board has booted: a board that resets on open would miss it
+            self.serial_comm.add_ready_callback(self.configurator.start)
+        
+        # Headless servers never import pygame
+        self.gui = None
+        if not headless:
+            from gui import BoardGUI
+            self.gui = BoardGUI(self.board_config, title=f"Modular Board - {self.game_logic.get_game_name()}")
+            self._mark("gui")
+        
+        self.spectators: Optional["SpectatorServer"] = None
+        if spectator_port is not None:
+            from spectator import SpectatorServer
+            self.spectators = SpectatorServer(port=spectator_port, snapshot=self.pipeline.latest_snapshot())
+            self.pipeline.on_snapshot = self.spectators.publish
+        
+        # Move hints are searched in worker processes, answered within hint_budget seconds
+        self.hints: Optional["HintService"] = None
+        self._last_mover: Optional[str] = None
+        if hint_budget is not None:
+            from hints import HintService
+            self.hints = HintService(game_type, self.board_config, budget=hint_budget)
+            self.hints.start()
+            if self.gui:
+                self.gui.on_hint_requested = self.request_hint
+            self._mark("hints")
+        
+        self.current_board_state: Dict[str, Optional[PieceInfo]] = {}
+        
+        self._setup_metrics(metrics_port, metrics_file)
+        
+        log.info("Initialized %s on a %s board.", self.game_logic.get_game_name(),
+                 self.board_profile.name if self.board_profile else board_size)
+    
+    def _setup_metrics(self, metrics_port: Optional[int], metrics_file: Optional[str]):
+        """Register every stage timer and counter; export them if asked to"""
+        self.parse_errors = 0
+        # Parsing and queueing one serial batch
+        self.parse_latency = LatencyHistogram()
+        self.profiler = SamplingProfiler()
+        
+        self.metrics = Metrics()
+        self.metrics.add_stage("serial_read", self.serial_comm.read_latency)
+        self.metrics.add_stage("serial_dispatch", self.serial_comm.latency)
+        self.metrics.add_stage("parse", self.parse_latency)
+        self.metrics.add_stage("handle_event", self.pipeline.handle_latency)
+        for command, rtt in self.serial_comm.commands.rtt_by_kind.items():
+            self.metrics.add_stage("command_rtt", rtt, command=command)
+        self.metrics.add_collector(self.serial_comm.stats)
+        self.metrics.add_collector(self.pipeline.stats)
+        self.metrics.add_collector(lambda: {"parse_errors": self.parse_errors})
+        if self.gui:
+            self.metrics.add_stage("gui_update", self.gui.update_latency)
+            self.metrics.add_stage("render", self.gui.render_latency)
+        if self.spectators:
+            self.metrics.add_collector(self.spectators.stats)
+        if self.hints:
+            self.metrics.add_collector(self.hints.stats)
+        if self.scheduler:
+            self.metrics.add_collector(self.scheduler.stats)
+        if self.configurator:
+            self.metrics.add_collector(self.configurator.stats)
+        
+        self.metrics_server: Optional["MetricsServer"] = None
+        self.metrics_dumper: Optional["MetricsDumper"] = None
+        if metrics_port is None and not metrics_file:
+            return
+        # Timing every move computation is only worth it when someone looks
+        self.game_logic.move_latency = LatencyHistogram()
+        self.metrics.add_stage("move_generation", self.game_logic.move_latency)
+        if metrics_port is not None:
+            from metrics import MetricsServer
+            self.metrics_server = MetricsServer(self.metrics, metrics_port, profiler=self.profiler)
+            self.metrics_server.start()
+            log.info("Metrics on http://%s:%s/metrics", self.metrics_server.host, self.metrics_server.port)
+        if metrics_file:
+            from metrics import MetricsDumper
+            self.metrics_dumper = MetricsDumper(self.metrics, metrics_file)
+            self.metrics_dumper.start()
+        self._mark("metrics")
+    
+    def toggle_profiler(self):
+        """Start the sampling profiler, or stop it and log where the time went"""
+        if self.profiler.toggle():
+            log.info("Sampling profiler started")
+            return
+        log.info("Sampling profiler stopped, busiest stacks:\n%s", self.profiler.report(20))
+    
+    def _stop_metrics(self):
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.metrics_dumper:
+            self.metrics_dumper.stop()
+    
+    def _mark(self, phase: str):
+        if self.profile:
+            self.profile.mark(phase)
+    
+    def _report_startup(self):
+        if self.profile:
+            self.profile.mark("serial open")
+            print("Startup profile:")
+            self.profile.report()
+    
+    def _handle_serial_message(self, message: str):
+        """Callback for messages received from Arduino"""
+        self._handle_serial_batch([message])
+    
+    def _handle_serial_batch(self, messages: List[Union[str, GameEventData]]):
+        """Parse a serial read on the reader thread and queue its events"""
+        if self.profile and not self._first_event_seen:
+            self._first_event_seen = True
+            print(f"First serial message {(time.perf_counter() - self.profile.started) * 1000:.1f} ms after start")
+        started = time.perf_counter()
+        for message in messages:
+            log.debug("Received from Arduino: %s", message)
+            if isinstance(message, str) and message.split(":")[0] == "HINT":
+                # HINT or HINT:<color>
+                self.request_hint(message.split(":")[1] if ":" in message else None)
+                continue
+            if isinstance(message, str) and message.startswith("SCAN:"):
+                if self.scheduler:
+                    self.scheduler.on_scan_report(message)
+                continue
+            if isinstance(message, str) and message.startswith(("TAG:", "TAGS_END:")):
+                self.pipeline.feed_tag_line(message)
+                continue
+            if isinstance(message, str) and message.startswith(("STATUS:", "CONFIG_")):
+                if self.configurator:
+                    self.configurator.on_message(message)
+                continue
+            try:
+                # Binary frames arrive already decoded
+                if isinstance(message, GameEventData):
+                    event_data = message
+                else:
+                    event_data = parse_message(message)
+                if event_data is not None:
+                    if self.scheduler:
+                        self.scheduler.observe(event_data)
+                    self.pipeline.submit(event_data)
+            except Exception as e:
+                self.parse_errors += 1
+                log.warning("Error processing serial message %r: %s", message, e)
+        self.parse_latency.record(time.perf_counter() - started)
+    
+    def _on_tags_done(self, command: Command, ok: bool):
+        if not ok:
+            self.pipeline.resync_failed()
+    
+    def _handle_response(self, event: GameEventData, response: Dict[str, Any]):
+        """Called on the pipeline worker for every applied event"""
+        # Send feedback to Arduino if needed (e.g., invalid move indication)
+        if not response.get("valid", True):
+            self.send_command("INVALID_MOVE") # Example command
+        elif event.event_type == GameEvent.PIECE_MOVED:
+            piece = self.game_logic.pieces.get(event.piece_uid)
+            if piece:
+                self._last_mover = piece.color
+        if self.scheduler:
+            self.scheduler.on_applied(event, response)
+    
+    def _side_to_move(self) -> Optional[str]:
+        """The color after the one that moved last (the first color before any move)"""
+        colors = self.game_logic.colors()
+        if not colors:
+            return None
+        if self._last_mover not in colors:
+            return colors[0]
+        return colors[(colors.index(self._last_mover) + 1) % len(colors)]
+    
+    def request_hint(self, color: Optional[str] = None):
+        """Search the current board for color's best move and highlight it when found"""
+        if self.hints is None:
+            log.warning("Hints are not enabled (start with --hints)")
+            return
+        color = color or self._side_to_move()
+        if color is None:
+            return
+        snapshot = self.pipeline.latest_snapshot()
+        from hints import state_from_snapshot
+        self.hints.request(state_from_snapshot(snapshot), color,
+                           lambda hint: self._show_hint(hint, color, snapshot.version))
+    
+    def _show_hint(self, hint: Optional["Hint"], color: str, version: int):
+        """Called on the hint thread; a hint for a board that has changed since is dropped"""
+        if hint is None:
+            self.pipeline.add_highlights({}, f"No hint for {color}", version)
+            return
+        log.info("%s (depth %d, %d nodes, %.0f ms)", hint.message(), hint.depth, hint.nodes, hint.elapsed * 1000)
+        self.pipeline.add_highlights(hint.highlights(), hint.message(), version)
+    
     def run(self):
         """Main loop for the game system"""
+        if self.gui is None or self.spectators:
+            # Headless and spectator modes live on the asyncio loop
+            import asyncio
+            asyncio.run(self.run_async())
+            return
+        
         if not self.serial_comm.start():
-            print("Failed to start serial communication. Exiting.")
+            log.error("Failed to start serial communication. Exiting.")
             return
+        self._report_startup()
+        
+        self.pipeline.start()
         
         running = True
         while running:
             running = self.gui.handle_input()
+            self.gui.apply_snapshot(self.pipeline.latest_snapshot())
             self.gui.render()
             time.sleep(0.01) # Small delay to reduce CPU usage
-            
+        
         self.serial_comm.stop()
+        self.pipeline.stop()
+        if self.scheduler:
+            self.scheduler.stop()
+        if self.hints:
+            self.hints.stop()
+        self._stop_metrics()
+        if self.event_log:
+            self.event_log.close()
         self.gui.quit()
-        print("Game system shut down.")
+        log.info("Game system shut down.")
+    
+    async def run_async(self, max_fps: float = 60.0, input_interval: float = 1 / 60):
+        """Main loop on asyncio: events are awaited, frames are drawn only when dirty"""
+        import asyncio
+        from async_serial import AsyncSerialLink
+        
+        loop = asyncio.get_running_loop()
+        link = AsyncSerialLink(self.serial_comm)
+        if not await link.start():
+            log.error("Failed to start serial communication. Exiting.")
+            return
+        self._report_startup()
+        self.send_command = link.send_command
+        if self.spectators:
+            await self.spectators.start()
+        
+        frame_interval = 1 / max_fps
+        frame_handle: Optional[asyncio.TimerHandle] = None
+        release_handle: Optional[asyncio.TimerHandle] = None
+        last_frame = 0.0
+        
+        def draw_frame():
+            nonlocal frame_handle, last_frame
+            frame_handle = None
+            last_frame = loop.time()
+            self.gui.render()
+        
+        def schedule_frame():
+            # At most one pending frame, and no more than max_fps of them
+            nonlocal frame_handle
+            if frame_handle is None:
+                delay = max(0.0, last_frame + frame_interval - loop.time())
+                frame_handle = loop.call_later(delay, draw_frame)
+        
+        def release_held():
+            nonlocal release_handle
+            release_handle = None
+            link.data_ready.set()
+        
+        async def apply_events():
+            nonlocal release_handle
+            while True:
+                await link.data_ready.wait()
+                link.data_ready.clear()
+                if self.pipeline.process_pending() and self.gui:
+                    self.gui.apply_snapshot(self.pipeline.latest_snapshot())
+                    schedule_frame()
+                # A LIFT held back by the debouncer is applied once its window ends
+                delay = self.pipeline.next_release()
+                if delay is not None and release_handle is None:
+                    release_handle = loop.call_later(delay, release_held)
+        
+        async def poll_input():
+            # pygame has no file descriptor to wait on, so input is still polled
+            while self.gui.handle_input():
+                # Hints are published from their own thread
+                self.gui.apply_snapshot(self.pipeline.latest_snapshot())
+                if self.gui.needs_render():
+                    schedule_frame()
+                await asyncio.sleep(input_interval)
+        
+        tasks = [loop.create_task(apply_events()), loop.create_task(link.closed.wait())]
+        if self.gui:
+            schedule_frame()
+            tasks.append(loop.create_task(poll_input()))
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if frame_handle:
+                frame_handle.cancel()
+            if release_handle:
+                release_handle.cancel()
+            
+            await link.close()
+            self.send_command = self.serial_comm.send_command
+            if self.scheduler:
+                self.scheduler.stop()
+            if self.spectators:
+                await self.spectators.stop()
+            if self.hints:
+                self.hints.stop()
+            self._stop_metrics()
+            if self.event_log:
+                self.event_log.close()
+            if self.gui:
+                self.gui.quit()
+            log.info("Game system shut down.")
 
 if __name__ == "__main__":
     # Example usage:
     # python main.py COM3 4x4 chess
     # python main.py /dev/ttyACM0 8x8 checkers
+    # python main.py /dev/ttyACM0 8x8 chess binary --log game.mgblog
+    # python main.py /dev/ttyACM0 8x8 chess --async
+    # python main.py /dev/ttyACM0 8x8 chess --headless --spectate 8765
+    # python main.py /dev/ttyACM0 8x8 chess --hints 500
+    # python main.py /dev/ttyACM0 8x8 chess --debounce 250
+    # python main.py /dev/ttyACM0 8x8 chess --metrics 9100 --log-level debug
+    # python main.py /dev/ttyACM0 8x8 chess --scan-schedule
+    # python main.py /dev/ttyACM0 profiles/club_8x8.json chess
     
-    if len(sys.argv) < 3:
-        print("Usage: python main.py <serial_port> <board_size> [game_type]")
-        sys.exit(1)
-        
-    serial_port = sys.argv[1]
-    board_size = sys.argv[2]
-    game_type = sys.argv[3] if len(sys.argv) > 3 else "chess"
+    parser = argparse.ArgumentParser(description="Modular game board server")
+    parser.add_argument("serial_port")
+    parser.add_argument("board_size", help="4x4, 8x8 or a board profile (.json) to configure the board with")
+    parser.add_argument("game_type", nargs="?", default="chess", help="chess (default), checkers, a game from rules/ or a rule file path")
+    parser.add_argument("protocol", nargs="?", default="text", help="text (default) or binary")
+    parser.add_argument("--log", dest="event_log", help="event log file; an existing log is resumed")
+    parser.add_argument("--async", dest="use_asyncio", action="store_true",
+                        help="run serial I/O, game events and rendering on an asyncio event loop")
+    parser.add_argument("--headless", action="store_true", help="run without the pygame window")
+    parser.add_argument("--spectate", type=int, metavar="PORT",
+                        help="stream board changes to spectators connecting to this TCP port")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each startup phase took and when the first event arrived")
+    parser.add_argument("--hints", type=int, nargs="?", const=300, metavar="MS",
+                        help="suggest moves (H key, or HINT from the board), each within MS milliseconds (default 300)")
+    parser.add_argument("--debounce", type=int, nargs="?", const=250, metavar="MS",
+                        help="filter out tag flicker: a LIFT put back within MS milliseconds (default 250) is ignored")
+    parser.add_argument("--metrics", type=int, metavar="PORT",
+                        help="serve stage timings and counters on http://127.0.0.1:PORT/metrics (Prometheus format)")
+    parser.add_argument("--metrics-file", metavar="PATH", help="write the metrics to PATH every 10 seconds")
+    parser.add_argument("--scan-schedule", action="store_true",
+                        help="scan the readers near the lifted piece and occupied squares more often")
+    parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"],
+                        help="debug also logs every message from the board")
+    args = parser.parse_args()
+    
+    from logging_config import configure
+    configure(args.log_level)
+    
+    profile = None
+    if args.profile_startup:
+        profile = StartupProfile(_MODULE_STARTED)
+        profile.mark("imports")
     
     try:
-        system = GameSystem(serial_port, board_size, game_type)
-        system.run()
+        system = GameSystem(args.serial_port, args.board_size, args.game_type, args.protocol,
+                            event_log_path=args.event_log, headless=args.headless,
+                            spectator_port=args.spectate, profile=profile,
+                            hint_budget=args.hints / 1000 if args.hints is not None else None,
+                            debounce=args.debounce / 1000 if args.debounce else None,
+                            metrics_port=args.metrics, metrics_file=args.metrics_file,
+                            scan_schedule=args.scan_schedule)
+        if hasattr(signal, "SIGUSR1"):
+            # kill -USR1 <pid> switches the sampling profiler on and off
+            signal.signal(signal.SIGUSR1, lambda signum, frame: system.toggle_profiler())
+        if args.use_asyncio:
+            import asyncio
+            asyncio.run(system.run_async())
+        else:
+            system.run()
+    except KeyboardInterrupt:
+        # Headless servers are stopped with Ctrl+C
+        pass
     except ValueError as e:
-        print(f"Configuration Error: {e}")
+        log.error("Configuration Error: %s", e)
         sys.exit(1)
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        log.exception("An unexpected error occurred: %s", e)
         sys.exit(1)
 
 
@@ -0,0 +1,303 @@
+"""Server metrics: per-stage timers and counters in Prometheus text format.
+
+Components keep their own counters (their stats() dicts) and a
+LatencyHistogram per hot-path stage, recorded without locks or
+allocation. Metrics only reads them when asked: render() produces the
+Prometheus text exposition format, which MetricsServer serves on
+http://127.0.0.1:<port>/metrics and MetricsDumper writes to a file every
+few seconds (for node_exporter's textfile collector, or just to look at).
+
+Stages timed by the server:
+
+    serial_read       framing/decoding the bytes of one read
+    parse             turning one batch of text lines into events
+    handle_event      GameLogic.handle_event for one event
+    command_rtt       writing a command to the board until it is acknowledged,
+                      labelled with the command
+    move_generation   computing one piece's moves on a move cache miss
+    gui_update        applying a snapshot to the GUI
+    render            drawing one frame
+
+Collector values are counters, exported as <prefix>_<key>_total, except
+the keys a component lists in its stats_gauges (levels such as queue
+depths), which are exported as gauges. Samples of the same metric from
+different collectors (one per board on a multi-board host) are rendered
+together under one TYPE line.
+
+SamplingProfiler records where every thread spends its time while it is
+switched on; MetricsServer toggles it on /profile/start and /profile/stop.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Callable, Counter, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+class LatencyHistogram:
+    """Power-of-two bucketed histogram of latencies in microseconds"""
+    
+    def __init__(self, num_buckets: int = 24):
+        self.buckets = [0] * num_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def record(self, seconds: float):
+        micros = max(int(seconds * 1_000_000), 0)
+        bucket = min(micros.bit_length(), len(self.buckets) - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+    
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram's samples (with the same number of buckets)"""
+        for bucket, bucket_count in enumerate(other.buckets):
+            self.buckets[bucket] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+    
+    def percentile(self, fraction: float) -> float:
+        """Upper bound (seconds) of the bucket containing the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= threshold:
+                return (1 << bucket) / 1_000_000
+        return self.max
+    
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in sorted(labels.items()))
+    return "{" + pairs + "}"
+
+class Metrics:
+    """Registry of the stage histograms and stats() collectors of one server"""
+    
+    def __init__(self, prefix: str = "mgb"):
+        self.prefix = prefix
+        self._stages: List[Tuple[str, Dict[str, str], LatencyHistogram]] = []
+        self._collectors: List[Tuple[Callable[[], Dict[str, float]], FrozenSet[str], Dict[str, str]]] = []
+        self.started = time.time()
+    
+    def add_stage(self, stage: str, histogram: LatencyHistogram, **labels: str):
+        """Export a component's histogram as <prefix>_stage_seconds{stage=...}"""
+        self._stages.append((stage, {"stage": stage, **labels}, histogram))
+    
+    def add_collector(self, collect: Callable[[], Dict[str, float]], gauges: Iterable[str] = (), **labels: str):
+        """Export every value of collect() (a stats() method) as a counter <prefix>_<key>_total.
+        
+        Keys in gauges, or in the stats_gauges of the object collect is a
+        method of, are exported as gauges <prefix>_<key> instead.
+        """
+        owner_gauges = getattr(getattr(collect, "__self__", None), "stats_gauges", ())
+        self._collectors.append((collect, frozenset(gauges) | frozenset(owner_gauges), labels))
+    
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        """Summary per stage, for printing"""
+        return {stage: histogram.summary() for stage, _, histogram in self._stages}
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = [f"# TYPE {self.prefix}_uptime_seconds gauge",
+                 f"{self.prefix}_uptime_seconds {time.time() - self.started:.3f}"]
+        
+        name = f"{self.prefix}_stage_seconds"
+        if self._stages:
+            lines.append(f"# TYPE {name} histogram")
+        for _, labels, histogram in self._stages:
+            # Copy first: the owning thread keeps recording meanwhile
+            buckets = list(histogram.buckets)
+            cumulative = 0
+            for bucket, bucket_count in enumerate(buckets[:-1]):
+                cumulative += bucket_count
+                bound = (1 << bucket) / 1_000_000
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': repr(bound)})} {cumulative}")
+            cumulative += buckets[-1]
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        
+        # Metric name -> (type, samples), in the order the names first appear
+        families: Dict[str, Tuple[str, List[str]]] = {}
+        for collect, gauges, labels in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                lines.append(f"# {collect!r} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (bool, int, float)):
+                    kind = "gauge" if key in gauges else "counter"
+                    name = f"{self.prefix}_{key}" if kind == "gauge" else f"{self.prefix}_{key}_total"
+                    family = families.setdefault(name, (kind, []))
+                    family[1].append(f"{name}{_labels(labels)} {float(value):g}")
+        for name, (kind, samples) in families.items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+class SamplingProfiler:
+    """Samples the stack of every thread at a fixed interval while running.
+    
+    Stacks are counted in the collapsed format flame graph tools read
+    ("outer;inner;innermost count"). Sampling costs nothing while stopped and
+    little while running, so it can be switched on in a live server.
+    """
+    
+    def __init__(self, interval: float = 0.005, max_depth: int = 48):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter[str] = collections.Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+    
+    def start(self, interval: Optional[float] = None):
+        if self.running:
+            return
+        if interval:
+            self.interval = interval
+        self.samples = collections.Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profiler")
+        self._thread.start()
+    
+    def stop(self) -> Counter[str]:
+        """Stop sampling and return the stack counts"""
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.samples
+    
+    def toggle(self) -> bool:
+        """Start if stopped, stop if running; returns whether it is running now"""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+        return self.running
+    
+    def report(self, limit: Optional[int] = None) -> str:
+        """Collapsed stacks, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common(limit))
+    
+    def _run(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+class MetricsServer:
+    """Serves /metrics, /profile/start and /profile/stop over HTTP on a background thread"""
+    
+    def __init__(self, metrics: Metrics, port: int, host: str = "127.0.0.1",
+                 profiler: Optional[SamplingProfiler] = None):
+        # http.server alone takes longer to import than the rest of the server
+        import http.server
+        from urllib.parse import parse_qs, urlparse
+        
+        self.metrics = metrics
+        self.profiler = profiler or SamplingProfiler()
+        server = self
+        
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    body = server.metrics.render()
+                elif url.path == "/profile/start":
+                    interval_ms = parse_qs(url.query).get("interval_ms")
+                    server.profiler.start(float(interval_ms[0]) / 1000 if interval_ms else None)
+                    body = "profiling\n"
+                elif url.path == "/profile/stop":
+                    server.profiler.stop()
+                    body = server.profiler.report()
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                # Scrapes are not worth a log line each
+                pass
+        
+        self._httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="metrics")
+        self._thread.start()
+    
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self.profiler.stop()
+
+class MetricsDumper:
+    """Rewrites a file with the current metrics every interval seconds"""
+    
+    def __init__(self, metrics: Metrics, path: str, interval: float = 10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="metrics-dump")
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+        self.dump()
+    
+    def dump(self):
+        # Readers never see a half-written file
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as dump_file:
+            dump_file.write(self.metrics.render())
+        os.replace(temporary, self.path)
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
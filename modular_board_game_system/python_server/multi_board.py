@@ -0,0 +1,321 @@
+"""Host many physical boards in one server process.
+
+All serial connections share a single selector-based I/O thread that only
+reads and frames bytes and queues the parsed events. Each board has its own
+GameLogic and EventPipeline. A small worker pool drains the pipelines, so a
+board with a slow or failing game never holds up reading from the others.
+A board whose connection fails is taken out of the loop and reconnected with
+backoff, and the other boards keep running.
+
+Snapshots from every board go to the observers registered with
+add_observer(), which is where renderers, spectator streams or loggers hook
+in. Every board's stage timers and counters are registered in the host's
+metrics with a board label.
+
+    python multi_board.py boards.json [--metrics PORT]
+
+boards.json lists the boards:
+
+    [{"name": "table1", "port": "/dev/ttyACM0", "board_size": "8x8",
+      "game_type": "chess", "protocol": "binary", "debounce_ms": 250}, ...]
+
+A board_size naming a board profile (.json) configures that board's
+readers whenever it connects (see board_profile.py).
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import queue
+import selectors
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import serial
+
+from board_profile import BoardConfigurator, BoardProfile, ProfileCache
+from command_channel import Command
+from config import BoardConfig, GameEventData
+from debounce import EventDebouncer
+from event_pipeline import BoardSnapshot, EventPipeline
+from game_logic.base import GameLogic
+from metrics import LatencyHistogram, Metrics
+from serial_communication import SerialCommunication
+
+log = logging.getLogger(__name__)
+
+@dataclasses.dataclass
+class BoardSpec:
+    """Where a board is connected and what is played on it"""
+    name: str
+    port: str
+    board_size: str = "8x8"
+    game_type: str = "chess"
+    protocol: str = "text"
+    # Tag flicker filter window, 0 for none
+    debounce_ms: int = 0
+
+class HostedBoard:
+    """One physical board: serial connection, game logic and event pipeline"""
+    
+    def __init__(self, spec: BoardSpec, board_config: BoardConfig, game_logic: GameLogic,
+                 serial_factory: Callable[..., Any], profile: Optional[BoardProfile] = None):
+        self.spec = spec
+        self.board_config = board_config
+        self.game_logic = game_logic
+        debouncer = EventDebouncer(spec.debounce_ms / 1000) if spec.debounce_ms else None
+        self.pipeline = EventPipeline(game_logic, on_response=self._handle_response, debouncer=debouncer,
+                                      on_overflow=lambda: self.serial_comm.send_command("CONFIG_TAGS", self._on_tags_done))
+        self.serial_comm = SerialCommunication(spec.port, protocol=spec.protocol,
+                                               reader_positions=profile.reader_positions() if profile else None,
+                                               serial_factory=serial_factory)
+        self.configurator: Optional[BoardConfigurator] = None
+        if profile:
+            self.configurator = BoardConfigurator(profile, send=self.serial_comm.send_command,
+                                                  cache=ProfileCache.beside(spec.board_size), name=spec.name)
+            # After every connection's boot banner: a reconnected board may have been rebooted or swapped
+            self.serial_comm.add_ready_callback(self.configurator.start)
+        self.connected = False
+        self.failures = 0
+        self.retry_at = 0.0
+        self.parse_errors = 0
+        self.parse_latency = LatencyHistogram()
+        self.fd: Optional[int] = None
+        # Closes a failed connection; the board reconnects only once it is done
+        self.teardown: Optional[threading.Thread] = None
+        # Guards `scheduled`, which is True while the board is queued for or
+        # being processed by a worker, so only one worker touches it at a time
+        self.scheduled = False
+        self.lock = threading.Lock()
+    
+    def tearing_down(self) -> bool:
+        return self.teardown is not None and self.teardown.is_alive()
+    
+    def _handle_response(self, event: GameEventData, response: Dict[str, Any]):
+        if not response.get("valid", True):
+            self.serial_comm.send_command("INVALID_MOVE")
+    
+    def _on_tags_done(self, command: Command, ok: bool):
+        if not ok:
+            self.pipeline.resync_failed()
+
+class MultiBoardHost:
+    """Runs N boards on one I/O thread plus a shared pool of game workers"""
+    
+    def __init__(self, specs: List[BoardSpec], workers: int = 4,
+                 serial_factory: Callable[..., Any] = serial.Serial,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        from main import create_board_config, create_game_logic, load_board_profile, parse_message
+        
+        self._parse_message = parse_message
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.boards: Dict[str, HostedBoard] = {}
+        self.metrics = Metrics()
+        for spec in specs:
+            if spec.name in self.boards:
+                raise ValueError(f"Duplicate board name: {spec.name}")
+            profile = load_board_profile(spec.board_size)
+            board_config = profile.board_config() if profile else create_board_config(spec.board_size)
+            game_logic = create_game_logic(spec.game_type, board_config)
+            game_logic.initialize_pieces()
+            board = HostedBoard(spec, board_config, game_logic, serial_factory, profile)
+            board.serial_comm.set_batch_callback(lambda messages, board=board: self._on_batch(board, messages))
+            # Only boards read on their own thread report here; the I/O loop sees the others fail
+            board.serial_comm.set_disconnect_callback(lambda board=board: self._fail(board))
+            board.pipeline.on_snapshot = lambda snapshot, board=board: self._notify(board, snapshot)
+            self.boards[spec.name] = board
+            self._register_metrics(board)
+        
+        self.num_workers = workers
+        self.observers: List[Callable[[str, BoardSnapshot], None]] = []
+        self._selector = selectors.DefaultSelector()
+        self._work: "queue.Queue[Optional[HostedBoard]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+    
+    def add_observer(self, observer: Callable[[str, BoardSnapshot], None]):
+        """observer(board_name, snapshot) is called after each processed batch"""
+        self.observers.append(observer)
+    
+    def start(self):
+        self._running = True
+        for board in self.boards.values():
+            self._connect(board)
+        self._threads.append(threading.Thread(target=self._io_loop, daemon=True))
+        for _ in range(self.num_workers):
+            self._threads.append(threading.Thread(target=self._worker, daemon=True))
+        for thread in self._threads:
+            thread.start()
+    
+    def stop(self):
+        self._running = False
+        for _ in range(self.num_workers):
+            self._work.put(None)
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for board in self.boards.values():
+            board.serial_comm.stop()
+        self._selector.close()
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "connected": board.connected,
+                "failures": board.failures,
+                "parse_errors": board.parse_errors,
+                **board.pipeline.stats(),
+            }
+            for name, board in self.boards.items()
+        }
+    
+    def _register_metrics(self, board: HostedBoard):
+        name = board.spec.name
+        self.metrics.add_stage("serial_read", board.serial_comm.read_latency, board=name)
+        self.metrics.add_stage("parse", board.parse_latency, board=name)
+        self.metrics.add_stage("handle_event", board.pipeline.handle_latency, board=name)
+        for command, rtt in board.serial_comm.commands.rtt_by_kind.items():
+            self.metrics.add_stage("command_rtt", rtt, board=name, command=command)
+        self.metrics.add_collector(board.serial_comm.stats, board=name)
+        self.metrics.add_collector(lambda: {"connected": board.connected, "failures": board.failures,
+                                            "parse_errors": board.parse_errors},
+                                    gauges=("connected",), board=name)
+        self.metrics.add_collector(board.pipeline.stats, board=name)
+        if board.configurator:
+            self.metrics.add_collector(board.configurator.stats, board=name)
+    
+    def _connect(self, board: HostedBoard):
+        if not board.serial_comm.open():
+            self._fail(board)
+            return
+        try:
+            board.fd = board.serial_comm.fileno()
+            self._selector.register(board.fd, selectors.EVENT_READ, board)
+        except (AttributeError, ValueError, OSError):
+            # No pollable descriptor (e.g. Windows): fall back to a reader thread
+            board.fd = None
+            board.serial_comm.start_reader_thread()
+        board.connected = True
+        board.failures = 0
+    
+    def _fail(self, board: HostedBoard):
+        """Take a board out of the loop and schedule a reconnect with backoff"""
+        # The retry time is set before the board counts as disconnected, since
+        # a board on a reader thread fails there while the I/O loop is checking it
+        board.failures += 1
+        delay = min(self.reconnect_delay * 2 ** (board.failures - 1), self.max_reconnect_delay)
+        board.retry_at = time.monotonic() + delay
+        if board.connected:
+            if board.fd is not None:
+                self._selector.unregister(board.fd)
+                board.fd = None
+            # Not on the I/O thread: stopping waits for the command writer,
+            # which may be stuck writing to the hung port
+            board.teardown = threading.Thread(target=board.serial_comm.stop, daemon=True,
+                                              name=f"teardown-{board.spec.name}")
+            board.teardown.start()
+        board.connected = False
+        log.warning("[%s] disconnected, retrying in %.0fs", board.spec.name, delay)
+    
+    def _io_loop(self):
+        while self._running:
+            # Wake up in time for LIFTs the debouncers are holding back
+            releases = [delay for delay in (board.pipeline.next_release() for board in self.boards.values())
+                        if delay is not None]
+            for key, _ in self._selector.select(timeout=min(releases + [0.5])):
+                board: HostedBoard = key.data
+                if not board.serial_comm.read_available():
+                    self._fail(board)
+            
+            now = time.monotonic()
+            for board in self.boards.values():
+                if not board.connected and now >= board.retry_at and not board.tearing_down():
+                    self._connect(board)
+                elif board.pipeline.next_release() == 0:
+                    self._schedule(board)
+    
+    def _on_batch(self, board: HostedBoard, messages: List[Any]):
+        """Runs on the I/O thread: parse and queue only"""
+        started = time.perf_counter()
+        for message in messages:
+            if isinstance(message, str) and message.startswith(("TAG:", "TAGS_END:")):
+                board.pipeline.feed_tag_line(message)
+                continue
+            if isinstance(message, str) and message.startswith(("STATUS:", "CONFIG_")):
+                if board.configurator:
+                    board.configurator.on_message(message)
+                continue
+            try:
+                event = message if isinstance(message, GameEventData) else self._parse_message(message)
+            except Exception as e:
+                board.parse_errors += 1
+                log.warning("[%s] Error processing serial message %r: %s", board.spec.name, message, e)
+                continue
+            if event is not None:
+                board.pipeline.submit(event)
+        board.parse_latency.record(time.perf_counter() - started)
+        self._schedule(board)
+    
+    def _schedule(self, board: HostedBoard):
+        with board.lock:
+            if board.scheduled:
+                return
+            board.scheduled = True
+        self._work.put(board)
+    
+    def _worker(self):
+        while True:
+            board = self._work.get()
+            if board is None:
+                return
+            try:
+                board.pipeline.process_pending()
+            except Exception as e:
+                log.exception("[%s] Error applying events: %s", board.spec.name, e)
+            
+            # Events queued while processing: go round again, otherwise release
+            with board.lock:
+                if board.pipeline.queue_depth():
+                    self._work.put(board)
+                else:
+                    board.scheduled = False
+    
+    def _notify(self, board: HostedBoard, snapshot: BoardSnapshot):
+        for observer in self.observers:
+            try:
+                observer(board.spec.name, snapshot)
+            except Exception as e:
+                log.exception("Observer error for %s: %s", board.spec.name, e)
+
+def load_specs(path: str) -> List[BoardSpec]:
+    with open(path) as spec_file:
+        return [BoardSpec(**entry) for entry in json.load(spec_file)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host several boards in one server process")
+    parser.add_argument("boards", help="JSON file listing the boards")
+    parser.add_argument("--metrics", type=int, metavar="PORT",
+                        help="serve every board's timings and counters on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"])
+    args = parser.parse_args()
+    
+    from logging_config import configure
+    configure(args.log_level)
+    
+    host = MultiBoardHost(load_specs(args.boards))
+    host.add_observer(lambda name, snapshot: print(f"[{name}] {snapshot.message}"))
+    metrics_server = None
+    if args.metrics is not None:
+        from metrics import MetricsServer
+        metrics_server = MetricsServer(host.metrics, args.metrics)
+        metrics_server.start()
+    host.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    host.stop()
+    if metrics_server:
+        metrics_server.stop()
@@ -0,0 +1,260 @@
+"""Reader health and scan scheduling.
+
+The firmware scans its readers round-robin at about 40 ms each (two
+SCAN_DELAYs and the PN532 read timeout), so on an 8x8 board every square
+is looked at once every 2.5 s, and a lift is only reported after
+MISS_THRESHOLD of those passes. Most of that time goes to squares nobody
+is touching.
+
+ScanScheduler follows the events and gives every reader a scan period,
+in passes of the firmware loop:
+
+    HOT_PERIOD   1  the square a piece was lifted from, the squares it can
+                    move to, and squares in the last few events
+    WARM_PERIOD  2  other occupied squares (any of them may be lifted next)
+    COLD_PERIOD  4  empty squares, and noisy readers (mostly flicker)
+    0               dead readers (reported inactive by the firmware)
+
+The schedule goes to the board as CONFIG_SCHEDULE:<first reader>:<one hex
+digit per reader>, SCHEDULE_CHUNK readers per command and only for the
+chunks that changed. Once scheduled the firmware reports
+SCAN:<passes>:<mean pass ms>:<inactive reader mask> every few seconds;
+the scan interval each square achieves is its period times that pass time.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import BoardConfig, GameEvent, GameEventData, PieceInfo
+from game_logic.base import GameLogic
+
+HOT_PERIOD = 1
+WARM_PERIOD = 2
+COLD_PERIOD = 4
+# Readers per CONFIG_SCHEDULE command, keeping it within the Arduino's 64 byte receive buffer
+SCHEDULE_CHUNK = 16
+# Consecutive misses before the firmware reports a lift (MISS_THRESHOLD in config.h)
+MISS_THRESHOLD = 12
+
+class ReaderHealth:
+    """Event counts of one reader"""
+    __slots__ = ("events", "lifts", "flickers", "last_event")
+    
+    def __init__(self):
+        self.events = 0
+        self.lifts = 0
+        # Lifts whose tag came back to the same reader within the flicker window
+        self.flickers = 0
+        # Number of the last event seen on this reader
+        self.last_event = 0
+    
+    def noisy(self, min_flickers: int = 5, max_rate: float = 0.3) -> bool:
+        return self.flickers >= min_flickers and self.flickers > max_rate * self.lifts
+
+class ScanScheduler:
+    """Computes reader scan periods from the events and sends them to the board.
+    
+    observe() takes the raw events as they arrive (before debouncing, so
+    flicker is still visible), on_applied() the events the game applied and
+    on_scan_report() the firmware's SCAN lines; any of them may send a new
+    schedule, at most once per min_interval seconds. A change that comes
+    sooner is sent by a timer thread once the interval is over (stop()
+    cancels it). Readers are numbered
+    like the board squares unless reader_positions (from a board profile)
+    says otherwise.
+    """
+    
+    # stats() values that are levels, not running totals
+    stats_gauges = frozenset({"scan_pass_ms", "scan_hot_readers", "scan_warm_readers", "scan_cold_readers",
+                              "scan_dead_readers", "scan_noisy_readers", "scan_hot_interval_ms",
+                              "scan_warm_interval_ms", "scan_cold_interval_ms", "scan_worst_lift_ms"})
+    
+    def __init__(self, board_config: BoardConfig, game_logic: GameLogic, send: Callable[[str], None],
+                 min_interval: float = 0.25, recent: int = 8, flicker_window: float = 2.0,
+                 reader_positions: Optional[Sequence[Optional[str]]] = None):
+        self.board_config = board_config
+        self.reader_positions = list(reader_positions or board_config.index_names)
+        self.reader_index = {name: reader for reader, name in enumerate(self.reader_positions) if name is not None}
+        self.game_logic = game_logic
+        self.send = send
+        self.min_interval = min_interval
+        self.recent = recent
+        self.flicker_window = flicker_window
+        
+        num_readers = len(self.reader_positions)
+        self.health = [ReaderHealth() for _ in range(num_readers)]
+        self.dead: Set[int] = set()
+        # uid -> reader the tag was last seen on, i.e. what is physically on the board;
+        # starts from the game's board, which a resumed session has already filled
+        self.tags: Dict[str, int] = {}
+        square_names = game_logic.tables.square_names
+        for square, piece in game_logic.board_state.occupied():
+            reader = self.reader_index.get(square_names[square])
+            if reader is not None:
+                self.tags[piece.uid] = reader
+        # uid -> squares made hot by lifting it (its square and its moves)
+        self.lifted: Dict[str, Set[int]] = {}
+        # uid -> (square, time) of its last raw lift, for spotting flicker
+        self._raw_lifts: Dict[str, Tuple[int, float]] = {}
+        self.events = 0
+        
+        # The firmware scans everything every pass until it gets a schedule
+        self.periods: List[int] = [HOT_PERIOD] * num_readers
+        self._sent: List[Optional[str]] = [None] * ((num_readers + SCHEDULE_CHUNK - 1) // SCHEDULE_CHUNK)
+        self._last_send = 0.0
+        # Sends the schedule once min_interval has passed, after a throttled update()
+        self._flush_timer: Optional[threading.Timer] = None
+        self.pass_ms = 0.0
+        self.reports = 0
+        self.schedules_sent = 0
+        self.commands_sent = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, event: GameEventData, now: Optional[float] = None):
+        """Count a raw event against its reader"""
+        now = time.monotonic() if now is None else now
+        square = self.reader_index.get(event.position)
+        if square is None:
+            return
+        with self._lock:
+            self.events += 1
+            health = self.health[square]
+            health.events += 1
+            health.last_event = self.events
+            if event.event_type == GameEvent.PIECE_LIFTED:
+                health.lifts += 1
+                self._raw_lifts[event.piece_uid] = (square, now)
+                self.tags.pop(event.piece_uid, None)
+            else:
+                self.tags[event.piece_uid] = square
+                lift = self._raw_lifts.pop(event.piece_uid, None)
+                if lift and lift[0] == square and now - lift[1] <= self.flicker_window:
+                    health.flickers += 1
+        self.update(now)
+    
+    def on_applied(self, event: GameEventData, response: Dict):
+        """Track the lifted piece; called on the pipeline worker, which owns the game"""
+        hot: Optional[Set[int]] = None
+        if event.event_type == GameEvent.PIECE_LIFTED:
+            hot = self._reachable(event)
+        with self._lock:
+            self.lifted.pop(event.piece_uid, None)
+            if hot:
+                self.lifted[event.piece_uid] = hot
+        self.update()
+    
+    def on_scan_report(self, message: str):
+        """SCAN:<passes>:<mean pass ms>:<inactive reader mask in hex>"""
+        parts = message.split(":")
+        with self._lock:
+            if int(parts[1]):
+                self.pass_ms = float(parts[2])
+            self.reports += 1
+            mask = int(parts[3], 16) if len(parts) > 3 and parts[3] else 0
+            self.dead = {reader for reader in range(len(self.health)) if mask >> reader & 1}
+        self.update()
+    
+    def _reachable(self, event: GameEventData) -> Set[int]:
+        """The square a piece was lifted from and every square it could move to from there"""
+        reader_index = self.reader_index
+        squares = {reader_index[event.position]} if event.position in reader_index else set()
+        piece = self.game_logic.pieces.get(event.piece_uid)
+        if piece is None or not squares:
+            return squares
+        # The piece is off the board now; ask for its moves as if it were still there
+        standing = PieceInfo(piece.uid, piece.piece_type, piece.color, event.position)
+        for position in self.game_logic.get_possible_moves(standing):
+            if position in reader_index:
+                squares.add(reader_index[position])
+        return squares
+    
+    def schedule(self) -> List[int]:
+        """The scan period of every reader right now"""
+        periods = [COLD_PERIOD] * len(self.health)
+        for square in self.tags.values():
+            periods[square] = WARM_PERIOD
+        for square, health in enumerate(self.health):
+            # A noisy reader's recent events are its own flicker
+            if health.noisy():
+                periods[square] = COLD_PERIOD
+            elif health.events and self.events - health.last_event < self.recent:
+                periods[square] = HOT_PERIOD
+        for squares in self.lifted.values():
+            for square in squares:
+                periods[square] = HOT_PERIOD
+        for square in self.dead:
+            periods[square] = 0
+        return periods
+    
+    def update(self, now: Optional[float] = None):
+        """Send the chunks of the schedule that changed, unless one was sent too recently"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            wait = self._last_send + self.min_interval - now
+            if wait > 0:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(min(wait, self.min_interval), self._flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+            periods = self.schedule()
+            commands = []
+            for chunk in range(len(self._sent)):
+                first = chunk * SCHEDULE_CHUNK
+                digits = "".join(f"{period:X}" for period in periods[first:first + SCHEDULE_CHUNK])
+                if digits != self._sent[chunk]:
+                    self._sent[chunk] = digits
+                    commands.append(f"CONFIG_SCHEDULE:{first}:{digits}")
+            if not commands:
+                return
+            self.periods = periods
+            self._last_send = now
+            self.schedules_sent += 1
+            self.commands_sent += len(commands)
+        for command in commands:
+            self.send(command)
+    
+    def _flush(self):
+        with self._lock:
+            self._flush_timer = None
+        self.update()
+    
+    def stop(self):
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+    
+    def square_intervals(self) -> Dict[str, float]:
+        """Milliseconds between two scans of each square (0 for squares not scanned)"""
+        names = self.reader_positions
+        return {names[square]: period * self.pass_ms
+                for square, period in enumerate(self.periods) if names[square] is not None}
+    
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            periods = list(self.periods)
+            occupied = set(self.tags.values())
+            noisy = sum(1 for health in self.health if health.noisy())
+        
+        def interval(period: int) -> float:
+            return period * self.pass_ms if period in periods else 0.0
+        
+        # Only an occupied square can have a piece lifted from it
+        scanned = [periods[reader] for reader in occupied if periods[reader]]
+        return {
+            "scan_reports": self.reports,
+            "scan_schedules_sent": self.schedules_sent,
+            "scan_commands_sent": self.commands_sent,
+            "scan_pass_ms": self.pass_ms,
+            "scan_hot_readers": periods.count(HOT_PERIOD),
+            "scan_warm_readers": periods.count(WARM_PERIOD),
+            "scan_cold_readers": periods.count(COLD_PERIOD),
+            "scan_dead_readers": periods.count(0),
+            "scan_noisy_readers": noisy,
+            "scan_hot_interval_ms": interval(HOT_PERIOD),
+            "scan_warm_interval_ms": interval(WARM_PERIOD),
+            "scan_cold_interval_ms": interval(COLD_PERIOD),
+            # Time for a lift to be reported from the slowest scanned occupied square
+            "scan_worst_lift_ms": max(scanned, default=0) * self.pass_ms * MISS_THRESHOLD,
+        }
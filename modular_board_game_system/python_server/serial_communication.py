@@ -1,59 +1,472 @@
+import logging
 import serial
+import struct
+import sys
 import threading
 import time
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from command_channel import Command, CommandChannel
+from config import GameEvent, GameEventData
+from metrics import LatencyHistogram
+
+log = logging.getLogger(__name__)
+
+# Binary event frames (see sendBinaryMessage in utility.ino):
+#   sync(0xA5) opcode reader from_reader uid_len uid[uid_len] crc8
+# from_reader is 0xFF when absent, crc8 (poly 0x07) covers opcode..uid.
+FRAME_SYNC = 0xA5
+FRAME_HEADER = struct.Struct("BBBBB")
+MAX_UID_LENGTH = 10
+NO_READER = 0xFF
+# Printed by initializeReaders() once the firmware has booted
+BOOT_BANNER = "Initialization complete"
+FRAME_OPCODES = {
+    1: GameEvent.PIECE_PLACED,
+    2: GameEvent.PIECE_LIFTED,
+    3: GameEvent.PIECE_MOVED,
+}
+
+def _crc8_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+CRC8_TABLE = _crc8_table()
+
+def crc8(data) -> int:
+    """CRC-8 (poly 0x07, init 0) as computed by the firmware"""
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+def encode_frame(opcode: int, reader: int, from_reader: int, uid: bytes) -> bytes:
+    """Build a binary event frame exactly as the firmware sends it"""
+    body = FRAME_HEADER.pack(FRAME_SYNC, opcode, reader, from_reader, len(uid))[1:] + uid
+    return bytes((FRAME_SYNC,)) + body + bytes((crc8(body),))
+
+class LineFramer:
+    """Incrementally splits a byte stream into newline-terminated messages"""
+    
+    def __init__(self, max_line_length: int = 256):
+        self.max_line_length = max_line_length
+        self.buffer = bytearray()
+        self.dropped_bytes = 0
+    
+    def feed(self, data: bytes) -> List[str]:
+        """Add received bytes and return every message completed by them"""
+        self.buffer += data
+        end = self.buffer.rfind(b"\n")
+        if end < 0:
+            if len(self.buffer) > self.max_line_length:
+                # No terminator in sight, the stream is garbage (e.g. wrong baud rate)
+                self.dropped_bytes += len(self.buffer)
+                self.buffer.clear()
+            return []
+        
+        complete = bytes(self.buffer[:end])
+        del self.buffer[:end + 1]
+        
+        messages = []
+        for raw_line in complete.split(b"\n"):
+            line = raw_line.decode("utf-8", errors="replace").strip()
+            if line:
+                messages.append(line)
+        return messages
+
+class FrameDecoder:
+    """Decodes a stream mixing binary event frames and text lines.
+    
+    Event frames are turned straight into GameEventData (reader indexes are
+    resolved through reader_positions); anything else is returned as a text
+    line, so config acks and status messages keep working in binary mode.
+    
+    A board sends the same few frames over and over (a tag on a reader), so
+    decoded events are cached by the frame's bytes: a repeated frame costs
+    one dict lookup, with no CRC or event construction.
+    """
+    
+    # Distinct frames remembered before the cache is started over
+    MAX_CACHED_FRAMES = 4096
+    
+    def __init__(self, reader_positions: Optional[Sequence[Optional[str]]], max_line_length: int = 256):
+        self.max_line_length = max_line_length
+        self.buffer = bytearray()
+        self.dropped_bytes = 0
+        self.frame_errors = 0
+        # uid bytes -> (uid string, CRC of the uid) and frame header -> CRC of the
+        # header followed by uid length zero bytes: CRC-8 is linear, so the
+        # two XORed make the frame's CRC without a loop over its bytes
+        self._uids: Dict[bytes, Tuple[str, int]] = {}
+        self._header_crcs: Dict[bytes, int] = {}
+        self._frames: Dict[bytes, Optional[GameEventData]] = {}
+        self.set_reader_positions(reader_positions or [])
+    
+    def set_reader_positions(self, reader_positions: Sequence[Optional[str]]):
+        """Reader index -> position, as the board reports it (CONFIG_DUMP)"""
+        self.reader_positions = [sys.intern(position) if position is not None else None
+                                 for position in reader_positions]
+        self._frames.clear()
+    
+    def feed(self, data: bytes) -> List[Union[str, GameEventData]]:
+        """Add received bytes and return every frame or line completed by them"""
+        buffer = self.buffer
+        buffer += data
+        messages: List[Union[str, GameEventData]] = []
+        append = messages.append
+        frames = self._frames
+        view = memoryview(buffer)
+        pos = 0
+        end_of_data = len(buffer)
+        
+        while pos < end_of_data:
+            if buffer[pos] == FRAME_SYNC:
+                if end_of_data - pos < FRAME_HEADER.size:
+                    break
+                uid_length = buffer[pos + 4]
+                if buffer[pos + 1] not in FRAME_OPCODES or not 0 < uid_length <= MAX_UID_LENGTH:
+                    # Not a frame header, resynchronize on the next byte
+                    self.frame_errors += 1
+                    pos += 1
+                    continue
+                frame_end = pos + FRAME_HEADER.size + uid_length + 1
+                if frame_end > end_of_data:
+                    break
+                frame = bytes(view[pos:frame_end])
+                event = frames.get(frame, frame)
+                if event is frame:
+                    header = frame[1:5]
+                    uid = frame[5:-1]
+                    header_crc = self._header_crcs.get(header)
+                    if header_crc is None:
+                        header_crc = self._header_crcs[header] = crc8(header + bytes(uid_length))
+                    uid_entry = self._uids.get(uid)
+                    if uid_entry is None:
+                        uid_entry = self._uids[uid] = (sys.intern(uid.hex().upper()), crc8(uid))
+                    if header_crc ^ uid_entry[1] != frame[-1]:
+                        # Corrupted frame: skip to the next sync byte or past the
+                        # next newline so its payload is not mistaken for text
+                        self.frame_errors += 1
+                        resync = self._resync_point(buffer, pos + 1, end_of_data)
+                        self.dropped_bytes += resync - pos
+                        pos = resync
+                        continue
+                    if len(frames) >= self.MAX_CACHED_FRAMES:
+                        frames.clear()
+                    event = frames[frame] = self._decode_event(frame[1], frame[2], frame[3], uid_entry[0])
+                if event is not None:
+                    append(event)
+                else:
+                    self.frame_errors += 1
+                pos = frame_end
+            else:
+                newline = buffer.find(b"\n", pos)
+                sync = buffer.find(FRAME_SYNC, pos)
+                if newline >= 0 and (sync < 0 or newline < sync):
+                    line = bytes(view[pos:newline]).decode("utf-8", errors="replace").strip()
+                    if line:
+                        append(line)
+                    pos = newline + 1
+                elif sync >= 0:
+                    # Text never contains the sync byte, so this is a line fragment
+                    self.dropped_bytes += sync - pos
+                    pos = sync
+                else:
+                    if end_of_data - pos > self.max_line_length:
+                        self.dropped_bytes += end_of_data - pos
+                        pos = end_of_data
+                    break
+        
+        view.release()
+        del buffer[:pos]
+        return messages
+    
+    def _resync_point(self, buffer: bytearray, start: int, end: int) -> int:
+        newline = buffer.find(b"\n", start, end)
+        sync = buffer.find(FRAME_SYNC, start, end)
+        if sync >= 0 and (newline < 0 or sync < newline):
+            return sync
+        return newline + 1 if newline >= 0 else end
+    
+    def _decode_event(self, opcode: int, reader: int, from_reader: int, uid_string: str) -> Optional[GameEventData]:
+        """The frame's event, None if it names a reader the board does not have"""
+        if reader >= len(self.reader_positions) or self.reader_positions[reader] is None:
+            return None
+        
+        event_type = FRAME_OPCODES[opcode]
+        position = self.reader_positions[reader]
+        if event_type == GameEvent.PIECE_MOVED:
+            if from_reader >= len(self.reader_positions):
+                return None
+            return GameEventData.from_interned(event_type, uid_string, position, self.reader_positions[from_reader])
+        return GameEventData.from_interned(event_type, uid_string, position)
 
 class SerialCommunication:
-    """Handles communication with Arduino board"""
+    """Handles communication with Arduino board.
+    
+    The reader thread blocks in read() until bytes arrive, drains everything
+    that is buffered in one call and hands all complete lines to the callbacks
+    at once. The time from bytes arriving to the callbacks returning is
+    recorded in self.latency, and the time spent framing them in
+    self.read_latency.
+    
+    Opening the port resets an Arduino, and it ignores commands until it
+    has booted, so nothing is negotiated before its boot banner
+    ("Initialization complete", BOOT_BANNER) arrives, or boot_timeout
+    seconds have passed for boards that do not reset on open. Then the
+    board is ready: callbacks added with add_ready_callback() run (on the
+    reader thread, or a timer thread) once per connection.
+    
+    With protocol="binary" the board is then asked to switch to binary event
+    frames (PROTO:BIN). Frames carry reader indexes, so without
+    reader_positions (from a board profile) the board's reader table is
+    read with CONFIG_DUMP first. Decoded frames are delivered to the
+    callbacks as GameEventData instead of text lines; text lines are still
+    accepted, so firmware without binary support keeps working in text mode.
+    
+    serial_factory opens the connection (serial.Serial by default); the
+    simulator passes its in-memory board here.
+    
+    start() runs the reader thread described above. Hosts that multiplex
+    many boards on one I/O loop call open() instead and then
+    read_available() whenever the connection's fileno() is readable.
+    Either way, a connection that fails or hangs up is reported once to the
+    callback set with set_disconnect_callback().
+    
+    send_command() only queues: self.commands (a CommandChannel) writes on
+    its own thread, matches the board's acks to the commands and retries
+    those left unanswered, so the reader never waits on a write.
+    """
     
-    def __init__(self, port: str, baud_rate: int = 115200):
+    # stats() values that are levels, not running totals (all from the command channel)
+    stats_gauges = CommandChannel.stats_gauges
+    
+    def __init__(self, port: str, baud_rate: int = 115200, protocol: str = "text",
+                 reader_positions: Optional[Sequence[Optional[str]]] = None,
+                 serial_factory: Callable[..., Any] = serial.Serial, boot_timeout: float = 5.0):
+        if protocol not in ("text", "binary"):
+            raise ValueError("Unsupported protocol. Choose 'text' or 'binary'.")
         self.port = port
         self.baud_rate = baud_rate
+        self.protocol = protocol
+        self.reader_positions = reader_positions
+        self.serial_factory = serial_factory
+        self.boot_timeout = boot_timeout
+        self.ready = False
+        self._ready_callbacks: List[Callable[[], None]] = []
+        self._ready_lock = threading.Lock()
+        self._boot_timer: Optional[threading.Timer] = None
+        # Reader index -> position from a CONFIG_DUMP in progress
+        self._reader_dump: Optional[Dict[int, str]] = None
+        self.binary_active = False
         self.serial_conn: Optional[serial.Serial] = None
         self.running = False
         self.message_callback = None
+        self.batch_callback = None
+        self.disconnect_callback = None
+        self.framer = LineFramer() if protocol == "text" else FrameDecoder(reader_positions)
+        self.latency = LatencyHistogram()
+        self.read_latency = LatencyHistogram()
+        self.bytes_received = 0
+        self.messages_received = 0
+        self.read_errors = 0
+        self.send_errors = 0
+        self.commands = CommandChannel(self._write)
     
-    def set_message_callback(self, callback):
+    def set_message_callback(self, callback: Callable[[Union[str, GameEventData]], None]):
         """Set callback function for received messages"""
         self.message_callback = callback
     
+    def set_batch_callback(self, callback: Callable[[List[Union[str, GameEventData]]], None]):
+        """Set callback receiving all messages framed from one read"""
+        self.batch_callback = callback
+    
+    def set_disconnect_callback(self, callback: Callable[[], None]):
+        """Set callback called when the reader thread loses the connection"""
+        self.disconnect_callback = callback
+    
+    def add_ready_callback(self, callback: Callable[[], None]):
+        """Call callback whenever a connection's board has booted"""
+        self._ready_callbacks.append(callback)
+    
+    def open(self) -> bool:
+        """Open the serial connection without starting a reader thread"""
+        try:
+            self.ready = False
+            self.binary_active = False
+            self.serial_conn = self.serial_factory(self.port, self.baud_rate, timeout=1)
+            self.running = True
+            self.commands.start()
+            self._boot_timer = threading.Timer(self.boot_timeout, self._on_ready)
+            self._boot_timer.daemon = True
+            self._boot_timer.start()
+            log.info("Serial connected on %s", self.port)
+            return True
+        except Exception as e:
+            log.error("Serial connection to %s failed: %s", self.port, e)
+            return False
+    
+    def _on_ready(self):
+        """The board booted (or was already running): negotiate, then tell the host"""
+        with self._ready_lock:
+            if self.ready or not self.running:
+                return
+            self.ready = True
+        if self._boot_timer:
+            self._boot_timer.cancel()
+        if self.protocol == "binary":
+            if self.reader_positions is None:
+                self._reader_dump = {}
+                self.commands.send("CONFIG_DUMP", on_done=self._on_dump_done)
+            else:
+                # Acknowledged with PROTO_ACK:BIN; older firmware ignores it
+                self.send_command("PROTO:BIN")
+        for callback in self._ready_callbacks:
+            callback()
+    
+    def _on_dump_done(self, command, ok: bool):
+        if not ok:
+            self._reader_dump = None
+            log.warning("Board on %s did not report its readers, staying in text mode", self.port)
+    
+    def _on_reader_dump(self, line: str):
+        """CONFIG_READER:<index>:<mux>:<channel>:<position> lines, then CONFIG_END:<count>"""
+        if line.startswith("CONFIG_READER:"):
+            parts = line.split(":")
+            self._reader_dump[int(parts[1])] = parts[4]
+            return
+        count = int(line.split(":")[1])
+        positions = [self._reader_dump.get(index) for index in range(count)]
+        self._reader_dump = None
+        self.framer.set_reader_positions(positions)
+        log.info("Board on %s has %d readers, switching to binary frames", self.port, count)
+        self.send_command("PROTO:BIN")
+    
     def start(self) -> bool:
         """Start serial connection"""
+        if not self.open():
+            return False
+        self.start_reader_thread()
+        return True
+    
+    def start_reader_thread(self):
+        """Read an already opened connection on a dedicated thread"""
+        threading.Thread(target=self._read_loop, daemon=True).start()
+    
+    def fileno(self) -> int:
+        """File descriptor of the connection, for selectors (POSIX only)"""
+        return self.serial_conn.fileno()
+    
+    def read_available(self) -> bool:
+        """Call when fileno() is readable: process what is buffered. Returns False once the connection failed"""
         try:
-            self.serial_conn = serial.Serial(self.port, self.baud_rate, timeout=1)
-            self.running = True
-            threading.Thread(target=self._read_loop, daemon=True).start()
-            print(f"Serial connected on {self.port}")
+            waiting = self.serial_conn.in_waiting
+            if not waiting:
+                # Readable with nothing to read is a hangup, as pyserial's read() reports it
+                raise serial.SerialException("device reports readiness to read but returned no data")
+            self._process(self.serial_conn.read(waiting))
             return True
         except Exception as e:
-            print(f"Serial connection failed: {e}")
+            self.read_errors += 1
+            log.error("Serial read error on %s: %s", self.port, e)
+            self.running = False
             return False
     
     def stop(self):
         """Stop serial connection"""
         self.running = False
+        if self._boot_timer:
+            self._boot_timer.cancel()
+        self.commands.stop()
         if self.serial_conn:
             self.serial_conn.close()
     
-    def send_command(self, command: str):
-        """Send command to Arduino"""
+    def send_command(self, command: str, on_done: Optional[Callable[[Command, bool], None]] = None,
+                     timeout: Optional[float] = None):
+        """Queue a command (or several, one per line) for the Arduino; see CommandChannel.send"""
+        if self.running:
+            self.commands.send(command, on_done, timeout)
+    
+    def _write(self, data: bytes):
+        """Called on the command writer thread"""
         if self.serial_conn and self.serial_conn.writable():
             try:
-                self.serial_conn.write((command + "\n").encode())
+                self.serial_conn.write(data)
             except Exception as e:
-                print(f"Serial send error: {e}")
+                self.send_errors += 1
+                log.error("Serial send error on %s: %s", self.port, e)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.commands.stats(),
+            "serial_bytes_received": self.bytes_received,
+            "serial_messages_received": self.messages_received,
+            "serial_read_errors": self.read_errors,
+            "serial_send_errors": self.send_errors,
+            "serial_dropped_bytes": self.framer.dropped_bytes,
+            "serial_frame_errors": getattr(self.framer, "frame_errors", 0),
+        }
+    
+    def _dispatch(self, messages: List[Union[str, GameEventData]], arrived: float):
+        """Hand a batch of framed messages to the callbacks"""
+        if self.batch_callback:
+            self.batch_callback(messages)
+        if self.message_callback:
+            for message in messages:
+                self.message_callback(message)
+        self.latency.record(time.perf_counter() - arrived)
+    
+    def _process(self, data: bytes):
+        """Frame received bytes and dispatch the complete messages"""
+        arrived = time.perf_counter()
+        messages = self.framer.feed(data)
+        self.read_latency.record(time.perf_counter() - arrived)
+        self.bytes_received += len(data)
+        self.messages_received += len(messages)
+        commands = self.commands
+        banner = None
+        for message in messages:
+            if message.__class__ is str:
+                commands.on_reply(message)
+                if message.startswith(BOOT_BANNER):
+                    banner = message
+                    self._on_ready()
+        if banner is not None:
+            messages = [m for m in messages if m is not banner]
+        if self._reader_dump is not None:
+            # Lines of our own CONFIG_DUMP are not for the host
+            kept = []
+            for message in messages:
+                if message.__class__ is str and message.startswith(("CONFIG_READER:", "CONFIG_END:")):
+                    self._on_reader_dump(message)
+                else:
+                    kept.append(message)
+            messages = kept
+        if self.protocol == "binary" and "PROTO_ACK:BIN" in messages:
+            self.binary_active = True
+            messages = [m for m in messages if m != "PROTO_ACK:BIN"]
+            log.info("Binary protocol active")
+        if messages:
+            self._dispatch(messages, arrived)
     
     def _read_loop(self):
         """Read loop for incoming serial data"""
         while self.running:
             try:
-                if self.serial_conn and self.serial_conn.in_waiting > 0:
-                    line = self.serial_conn.readline().decode("utf-8").strip()
-                    if line and self.message_callback:
-                        self.message_callback(line)
+                # Blocks until at least one byte arrives (or the timeout
+                # expires), then takes whatever else is already buffered
+                data = self.serial_conn.read(max(self.serial_conn.in_waiting, 1))
+                if data:
+                    self._process(data)
             except Exception as e:
-                print(f"Serial read error: {e}")
-                self.running = False
-            time.sleep(0.01) # Small delay to prevent busy-waiting
-
-
+                if self.running:
+                    self.read_errors += 1
+                    log.error("Serial read error on %s: %s", self.port, e)
+                    self.running = False
+                    if self.disconnect_callback:
+                        self.disconnect_callback()
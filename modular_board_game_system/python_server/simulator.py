@@ -0,0 +1,444 @@
+"""Hardware-free stand-in for the Arduino board.
+
+SimulatedBoard reproduces the firmware's scan loop (modular_gameBoard.ino):
+readers are scanned round-robin, a tag seen on a new reader produces PLACE
+or MOVE, and MISS_THRESHOLD consecutive misses produce LIFT. A simple player
+model lifts and puts down pieces, and reads can be made to fail randomly so
+the miss/lift patterns of flaky RFID tags show up too.
+
+LoopbackSerial exposes the board through the subset of the serial.Serial
+API that SerialCommunication uses, so the whole server can run against it:
+
+    python simulator.py --board 8x8 --game chess --rate 0 --duration 5
+
+runs a load test and reports sustained events/sec and latencies, and
+
+    python simulator.py --board 4x4 --pty
+
+serves the simulated board on a pseudo-terminal for `python main.py <pty>`.
+"""
+import argparse
+import dataclasses
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from board_profile import BoardProfile, ReaderEntry, table_checksum
+from config import BoardConfig, GameEventData
+from serial_communication import SerialCommunication, encode_frame
+
+# Mirrors arduino_firmware/config.h
+MISS_THRESHOLD = 12
+# Time the firmware spends on one reader (2 x SCAN_DELAY plus the read timeout)
+READER_SCAN_MS = 40
+
+FRAME_OPCODES = {"PLACE": 1, "LIFT": 2, "MOVE": 3}
+
+@dataclasses.dataclass
+class SimulatedTag:
+    """Firmware TagState plus where the tag physically is"""
+    uid: bytes
+    physical_reader: int = -1
+    current_reader: int = -1
+    last_reader: int = -1
+    miss_count: int = 0
+    has_been_placed: bool = False
+
+class SimulatedBoard:
+    """Generates the firmware's event stream for a board of RFID readers"""
+    
+    def __init__(self, board_config: BoardConfig, uids: List[str], miss_rate: float = 0.0,
+                 hold_scans: int = MISS_THRESHOLD + 2, seed: Optional[int] = None,
+                 report_passes: int = 50, board_id: str = "sim-1"):
+        # Readers start out wired like the firmware default config (row-major)
+        self.board_id = board_id
+        self.reader_table = BoardProfile.default(*board_config.size).readers
+        self._pending: Dict[int, ReaderEntry] = {}
+        self.reader_positions = [name for name in board_config.index_names]
+        self.tags = [SimulatedTag(uid=bytes.fromhex(uid)) for uid in uids]
+        self.miss_rate = miss_rate
+        self.hold_scans = hold_scans
+        self.random = random.Random(seed)
+        self.binary_protocol = False
+        self.commands: List[str] = []
+        self._lifted: Optional[SimulatedTag] = None
+        self._lifted_scans = 0
+        # Set by CONFIG_SCHEDULE: reader scanned every Nth pass, 0 = never
+        self.scan_periods = [1] * len(self.reader_positions)
+        self.schedule_active = False
+        self.report_passes = report_passes
+        self.passes = 0
+        # Firmware time the passes so far would have taken
+        self.scan_ms = 0
+        self._report_passes = 0
+        self._report_ms = 0
+    
+    def handle_command(self, command: str):
+        """React to a command written by the server"""
+        self.commands.append(command)
+        if command == "PROTO:BIN":
+            self.binary_protocol = True
+            return ["PROTO_ACK:BIN"]
+        elif command == "CONFIG_STATUS":
+            return [f"STATUS:READERS:{len(self.reader_table)}:TAGS:{len(self.tags)}"
+                    f":ID:{self.board_id}:CRC:{table_checksum(self.reader_table):X}"]
+        elif command.startswith("CONFIG_READER:"):
+            entry = ReaderEntry.parse(command)
+            self._pending[entry.index] = entry
+            return [f"CONFIG_ACK:READER:{entry.index}"]
+        elif command.startswith("CONFIG_COMMIT:"):
+            count = int(command.split(":")[1])
+            current = {entry.index: entry for entry in self.reader_table}
+            current.update(self._pending)
+            self._pending.clear()
+            self.reader_table = [current[index] for index in range(count)]
+            self.reader_positions = [entry.square for entry in self.reader_table]
+            self.scan_periods = (self.scan_periods + [1] * count)[:count]
+            return [f"CONFIG_ACK:COMMIT:{count}:{table_checksum(self.reader_table):X}"]
+        elif command == "CONFIG_TAGS":
+            placed = [tag for tag in self.tags if tag.current_reader >= 0]
+            return [f"TAG:{tag.uid.hex().upper()}:{self.reader_positions[tag.current_reader]}" for tag in placed] + \
+                [f"TAGS_END:{len(placed)}"]
+        elif command == "CONFIG_DUMP":
+            return [entry.command() for entry in self.reader_table] + [f"CONFIG_END:{len(self.reader_table)}"]
+        elif command.startswith("CONFIG_SCHEDULE:"):
+            _, first, periods = command.split(":")
+            for offset, digit in enumerate(periods):
+                if int(first) + offset < len(self.scan_periods):
+                    self.scan_periods[int(first) + offset] = int(digit, 16)
+            self.schedule_active = True
+            return [f"CONFIG_ACK:SCHEDULE:{first}"]
+        return []
+    
+    def encode(self, action: str, tag: SimulatedTag, reader: int, from_reader: int = -1) -> bytes:
+        """Encode an event the way sendMessage() does"""
+        if self.binary_protocol:
+            return encode_frame(FRAME_OPCODES[action], reader, 0xFF if from_reader < 0 else from_reader, tag.uid)
+        uid = tag.uid.hex().upper()
+        if action == "MOVE":
+            line = f"MOVE:{uid}:{self.reader_positions[from_reader]}:{self.reader_positions[reader]}"
+        else:
+            line = f"{action}:{uid}:{self.reader_positions[reader]}"
+        return (line + "\r\n").encode()
+    
+    def _empty_readers(self) -> List[int]:
+        occupied = {tag.physical_reader for tag in self.tags}
+        return [reader for reader, position in enumerate(self.reader_positions)
+                if position is not None and reader not in occupied]
+    
+    def _player_step(self):
+        """Physically place, lift or put down one piece"""
+        if self._lifted is not None:
+            self._lifted_scans += 1
+            if self._lifted_scans >= self.hold_scans:
+                empty = self._empty_readers()
+                if empty:
+                    self._lifted.physical_reader = self.random.choice(empty)
+                self._lifted = None
+            return
+        
+        off_board = [tag for tag in self.tags if tag.physical_reader < 0 and not tag.has_been_placed]
+        if off_board:
+            empty = self._empty_readers()
+            if empty:
+                off_board[0].physical_reader = self.random.choice(empty)
+            return
+        
+        on_board = [tag for tag in self.tags if tag.physical_reader >= 0]
+        if on_board:
+            self._lifted = self.random.choice(on_board)
+            self._lifted.physical_reader = -1
+            self._lifted_scans = 0
+    
+    def scan(self) -> List[bytes]:
+        """One pass of the firmware loop() over the readers its schedule selects"""
+        self._player_step()
+        self.passes += 1
+        scanned = 0
+        output = []
+        for reader in range(len(self.reader_positions)):
+            if self.reader_positions[reader] is None:
+                continue
+            period = self.scan_periods[reader]
+            if period == 0 or (self.passes + reader) % period != 0:
+                continue
+            scanned += 1
+            tag = next((t for t in self.tags if t.physical_reader == reader), None)
+            if tag is not None and self.random.random() >= self.miss_rate:
+                tag.miss_count = 0
+                if tag.current_reader < 0:
+                    if not tag.has_been_placed:
+                        output.append(self.encode("PLACE", tag, reader))
+                        tag.has_been_placed = True
+                    else:
+                        output.append(self.encode("MOVE", tag, reader, tag.last_reader))
+                    tag.current_reader = reader
+                elif tag.current_reader != reader:
+                    output.append(self.encode("MOVE", tag, reader, tag.current_reader))
+                    tag.last_reader = tag.current_reader
+                    tag.current_reader = reader
+            else:
+                for known in self.tags:
+                    if known.current_reader == reader:
+                        known.miss_count += 1
+                        if known.miss_count >= MISS_THRESHOLD:
+                            output.append(self.encode("LIFT", known, reader))
+                            known.last_reader = known.current_reader
+                            known.current_reader = -1
+                            known.miss_count = 0
+                        break
+        
+        self.scan_ms += scanned * READER_SCAN_MS
+        if self.schedule_active:
+            self._report_passes += 1
+            self._report_ms += scanned * READER_SCAN_MS
+            if self._report_passes >= self.report_passes:
+                # Every simulated reader works, so the inactive mask is empty
+                mask = "0" * ((len(self.reader_positions) + 3) // 4)
+                output.append(f"SCAN:{self._report_passes}:{self._report_ms // self._report_passes}:{mask}\r\n".encode())
+                self._report_passes = 0
+                self._report_ms = 0
+        return output
+
+class LoopbackSerial:
+    """In-memory replacement for serial.Serial driven by a SimulatedBoard.
+    
+    A feeder thread runs the board's scan loop and paces its output at
+    `rate` messages per second (0 = as fast as possible). Emission times are
+    kept in emit_times so end-to-end latency can be measured.
+    """
+    
+    def __init__(self, board: SimulatedBoard, rate: float = 100.0, timeout: float = 1.0):
+        self.board = board
+        self.rate = rate
+        self.timeout = timeout
+        self.is_open = True
+        self.emitted = 0
+        self.emit_times: Deque[float] = deque()
+        self._buffer = bytearray()
+        self._condition = threading.Condition()
+        # Opening the port resets an Arduino, which then prints its boot banner
+        self._push(f"Initialization complete. Active readers: {len(board.reader_table)}\r\n".encode(), is_event=False)
+        self._feeder = threading.Thread(target=self._feed_loop, daemon=True)
+        self._feeder.start()
+    
+    @property
+    def in_waiting(self) -> int:
+        return len(self._buffer)
+    
+    def read(self, size: int = 1) -> bytes:
+        with self._condition:
+            if not self._buffer and self.is_open:
+                self._condition.wait(self.timeout)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+    
+    def write(self, data: bytes) -> int:
+        for command in data.decode().splitlines():
+            for reply in self.board.handle_command(command.strip()):
+                self._push((reply + "\r\n").encode(), is_event=False)
+        return len(data)
+    
+    def writable(self) -> bool:
+        return self.is_open
+    
+    def close(self):
+        with self._condition:
+            self.is_open = False
+            self._condition.notify_all()
+    
+    def _push(self, data: bytes, is_event: bool = True):
+        with self._condition:
+            if is_event:
+                self.emitted += 1
+                self.emit_times.append(time.perf_counter())
+            self._buffer += data
+            self._condition.notify()
+    
+    def _feed_loop(self):
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        next_emit = time.perf_counter()
+        while self.is_open:
+            for message in self.board.scan():
+                if interval:
+                    delay = next_emit - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_emit = max(next_emit + interval, time.perf_counter() - 1.0)
+                self._push(message, is_event=not message.startswith(b"SCAN:"))
+            if not interval:
+                # Let the reader keep up instead of growing the buffer forever
+                while self.is_open and len(self._buffer) > 64 * 1024:
+                    time.sleep(0.001)
+
+def serve_pty(board: SimulatedBoard, scan_period: float = 0.02):
+    """Expose the simulated board on a pseudo-terminal until interrupted"""
+    import pty
+    import tty
+    
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    print(f"Simulated board on {os.ttyname(slave)} (Ctrl+C to stop)")
+    
+    def handle_commands():
+        pending = b""
+        while True:
+            pending += os.read(master, 1024)
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                for reply in board.handle_command(line.decode().strip()):
+                    os.write(master, (reply + "\r\n").encode())
+    
+    threading.Thread(target=handle_commands, daemon=True).start()
+    try:
+        while True:
+            for message in board.scan():
+                os.write(master, message)
+            time.sleep(scan_period)
+    except KeyboardInterrupt:
+        pass
+
+def run_load_test(board_config: BoardConfig, game_type: str = "chess", rate: float = 0.0,
+                  duration: float = 5.0, tags: Optional[int] = None, miss_rate: float = 0.0,
+                  protocol: str = "text", seed: Optional[int] = None,
+                  debounce: Optional[float] = None, scan_schedule: bool = False) -> Dict[str, float]:
+    """Drive SerialCommunication and GameLogic from a simulated board and measure them"""
+    from debounce import EventDebouncer
+    from event_pipeline import EventPipeline
+    from main import create_game_logic, parse_message
+    from scan_scheduler import ScanScheduler
+    
+    game_logic = create_game_logic(game_type, board_config)
+    uids = list(game_logic.initialize_pieces())
+    rng = random.Random(seed)
+    while tags is not None and len(uids) < tags:
+        uids.append(f"{rng.getrandbits(32):08X}")
+    board = SimulatedBoard(board_config, uids[:tags] if tags else uids, miss_rate=miss_rate, seed=seed)
+    
+    end_to_end: List[float] = []
+    connection: Dict[str, LoopbackSerial] = {}
+    debouncer = EventDebouncer(debounce) if debounce else None
+    scheduler: Optional[ScanScheduler] = None
+    # uid -> (event, emit time) of every submitted event of the piece not applied yet
+    unanswered: Dict[str, Deque[Tuple[GameEventData, float]]] = {}
+    unanswered_lock = threading.Lock()
+    
+    def on_response(event: GameEventData, response):
+        if scheduler:
+            scheduler.on_applied(event, response)
+        now = time.perf_counter()
+        with unanswered_lock:
+            pending = unanswered.get(event.piece_uid)
+            if not pending:
+                return
+            # A piece's events are applied in order, so any before the match
+            # were swallowed by the debouncer; an event it made up (a merged
+            # move) counts from the latest emitted event of the piece
+            match = next((index for index, (emitted, _) in enumerate(pending) if emitted == event), len(pending) - 1)
+            for _ in range(match):
+                pending.popleft()
+            end_to_end.append(now - pending.popleft()[1])
+    
+    pipeline = EventPipeline(game_logic, max_queue=1_000_000, on_response=on_response, debouncer=debouncer)
+    
+    def open_serial(port, baud_rate, timeout):
+        connection["serial"] = LoopbackSerial(board, rate=rate, timeout=timeout)
+        return connection["serial"]
+    
+    # In binary mode the reader table is read from the board, as from real firmware
+    serial_comm = SerialCommunication("sim", protocol=protocol, serial_factory=open_serial)
+    if scan_schedule:
+        # Simulated time runs far faster than wall time, so no rate limit
+        scheduler = ScanScheduler(board_config, game_logic, send=serial_comm.send_command, min_interval=0)
+    
+    def on_batch(messages):
+        for message in messages:
+            if isinstance(message, str) and message.startswith("SCAN:"):
+                if scheduler:
+                    scheduler.on_scan_report(message)
+                continue
+            if isinstance(message, str) and message.startswith("CONFIG_ACK:"):
+                continue
+            event = message if isinstance(message, GameEventData) else parse_message(message)
+            if event is not None:
+                if scheduler:
+                    scheduler.observe(event)
+                # Serial is in order, so this is the board's oldest unmatched event
+                emitted = connection["serial"].emit_times.popleft()
+                coalesced = pipeline.coalesced
+                with unanswered_lock:
+                    unanswered.setdefault(event.piece_uid, deque()).append((event, emitted))
+                if not pipeline.submit(event) or pipeline.coalesced != coalesced:
+                    # Dropped, or folded into the identical queued event, which keeps its own time
+                    with unanswered_lock:
+                        unanswered[event.piece_uid].pop()
+    
+    serial_comm.set_batch_callback(on_batch)
+    pipeline.start()
+    started = time.perf_counter()
+    serial_comm.start()
+    time.sleep(duration)
+    serial_comm.stop()
+    elapsed = time.perf_counter() - started
+    pipeline.stop()
+    
+    end_to_end.sort()
+    stats = pipeline.stats()
+    results = {
+        "emitted": connection["serial"].emitted,
+        "processed": stats["processed"],
+        "overflows": stats["overflows"],
+        "dropped": stats["dropped"],
+        "events_per_sec": stats["processed"] / elapsed,
+        "serial_p50_ms": serial_comm.latency.percentile(0.5) * 1000,
+        "serial_p99_ms": serial_comm.latency.percentile(0.99) * 1000,
+        "end_to_end_p50_ms": end_to_end[len(end_to_end) // 2] * 1000 if end_to_end else 0.0,
+        "end_to_end_p99_ms": end_to_end[int(len(end_to_end) * 0.99)] * 1000 if end_to_end else 0.0,
+        "max_queue_depth": stats["max_depth"],
+        "move_cache_hit_rate": stats["move_cache_hits"] / max(stats["move_cache_hits"] + stats["move_cache_misses"], 1),
+        # How long the real firmware would have scanned for each event
+        "firmware_ms_per_event": board.scan_ms / max(connection["serial"].emitted, 1),
+    }
+    if debouncer:
+        results["debounce_suppressed"] = stats["debounce_suppressed"]
+        results["debounce_merged"] = stats["debounce_merged"]
+    if scheduler:
+        results.update(scheduler.stats())
+        results.update(serial_comm.commands.stats())
+        results["command_rtt_p99_ms"] = serial_comm.commands.rtt.percentile(0.99) * 1000
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated Arduino board and load generator")
+    parser.add_argument("--board", default="4x4", help="board size, e.g. 4x4 or 8x8")
+    parser.add_argument("--game", default="chess", help="chess or checkers")
+    parser.add_argument("--rate", type=float, default=0.0, help="messages per second, 0 = unlimited")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run the load test")
+    parser.add_argument("--tags", type=int, default=None, help="number of tags (default: the game's pieces)")
+    parser.add_argument("--noise", type=float, default=0.0, help="probability that a read misses a present tag")
+    parser.add_argument("--protocol", default="text", help="text or binary")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--debounce", type=int, default=0, metavar="MS",
+                        help="debounce window for tag flicker in milliseconds, 0 = off")
+    parser.add_argument("--scan-schedule", action="store_true",
+                        help="let the server schedule the reader scans (see scan_scheduler.py)")
+    parser.add_argument("--pty", action="store_true", help="serve the board on a pty instead of load testing")
+    args = parser.parse_args()
+    
+    rows, cols = (int(n) for n in args.board.lower().split("x"))
+    config = BoardConfig.create_grid_config(rows, cols)
+    
+    if args.pty:
+        from main import create_game_logic
+        uids = list(create_game_logic(args.game, config).initialize_pieces())
+        serve_pty(SimulatedBoard(config, uids, miss_rate=args.noise, seed=args.seed))
+    else:
+        results = run_load_test(config, args.game, args.rate, args.duration, args.tags,
+                                args.noise, args.protocol, args.seed, debounce=args.debounce / 1000,
+                                scan_schedule=args.scan_schedule)
+        for key, value in results.items():
+            print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,156 @@
+"""Stream a running game to network spectators.
+
+SpectatorServer accepts TCP connections and sends newline-delimited JSON.
+A new spectator first receives the full state of the board:
+
+    {"type": "snapshot", "version": 12, "board": {"a1": ["C5B7BD01", "pawn", "White"], ...},
+     "highlights": {...}, "message": "..."}
+
+and from then on only what changed with each published BoardSnapshot:
+
+    {"type": "delta", "version": 13, "squares": {"a1": null, "b2": ["C5B7BD01", "pawn", "White"]},
+     "highlights": {...}, "message": "..."}
+
+"highlights" and "message" are only present in a delta when they changed.
+Each delta is serialized once and the same bytes are written to every
+spectator, so the cost per event does not grow with the number of
+spectators. A spectator that stops reading is skipped once its send buffer
+passes max_buffer and is sent a fresh snapshot after it catches up.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+from event_pipeline import BoardSnapshot
+
+log = logging.getLogger(__name__)
+
+def _squares(snapshot: BoardSnapshot) -> Dict[str, list]:
+    """Occupied squares as position -> [uid, type, color]"""
+    return {
+        position: [piece.uid, piece.piece_type, piece.color]
+        for position, piece in snapshot.board_state.items() if piece
+    }
+
+def snapshot_message(snapshot: BoardSnapshot) -> Dict[str, Any]:
+    return {
+        "type": "snapshot",
+        "version": snapshot.version,
+        "board": _squares(snapshot),
+        "highlights": dict(snapshot.highlights),
+        "message": snapshot.message,
+    }
+
+def delta_message(previous: BoardSnapshot, snapshot: BoardSnapshot) -> Optional[Dict[str, Any]]:
+    """What changed between two snapshots (None if nothing did)"""
+    before = _squares(previous)
+    after = _squares(snapshot)
+    squares = {
+        position: after.get(position)
+        for position in before.keys() | after.keys()
+        if before.get(position) != after.get(position)
+    }
+    message: Dict[str, Any] = {"type": "delta", "version": snapshot.version, "squares": squares}
+    if snapshot.highlights != previous.highlights:
+        message["highlights"] = dict(snapshot.highlights)
+    if snapshot.message != previous.message:
+        message["message"] = snapshot.message
+    if len(message) == 3 and not squares:
+        return None
+    return message
+
+def encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+class _SpectatorProtocol(asyncio.Protocol):
+    def __init__(self, server: "SpectatorServer"):
+        self.server = server
+        self.transport: Optional[asyncio.WriteTransport] = None
+        self.behind = False
+    
+    def connection_made(self, transport: asyncio.WriteTransport):
+        self.transport = transport
+        transport.write(encode(snapshot_message(self.server.snapshot)))
+        self.server.spectators.add(self)
+    
+    def connection_lost(self, exc: Optional[Exception]):
+        self.server.spectators.discard(self)
+    
+    def data_received(self, data: bytes):
+        # Spectators only listen
+        pass
+
+class SpectatorServer:
+    """Fans board deltas out to every connected spectator"""
+    
+    # stats() values that are levels, not running totals
+    stats_gauges = frozenset({"spectators"})
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, max_buffer: int = 256 * 1024,
+                 snapshot: Optional[BoardSnapshot] = None):
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        # What new spectators are sent first
+        self.snapshot = snapshot or BoardSnapshot(0, {}, {}, "")
+        self.spectators: Set[_SpectatorProtocol] = set()
+        self.deltas_sent = 0
+        self.bytes_sent = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await self._loop.create_server(lambda: _SpectatorProtocol(self), self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log.info("Spectators can connect on %s:%s", self.host, self.port)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "spectators": len(self.spectators),
+            "spectator_deltas_sent": self.deltas_sent,
+            "spectator_bytes_sent": self.bytes_sent,
+        }
+    
+    async def stop(self):
+        if self._server:
+            self._server.close()
+        # wait_closed() waits for every connection to end (Python 3.12+), so close them first
+        for spectator in list(self.spectators):
+            spectator.transport.close()
+        if self._server:
+            await self._server.wait_closed()
+    
+    def publish(self, snapshot: BoardSnapshot):
+        """Send a new snapshot's changes to all spectators. Safe to call from any thread"""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._broadcast, snapshot)
+    
+    def _broadcast(self, snapshot: BoardSnapshot):
+        if snapshot.version <= self.snapshot.version:
+            return
+        delta = delta_message(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        if delta is None or not self.spectators:
+            return
+        
+        data = encode(delta)
+        full = None
+        for spectator in self.spectators:
+            transport = spectator.transport
+            if transport.get_write_buffer_size() > self.max_buffer:
+                spectator.behind = True
+                continue
+            if spectator.behind:
+                # It missed deltas while its buffer was full, start it over
+                if full is None:
+                    full = encode(snapshot_message(snapshot))
+                transport.write(full)
+                spectator.behind = False
+                self.bytes_sent += len(full)
+            else:
+                transport.write(data)
+                self.bytes_sent += len(data)
+        self.deltas_sent += 1